@@ -1,6 +1,10 @@
 from django.contrib import admin
 from .models import Appointment
 from .models import ReminderLog
+from .models import TherapistDailyStats
+from .models import AppointmentLogArchive
+from .models import NoShowStats
+from .models import JobState
 # @admin.register(AvailabilitySlot)
 # class AvailabilitySlotAdmin(admin.ModelAdmin):
 #    list_display = ('therapist', 'start_time', 'end_time', 'is_booked')
@@ -23,3 +27,27 @@ class ReminderLogAdmin(admin.ModelAdmin):
     search_fields = ['sent_to', 'appointment__id']
 
 
+@admin.register(TherapistDailyStats)
+class TherapistDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['therapist', 'date', 'booked', 'completed', 'cancelled', 'missed', 'minutes']
+    list_filter = ['date']
+    search_fields = ['therapist__user__username']
+
+
+@admin.register(AppointmentLogArchive)
+class AppointmentLogArchiveAdmin(admin.ModelAdmin):
+    list_display = ['appointment', 'performed_by', 'action', 'timestamp', 'archived_at']
+    list_filter = ['timestamp']
+    search_fields = ['appointment__id', 'action']
+
+
+@admin.register(NoShowStats)
+class NoShowStatsAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'therapist', 'resolved', 'no_shows', 'no_show_rate', 'last_session_at', 'updated_at']
+    search_fields = ['patient__username', 'therapist__user__username']
+
+
+@admin.register(JobState)
+class JobStateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'watermark', 'updated_at']
+    readonly_fields = ['name', 'watermark', 'data', 'updated_at']
@@ -0,0 +1,143 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.utils.timezone import localtime
+
+from .models import Appointment, TherapistDailyStats
+
+# Appointment status -> TherapistDailyStats counter it feeds
+STATUS_COUNTERS = {
+    'completed': 'completed',
+    'cancelled': 'cancelled',
+    'missed': 'missed',
+    'no_show': 'missed',
+}
+COUNTER_FIELDS = ('booked', 'completed', 'cancelled', 'missed', 'minutes')
+
+
+def _contribution(therapist_id, scheduled_at, status, duration_minutes):
+    """What one appointment in a given state adds to the rollups."""
+    counters = Counter(booked=1)
+    counter = STATUS_COUNTERS.get(status)
+    if counter:
+        counters[counter] += 1
+    if status == 'completed':
+        counters['minutes'] += duration_minutes or 0
+    return (therapist_id, localtime(scheduled_at).date()), counters
+
+
+def _apply(changes):
+    """
+    Apply (old_state, new_state) pairs to the rollups. A state is a
+    (therapist_id, scheduled_at, status, duration_minutes) tuple, or None for
+    an appointment that did not exist before / no longer exists.
+    """
+    deltas = defaultdict(Counter)
+    for old_state, new_state in changes:
+        if old_state:
+            key, counters = _contribution(*old_state)
+            deltas[key].subtract(counters)
+        if new_state:
+            key, counters = _contribution(*new_state)
+            deltas[key].update(counters)
+
+    deltas = {
+        key: {field: value for field, value in counters.items() if value}
+        for key, counters in deltas.items()
+    }
+    deltas = {key: counters for key, counters in deltas.items() if counters}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        TherapistDailyStats.objects.bulk_create(
+            [TherapistDailyStats(therapist_id=therapist_id, date=date) for therapist_id, date in deltas],
+            ignore_conflicts=True
+        )
+        for (therapist_id, date), counters in deltas.items():
+            TherapistDailyStats.objects.filter(therapist_id=therapist_id, date=date).update(
+                **{
+                    # Clamp at zero so rows predating the rollups can't go negative
+                    field: F(field) + value if value > 0 else Greatest(F(field) + value, 0)
+                    for field, value in counters.items()
+                }
+            )
+
+
+def _state(appointment, status=None, scheduled_at=None):
+    return (
+        appointment.therapist_id,
+        scheduled_at or appointment.scheduled_at,
+        status or appointment.status,
+        appointment.duration_minutes,
+    )
+
+
+def record_appointments_created(appointments):
+    _apply((None, _state(appt)) for appt in appointments)
+
+
+def record_appointment_deleted(appointment):
+    _apply([(_state(appointment), None)])
+
+
+def record_appointment_change(appointment, old_status, old_scheduled_at=None):
+    """Call after `appointment` moved from `old_status` (and optionally `old_scheduled_at`)."""
+    _apply([(_state(appointment, old_status, old_scheduled_at), _state(appointment))])
+
+
+def record_transition(therapist_id, duration_minutes, old_status, old_scheduled_at, new_status, new_scheduled_at):
+    """Outbox form: both states are spelled out, since the row may have moved on since."""
+    old_state = (therapist_id, old_scheduled_at, old_status, duration_minutes) if old_status else None
+    _apply([(old_state, (therapist_id, new_scheduled_at, new_status, duration_minutes))])
+
+
+def record_bulk_status_change(rows, new_status):
+    """
+    For queryset.update() paths that bypass the model.
+    `rows` are (therapist_id, scheduled_at, duration_minutes, old_status) tuples.
+    """
+    _apply(
+        ((therapist_id, scheduled_at, old_status, duration), (therapist_id, scheduled_at, new_status, duration))
+        for therapist_id, scheduled_at, duration, old_status in rows
+    )
+
+
+def rebuild_daily_stats(start=None, end=None):
+    """Recompute the rollups from the appointments table with one grouped query."""
+    appointments = Appointment.objects.annotate(date=TruncDate('scheduled_at'))
+    stats = TherapistDailyStats.objects.all()
+    if start:
+        appointments = appointments.filter(date__gte=start)
+        stats = stats.filter(date__gte=start)
+    if end:
+        appointments = appointments.filter(date__lte=end)
+        stats = stats.filter(date__lte=end)
+
+    rows = appointments.values('therapist_id', 'date').annotate(
+        booked=Count('id'),
+        completed=Count('id', filter=Q(status='completed')),
+        cancelled=Count('id', filter=Q(status='cancelled')),
+        missed=Count('id', filter=Q(status__in=['missed', 'no_show'])),
+        minutes=Sum('duration_minutes', filter=Q(status='completed')),
+    )
+
+    with transaction.atomic():
+        stats.delete()
+        TherapistDailyStats.objects.bulk_create(
+            [
+                TherapistDailyStats(
+                    therapist_id=row['therapist_id'],
+                    date=row['date'],
+                    booked=row['booked'],
+                    completed=row['completed'],
+                    cancelled=row['cancelled'],
+                    missed=row['missed'],
+                    minutes=row['minutes'] or 0,
+                )
+                for row in rows.iterator()
+            ],
+            batch_size=2000
+        )
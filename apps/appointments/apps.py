@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class AppointmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.appointments'  
\ No newline at end of file
+    name = 'apps.appointments'
+
+    def ready(self):
+        import apps.appointments.signals
@@ -0,0 +1,51 @@
+import json
+import logging
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from .realtime import get_appointment_status, public_status, status_group
+
+logger = logging.getLogger(__name__)
+
+
+class AppointmentStatusConsumer(AsyncWebsocketConsumer):
+    """
+    Live status of one appointment for its patient and therapist: sends the
+    current snapshot on connect, then every `appointment_status` event.
+    """
+
+    async def connect(self):
+        self.appointment_id = self.scope['url_route']['kwargs']['appointment_id']
+        self.group_name = status_group(self.appointment_id)
+        self.user = self.scope["user"]
+
+        if not self.user.is_authenticated:
+            await self.close(code=4001)
+            return
+
+        snapshot = await self.get_snapshot()
+        if snapshot is None or self.user.id not in (snapshot['patient_id'], snapshot['therapist__user_id']):
+            logger.warning(f"Unauthorized WebSocket access attempt by User[{self.user.id}] on Appointment[{self.appointment_id}]")
+            await self.close(code=4003)
+            return
+
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        status = public_status(snapshot)
+        status['scheduled_at'] = status['scheduled_at'].isoformat()
+        await self.send(text_data=json.dumps({'type': 'appointment_status', 'appointment': status}))
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def appointment_status(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'appointment_status',
+            'appointment': event['appointment'],
+        }))
+
+    @database_sync_to_async
+    def get_snapshot(self):
+        return get_appointment_status(self.appointment_id)
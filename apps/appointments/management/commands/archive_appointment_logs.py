@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now, timedelta
+
+from apps.appointments.tasks import AUDIT_LOG_RETENTION_DAYS
+from apps.appointments.utils import archive_appointment_logs
+
+
+class Command(BaseCommand):
+    help = "Move appointment audit log rows past the retention window into the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=AUDIT_LOG_RETENTION_DAYS,
+                            help=f"Archive rows older than this many days (default {AUDIT_LOG_RETENTION_DAYS}).")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--days must be >= 0 and --batch-size >= 1.")
+
+        moved = archive_appointment_logs(now() - timedelta(days=options['days']), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} appointment log rows."))
@@ -0,0 +1,171 @@
+import io
+import json
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now, timedelta
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.appointments.models import Appointment, JobState
+from apps.appointments.tasks import AUTO_CLOSE_JOB, auto_close_past_appointments, send_upcoming_session_reminders
+from apps.appointments.views import AdminAnalyticsViewSet, AppointmentViewSet
+from apps.therapists.models import TherapistProfile
+from apps.users.models import CustomUser
+from grace_backend.celery import app as celery_app
+
+PREFIX = 'bench'
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic data at several sizes and record wall time and query count of the "
+        "scheduling endpoints and tasks. Each measured call runs in a transaction that is rolled back. "
+        "With --baseline, exits non-zero when a result regressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help="Comma-separated appointment counts to benchmark at.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per benchmark; the median is reported.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--baseline', help="JSON results of an earlier run to compare against.")
+        parser.add_argument('--time-tolerance', type=float, default=0.25,
+                            help="Allowed relative slowdown against the baseline (default 0.25 = 25%%).")
+        parser.add_argument('--time-slack-ms', type=float, default=5.0,
+                            help="Slowdowns smaller than this many milliseconds are treated as noise.")
+        parser.add_argument('--keep-data', action='store_true', help="Leave the last data set in place.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers.")
+        if not sizes or options['repeat'] < 1:
+            raise CommandError("Give at least one size and --repeat >= 1.")
+
+        # Tasks queued by the code under test go to an in-memory transport:
+        # no broker is needed and no notification is actually sent.
+        celery_app.conf.broker_write_url = 'memory://'
+
+        results = []
+        try:
+            for size in sizes:
+                self.seed(size)
+                for name, run in self.benchmarks():
+                    result = self.measure(name, size, run, options['repeat'])
+                    results.append(result)
+                    self.stdout.write(
+                        f"{name:<36} {size:>10} appts  {result['median_ms']:>10.1f} ms  {result['queries']:>5} queries"
+                    )
+        finally:
+            if not options['keep_data']:
+                CustomUser.objects.filter(username__startswith=f"{PREFIX}_").delete()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['time_tolerance'], options['time_slack_ms'])
+
+    def seed(self, size):
+        therapists = max(10, size // 1000)
+        patients = max(50, size // 20)
+        self.stdout.write(f"Seeding {size} appointments ({therapists} therapists, {patients} patients)...")
+        call_command(
+            'seed_appointments', prefix=PREFIX, clear=True, therapists=therapists, patients=patients,
+            appointments=size, days_back=365, days_ahead=30, stdout=io.StringIO(),
+        )
+
+    def benchmarks(self):
+        factory = APIRequestFactory()
+        admin = CustomUser.objects.get(username=f"{PREFIX}_admin")
+        profile = TherapistProfile.objects.filter(user__username__startswith=f"{PREFIX}_t_").select_related('user').first()
+        patient = CustomUser.objects.filter(username__startswith=f"{PREFIX}_p_").first()
+        tomorrow = (now() + timedelta(days=1)).date().isoformat()
+        # Far enough ahead that no seeded session collides with the series
+        series_start = (now() + timedelta(days=400)).replace(minute=0, second=0, microsecond=0).isoformat()
+
+        def call(view, request, user, **kwargs):
+            force_authenticate(request, user=user)
+            response = view(request, **kwargs)
+            if response.status_code >= 400:
+                raise CommandError(f"{request.path} returned {response.status_code}: {getattr(response, 'data', '')}")
+            return response
+
+        available_slots = AppointmentViewSet.as_view({'get': 'available_slots'}, throttle_classes=[])
+        create_recurring = AppointmentViewSet.as_view({'post': 'create_recurring'}, throttle_classes=[])
+        summary = AdminAnalyticsViewSet.as_view({'get': 'summary'}, throttle_classes=[])
+
+        def reset_auto_close():
+            JobState.objects.filter(name=AUTO_CLOSE_JOB).delete()
+
+        return [
+            ('available_slots', lambda: call(
+                available_slots,
+                factory.get(f"/api/appointments/therapists/{profile.user_id}/available-slots/", {'date': tomorrow}),
+                patient, therapist_id=str(profile.user_id),
+            )),
+            ('create_recurring (12 weekly)', lambda: call(
+                create_recurring,
+                factory.post("/api/appointments/recurring/", {
+                    'patient_id': patient.id, 'therapist_id': profile.id, 'start_date': series_start,
+                    'repeat': 'weekly', 'occurrences': 12,
+                }, format='json'),
+                admin,
+            )),
+            ('summary', lambda: call(summary, factory.get("/api/appointments/admin-analytics/summary/"), admin)),
+            ('send_upcoming_session_reminders', send_upcoming_session_reminders),
+            ('auto_close_past_appointments(full)', lambda: (reset_auto_close(), auto_close_past_appointments(full=True))),
+        ]
+
+    def measure(self, name, size, run, repeat):
+        timings = []
+        queries = 0
+        for _ in range(repeat):
+            try:
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        run()
+                        timings.append((time.perf_counter() - started) * 1000)
+                    queries = len(captured.captured_queries)
+                    # Leave the data set untouched for the next run
+                    raise _Rollback
+            except _Rollback:
+                pass
+        return {
+            'name': name,
+            'size': size,
+            'appointments': Appointment.objects.filter(therapist__user__username__startswith=f"{PREFIX}_").count(),
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'queries': queries,
+        }
+
+    def compare(self, results, baseline_path, tolerance, slack_ms):
+        with open(baseline_path) as f:
+            baseline = {(row['name'], row['size']): row for row in json.load(f)}
+
+        regressions = []
+        for row in results:
+            before = baseline.get((row['name'], row['size']))
+            if before is None:
+                continue
+            if row['queries'] > before['queries']:
+                regressions.append(f"{row['name']} @ {row['size']}: {before['queries']} -> {row['queries']} queries")
+            if row['median_ms'] > max(before['median_ms'] * (1 + tolerance), before['median_ms'] + slack_ms):
+                regressions.append(f"{row['name']} @ {row['size']}: {before['median_ms']} -> {row['median_ms']} ms")
+
+        if regressions:
+            raise CommandError("Benchmark regressions:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
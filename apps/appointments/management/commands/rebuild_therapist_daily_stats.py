@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.appointments.analytics import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute TherapistDailyStats rollups from the appointments table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD). Defaults to all history.")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], "%Y-%m-%d").date() if options['start'] else None
+            end = datetime.strptime(options['end'], "%Y-%m-%d").date() if options['end'] else None
+        except ValueError:
+            raise CommandError("Dates must use YYYY-MM-DD.")
+
+        rebuild_daily_stats(start, end)
+        self.stdout.write(self.style.SUCCESS("Therapist daily stats rebuilt."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.appointments.utils import update_therapist_average_rating
+
+
+class Command(BaseCommand):
+    help = "Recompute every therapist's rating count, sum, distribution and average from feedback."
+
+    def handle(self, *args, **options):
+        update_therapist_average_rating()
+        self.stdout.write(self.style.SUCCESS("Therapist ratings rebuilt."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.appointments.no_show import refresh_no_show_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute per-patient and per-therapist no-show stats."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Recompute everyone instead of only what changed since the last run.")
+
+    def handle(self, *args, **options):
+        result = refresh_no_show_stats(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"No-show stats refreshed for {result['patients']} patients and "
+            f"{result['therapists']} therapists in {result['seconds']}s."
+        ))
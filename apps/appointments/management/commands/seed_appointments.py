@@ -0,0 +1,165 @@
+import random
+from datetime import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.timezone import now, timedelta
+
+from apps.appointments.analytics import rebuild_daily_stats
+from apps.appointments.models import Appointment
+from apps.therapists.models import TherapistAvailability, TherapistProfile
+from apps.users.models import CustomUser
+
+TIMEZONES = ['Asia/Riyadh', 'Asia/Dubai', 'Africa/Cairo', 'Europe/London', 'America/New_York']
+SESSION_TYPES = [code for code, _ in Appointment.SESSION_TYPE_CHOICES]
+# (status, weight) for sessions that already ended / are still ahead
+PAST_STATUSES = [('completed', 75), ('missed', 8), ('no_show', 5), ('cancelled', 12)]
+FUTURE_STATUSES = [('confirmed', 55), ('pending', 35), ('cancelled', 10)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic therapists, patients and appointments with bulk inserts, "
+        "for load testing and benchmarks. Every generated user is prefixed so the data can be cleared."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--therapists', type=int, default=100)
+        parser.add_argument('--patients', type=int, default=2000)
+        parser.add_argument('--appointments', type=int, default=100000)
+        parser.add_argument('--days-back', type=int, default=365, help="History window before today.")
+        parser.add_argument('--days-ahead', type=int, default=30, help="Booking window after today.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='seed', help="Username prefix of generated users.")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed, for repeatable data sets.")
+        parser.add_argument('--clear', action='store_true', help="Delete users with this prefix (and their data) first.")
+        parser.add_argument('--skip-rollups', action='store_true', help="Do not rebuild TherapistDailyStats afterwards.")
+
+    def handle(self, *args, **options):
+        therapist_count, patient_count = options['therapists'], options['patients']
+        appointment_count, batch_size = options['appointments'], options['batch_size']
+        if therapist_count < 1 or patient_count < 1 or appointment_count < 0 or batch_size < 1:
+            raise CommandError("--therapists and --patients must be >= 1, --appointments >= 0, --batch-size >= 1.")
+
+        window_hours = (options['days_back'] + options['days_ahead']) * 24
+        per_therapist = -(-appointment_count // therapist_count)
+        if per_therapist > window_hours:
+            raise CommandError(
+                f"{per_therapist} sessions per therapist do not fit in {window_hours} hourly slots; "
+                f"add therapists or widen the window."
+            )
+
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+
+        if options['clear']:
+            deleted, _ = CustomUser.objects.filter(username__startswith=f"{prefix}_").delete()
+            self.stdout.write(f"Cleared {deleted} rows for prefix '{prefix}'.")
+        if CustomUser.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(f"Users with prefix '{prefix}_' already exist; use --clear or another --prefix.")
+
+        therapists, patients = self.create_people(prefix, therapist_count, patient_count, batch_size, rng)
+        self.stdout.write(f"Created {len(therapists)} therapists and {len(patients)} patients.")
+
+        created = self.create_appointments(
+            therapists, patients, appointment_count, per_therapist, window_hours,
+            options['days_back'], batch_size, rng
+        )
+        self.stdout.write(f"Created {created} appointments.")
+
+        if not options['skip_rollups']:
+            today = now().date()
+            rebuild_daily_stats(today - timedelta(days=options['days_back'] + 1), today + timedelta(days=options['days_ahead'] + 1))
+            self.stdout.write("Rebuilt therapist daily stats.")
+
+        self.stdout.write(self.style.SUCCESS("Seeding finished."))
+
+    def create_people(self, prefix, therapist_count, patient_count, batch_size, rng):
+        # One hash for everyone: hashing per user would dominate the run
+        password = make_password(prefix)
+        users = [
+            CustomUser(username=f"{prefix}_t_{i}", email=f"{prefix}_t_{i}@example.com",
+                       user_type='therapist', password=password, is_verified=True)
+            for i in range(therapist_count)
+        ] + [
+            CustomUser(username=f"{prefix}_p_{i}", email=f"{prefix}_p_{i}@example.com",
+                       user_type='patient', password=password, is_verified=True)
+            for i in range(patient_count)
+        ]
+        users.append(CustomUser(username=f"{prefix}_admin", email=f"{prefix}_admin@example.com",
+                                user_type='admin', password=password, is_staff=True))
+
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users, batch_size=batch_size)
+            therapist_ids = list(
+                CustomUser.objects.filter(username__startswith=f"{prefix}_t_").values_list('id', flat=True)
+            )
+            patient_ids = list(
+                CustomUser.objects.filter(username__startswith=f"{prefix}_p_").values_list('id', flat=True)
+            )
+
+            # bulk_create skips the post_save signal that normally creates the profile
+            TherapistProfile.objects.bulk_create([
+                TherapistProfile(
+                    user_id=user_id,
+                    timezone=rng.choice(TIMEZONES),
+                    experience=rng.randint(0, 25),
+                    session_fee=rng.choice([150, 200, 250, 300, 400]),
+                    available_from=time(rng.choice([8, 9, 10]), 0),
+                    available_to=time(rng.choice([16, 17, 18]), 0),
+                    verified=True,
+                )
+                for user_id in therapist_ids
+            ], batch_size=batch_size)
+            profiles = list(TherapistProfile.objects.filter(user_id__in=therapist_ids).values_list('id', flat=True))
+
+            TherapistAvailability.objects.bulk_create([
+                TherapistAvailability(therapist_id=profile_id, day=day, start_time=time(9, 0), end_time=time(17, 0))
+                for profile_id in profiles
+                for day in ('Sun', 'Mon', 'Tue', 'Wed', 'Thu')
+            ], batch_size=batch_size)
+        return profiles, patient_ids
+
+    def create_appointments(self, therapists, patients, total, per_therapist, window_hours, days_back, batch_size, rng):
+        current = now()
+        window_start = (current - timedelta(days=days_back)).replace(minute=0, second=0, microsecond=0)
+        # Each therapist's sessions sit on distinct hours spread over the window
+        stride = max(1, window_hours // max(per_therapist, 1))
+        past_statuses, past_weights = zip(*PAST_STATUSES)
+        future_statuses, future_weights = zip(*FUTURE_STATUSES)
+
+        created = 0
+        batch = []
+        for i in range(total):
+            therapist_id = therapists[i % len(therapists)]
+            slot = (i // len(therapists)) * stride + rng.randrange(stride)
+            scheduled_at = window_start + timedelta(hours=slot)
+            duration = rng.choice([30, 45, 60, 60, 60, 90])
+            ends_at = scheduled_at + timedelta(minutes=duration)
+            past = ends_at <= current
+            status = rng.choices(past_statuses if past else future_statuses,
+                                 past_weights if past else future_weights)[0]
+
+            batch.append(Appointment(
+                patient_id=rng.choice(patients),
+                therapist_id=therapist_id,
+                session_type=rng.choice(SESSION_TYPES),
+                status=status,
+                scheduled_at=scheduled_at,
+                ends_at=ends_at,  # bulk_create skips save(), which normally fills it and active_slot
+                active_slot=None if status == 'cancelled' else scheduled_at,
+                duration_minutes=duration,
+                checked_in=status == 'completed',
+                reminder_sent=past and status != 'cancelled',
+                reminder_15_sent=past and status != 'cancelled' and rng.random() < 0.7,
+            ))
+            if len(batch) >= batch_size:
+                Appointment.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+                self.stdout.write(f"  {created}/{total} appointments")
+        if batch:
+            Appointment.objects.bulk_create(batch)
+            created += len(batch)
+        return created
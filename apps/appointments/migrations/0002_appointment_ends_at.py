@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-19 12:21
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_ends_at(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    batch = []
+    for appt in Appointment.objects.only('id', 'scheduled_at', 'duration_minutes').iterator(chunk_size=2000):
+        appt.ends_at = appt.scheduled_at + timedelta(minutes=appt.duration_minutes or 60)
+        batch.append(appt)
+        if len(batch) >= 2000:
+            Appointment.objects.bulk_update(batch, ['ends_at'])
+            batch = []
+    if batch:
+        Appointment.objects.bulk_update(batch, ['ends_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_ends_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'ends_at'], name='appointment_status_ends_idx'),
+        ),
+    ]
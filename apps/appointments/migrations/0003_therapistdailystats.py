@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-19 12:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('therapists', '0001_initial'),
+        ('appointments', '0002_appointment_ends_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TherapistDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('missed', models.PositiveIntegerField(default=0)),
+                ('minutes', models.PositiveIntegerField(default=0)),
+                ('therapist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='therapists.therapistprofile')),
+            ],
+            options={
+                'unique_together': {('therapist', 'date')},
+            },
+        ),
+    ]
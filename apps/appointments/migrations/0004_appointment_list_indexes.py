@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-19 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_therapistdailystats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'scheduled_at'], name='appointment_patient_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'status', 'scheduled_at'], name='appointment_patient_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['therapist', 'status', 'scheduled_at'], name='appointment_therap_status_idx'),
+        ),
+    ]
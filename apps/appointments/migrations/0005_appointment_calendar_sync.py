@@ -0,0 +1,51 @@
+# Generated by Django 4.2 on 2026-10-19 12:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('therapists', '0002_therapistprofile_rating_aggregates'),
+        ('appointments', '0004_appointment_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'updated_at'], name='appointment_patient_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['therapist', 'updated_at'], name='appointment_therap_upd_idx'),
+        ),
+        migrations.AddField(
+            model_name='appointmenttombstone',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='appointmenttombstone',
+            name='therapist',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_tombstones', to='therapists.therapistprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmenttombstone',
+            index=models.Index(fields=['patient', 'deleted_at'], name='tombstone_patient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmenttombstone',
+            index=models.Index(fields=['therapist', 'deleted_at'], name='tombstone_therapist_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-19 12:28
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointment_calendar_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=30)),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_events', to='appointments.appointment')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='appointmentoutbox',
+            index=models.Index(fields=['processed_at', 'id'], name='appointment_outbox_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2 on 2026-10-19 12:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('therapists', '0002_therapistprofile_rating_aggregates'),
+        ('appointments', '0006_appointmentoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('days', models.JSONField(blank=True, default=list, help_text='Subset of Mon..Sun')),
+                ('earliest_time', models.TimeField(blank=True, null=True)),
+                ('latest_time', models.TimeField(blank=True, null=True)),
+                ('valid_until', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('offered', 'Offered'), ('booked', 'Booked'), ('withdrawn', 'Withdrawn')], default='waiting', max_length=10)),
+                ('offered_at', models.DateTimeField(blank=True, null=True)),
+                ('offered_duration', models.PositiveIntegerField(blank=True, null=True)),
+                ('offer_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='appointment',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['therapist', 'scheduled_at'], name='appointment_therap_sched_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('therapist', 'scheduled_at'), name='unique_active_therapist_slot'),
+        ),
+        migrations.AddField(
+            model_name='waitlistentry',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='waitlistentry',
+            name='therapist',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='therapists.therapistprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='waitlistentry',
+            index=models.Index(fields=['therapist', 'status', 'created_at'], name='waitlist_therapist_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waitlistentry',
+            index=models.Index(fields=['therapist', 'status', 'offered_at'], name='waitlist_therapist_offer_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-19 12:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('appointments', '0007_waitlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=100)),
+                ('timestamp', models.DateTimeField()),
+                ('notes', models.TextField(blank=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='appointmentlog',
+            index=models.Index(fields=['appointment', 'timestamp'], name='appointment_log_appt_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentlog',
+            index=models.Index(fields=['timestamp'], name='appointment_log_ts_idx'),
+        ),
+        migrations.AddField(
+            model_name='appointmentlogarchive',
+            name='appointment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_logs', to='appointments.appointment'),
+        ),
+        migrations.AddField(
+            model_name='appointmentlogarchive',
+            name='performed_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentlogarchive',
+            index=models.Index(fields=['appointment', 'timestamp'], name='appointment_logarc_appt_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2 on 2026-10-19 12:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('therapists', '0002_therapistprofile_rating_aggregates'),
+        ('appointments', '0008_appointment_log_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoShowStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolved', models.PositiveIntegerField(default=0)),
+                ('no_shows', models.PositiveIntegerField(default=0)),
+                ('checked_in', models.PositiveIntegerField(default=0)),
+                ('no_show_rate', models.FloatField(default=0.0)),
+                ('last_session_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['updated_at'], name='appointment_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='noshowstats',
+            name='patient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='no_show_stats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='noshowstats',
+            name='therapist',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='no_show_stats', to='therapists.therapistprofile'),
+        ),
+        migrations.AddConstraint(
+            model_name='noshowstats',
+            constraint=models.UniqueConstraint(condition=models.Q(('therapist__isnull', True)), fields=('patient',), name='unique_patient_no_show_stats'),
+        ),
+        migrations.AddConstraint(
+            model_name='noshowstats',
+            constraint=models.UniqueConstraint(condition=models.Q(('patient__isnull', True)), fields=('therapist',), name='unique_therapist_no_show_stats'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-19 13:28
+
+from django.db import migrations, models
+
+
+def backfill_active_slot(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    Appointment.objects.exclude(status='cancelled').update(active_slot=models.F('scheduled_at'))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0010_job_state'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='appointment',
+            name='unique_active_therapist_slot',
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='active_slot',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_active_slot, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('therapist', 'active_slot'), name='unique_active_therapist_slot'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0011_appointment_active_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointmenttombstone',
+            name='scheduled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,8 +1,9 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from apps.users.models import CustomUser  # make sure this import is at the top
 from django.db import models
-from django.utils.timezone import now
+from django.utils.timezone import now, timedelta
 class Appointment(models.Model):
     SESSION_TYPE_CHOICES = [
         ('chat', 'Chat'),
@@ -34,17 +35,71 @@ class Appointment(models.Model):
     reminder_sent = models.BooleanField(default=False)
     reminder_15_sent = models.BooleanField(default=False)
     checked_in = models.BooleanField(default=False)
+    ends_at = models.DateTimeField(null=True, blank=True, editable=False)  # scheduled_at + duration_minutes, kept in save()
+    # scheduled_at while the session holds its slot, NULL once cancelled; kept in save()
+    active_slot = models.DateTimeField(null=True, blank=True, editable=False)
     class Meta:
-        unique_together = ('therapist', 'scheduled_at')  # prevent double-booking
+        constraints = [
+            # prevent double-booking; a cancelled session frees its slot for rebooking.
+            # Not a conditional constraint: MySQL ignores those, but every backend
+            # lets NULLs repeat in a unique key.
+            models.UniqueConstraint(fields=['therapist', 'active_slot'], name='unique_active_therapist_slot'),
+        ]
+        indexes = [
+            models.Index(fields=['therapist', 'scheduled_at'], name='appointment_therap_sched_idx'),
+            models.Index(fields=['status', 'ends_at'], name='appointment_status_ends_idx'),
+            # filter=upcoming/past/cancelled list paths
+            models.Index(fields=['patient', 'scheduled_at'], name='appointment_patient_sched_idx'),
+            models.Index(fields=['patient', 'status', 'scheduled_at'], name='appointment_patient_status_idx'),
+            models.Index(fields=['therapist', 'status', 'scheduled_at'], name='appointment_therap_status_idx'),
+            # calendar feed sync tokens
+            models.Index(fields=['patient', 'updated_at'], name='appointment_patient_upd_idx'),
+            models.Index(fields=['therapist', 'updated_at'], name='appointment_therap_upd_idx'),
+            # incremental batch jobs (no-show stats)
+            models.Index(fields=['updated_at'], name='appointment_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient.username} with {self.therapist.user.username} on {self.scheduled_at}"
 
+    def save(self, *args, **kwargs):
+        if self.scheduled_at:
+            self.ends_at = self.scheduled_at + timedelta(minutes=self.duration_minutes or 60)
+        self.active_slot = None if self.status == 'cancelled' else self.scheduled_at
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            if {'scheduled_at', 'duration_minutes'} & set(update_fields):
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'ends_at'}
+            if {'scheduled_at', 'status'} & set(update_fields):
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'active_slot'}
+        super().save(*args, **kwargs)
+
 
 
     
 
 
+class AppointmentTombstone(models.Model):
+    """
+    Left behind when an appointment row is deleted so calendar sync clients
+    can be told to drop it (see AppointmentViewSet.calendar_feed).
+    """
+    appointment_id = models.BigIntegerField()
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='appointment_tombstones')
+    therapist = models.ForeignKey('therapists.TherapistProfile', on_delete=models.CASCADE, related_name='appointment_tombstones')
+    scheduled_at = models.DateTimeField(null=True, blank=True)  # the deleted session's start, for its VEVENT
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'deleted_at'], name='tombstone_patient_idx'),
+            models.Index(fields=['therapist', 'deleted_at'], name='tombstone_therapist_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted appointment #{self.appointment_id} at {self.deleted_at}"
+
+
 class AppointmentLog(models.Model):
     appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='logs')
     performed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
@@ -52,6 +107,30 @@ class AppointmentLog(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['appointment', 'timestamp'], name='appointment_log_appt_ts_idx'),
+            models.Index(fields=['timestamp'], name='appointment_log_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.performed_by} - {self.action} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+
+
+class AppointmentLogArchive(models.Model):
+    """Audit log rows moved out of AppointmentLog once past the retention window."""
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='archived_logs')
+    performed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+')
+    action = models.CharField(max_length=100)
+    timestamp = models.DateTimeField()
+    notes = models.TextField(blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['appointment', 'timestamp'], name='appointment_logarc_appt_ts_idx'),
+        ]
+
     def __str__(self):
         return f"{self.performed_by} - {self.action} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
 
@@ -78,4 +157,125 @@ class ReminderLog(models.Model):
     sent_at = models.DateTimeField(default=now)
 
     def __str__(self):
-        return f"{self.reminder_type} reminder to {self.sent_to} for appointment #{self.appointment_id}"
\ No newline at end of file
+        return f"{self.reminder_type} reminder to {self.sent_to} for appointment #{self.appointment_id}"
+
+class TherapistDailyStats(models.Model):
+    """
+    Per-therapist, per-day appointment rollup kept in step with status
+    transitions (see apps.appointments.analytics) so dashboards never have to
+    scan the appointments table.
+    """
+    therapist = models.ForeignKey('therapists.TherapistProfile', on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    booked = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    missed = models.PositiveIntegerField(default=0)  # missed + no_show
+    minutes = models.PositiveIntegerField(default=0)  # minutes of completed sessions
+
+    class Meta:
+        unique_together = ('therapist', 'date')
+
+    def __str__(self):
+        return f"{self.therapist_id} on {self.date}: {self.booked} booked, {self.completed} completed"
+
+
+class NoShowStats(models.Model):
+    """
+    Attendance history of one patient or one therapist over resolved
+    (completed / missed / no-show) appointments. Refreshed by the
+    refresh_no_show_stats batch job, see apps.appointments.no_show.
+    """
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='no_show_stats')
+    therapist = models.ForeignKey('therapists.TherapistProfile', on_delete=models.CASCADE, null=True, blank=True, related_name='no_show_stats')
+    resolved = models.PositiveIntegerField(default=0)
+    no_shows = models.PositiveIntegerField(default=0)
+    checked_in = models.PositiveIntegerField(default=0)
+    no_show_rate = models.FloatField(default=0.0)  # no_shows / resolved, unsmoothed
+    last_session_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['patient'], condition=models.Q(therapist__isnull=True), name='unique_patient_no_show_stats'),
+            models.UniqueConstraint(fields=['therapist'], condition=models.Q(patient__isnull=True), name='unique_therapist_no_show_stats'),
+        ]
+
+    def __str__(self):
+        subject = f"patient {self.patient_id}" if self.patient_id else f"therapist {self.therapist_id}"
+        return f"{subject}: {self.no_shows}/{self.resolved} no-shows"
+
+
+class JobState(models.Model):
+    """
+    Watermark and last-run metrics of one periodic batch job. Kept in the
+    database so every process (workers, web) reads the same values.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    watermark = models.DateTimeField(null=True, blank=True)
+    data = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} (watermark {self.watermark})"
+
+
+class AppointmentOutbox(models.Model):
+    """
+    Side effects of an appointment state change (logs, notifications,
+    analytics, reminders), written in the same transaction as the change and
+    delivered later by `process_appointment_outbox`.
+    """
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='outbox_events')
+    event = models.CharField(max_length=30)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_at', 'id'], name='appointment_outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} for appointment #{self.appointment_id} ({'done' if self.processed_at else 'pending'})"
+
+
+
+class WaitlistEntry(models.Model):
+    """
+    A patient waiting for a slot with a therapist. When a session is
+    cancelled, apps.appointments.waitlist offers the freed slot to the
+    first matching entry and holds it for WAITLIST_HOLD_MINUTES.
+    """
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('offered', 'Offered'),
+        ('booked', 'Booked'),
+        ('withdrawn', 'Withdrawn'),
+    ]
+
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='waitlist_entries')
+    therapist = models.ForeignKey('therapists.TherapistProfile', on_delete=models.CASCADE, related_name='waitlist_entries')
+    # Preferences; empty means "any"
+    days = models.JSONField(default=list, blank=True, help_text="Subset of Mon..Sun")
+    earliest_time = models.TimeField(null=True, blank=True)
+    latest_time = models.TimeField(null=True, blank=True)
+    valid_until = models.DateField(null=True, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    offered_at = models.DateTimeField(null=True, blank=True)  # start of the slot on offer
+    offered_duration = models.PositiveIntegerField(null=True, blank=True)
+    offer_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['therapist', 'status', 'created_at'], name='waitlist_therapist_status_idx'),
+            models.Index(fields=['therapist', 'status', 'offered_at'], name='waitlist_therapist_offer_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.username} waiting for {self.therapist.user.username} ({self.status})"
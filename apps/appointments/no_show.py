@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils.timezone import now, timedelta
+
+from .models import Appointment, JobState, NoShowStats
+
+RESOLVED_STATUSES = ('completed', 'missed', 'no_show')
+NO_SHOW_STATUSES = ('missed', 'no_show')
+
+# Pseudo-observations pulling a short history towards the wider average
+PRIOR_WEIGHT = 5
+
+NO_SHOW_JOB = 'refresh_no_show_stats'
+# Overlap with the previous run so rows committed late are still picked up
+NO_SHOW_LOOKBACK = timedelta(minutes=10)
+NO_SHOW_CHUNK_SIZE = 500
+
+_SUBJECT_FIELDS = {'patient': 'patient_id', 'therapist': 'therapist_id'}
+
+
+def _counts():
+    return {
+        'resolved': Count('id'),
+        'no_shows': Count('id', filter=Q(status__in=NO_SHOW_STATUSES)),
+        'checked_in': Count('id', filter=Q(checked_in=True)),
+        'last_session_at': Max('scheduled_at'),
+    }
+
+
+def _refresh_subjects(kind, subject_ids):
+    """Recompute the stats rows of `kind` ('patient' / 'therapist') for the given ids."""
+    field = _SUBJECT_FIELDS[kind]
+    other = 'therapist' if kind == 'patient' else 'patient'
+    subject_ids = sorted(subject_ids)
+
+    for i in range(0, len(subject_ids), NO_SHOW_CHUNK_SIZE):
+        chunk = subject_ids[i:i + NO_SHOW_CHUNK_SIZE]
+        # One grouped query per chunk; the database does the counting
+        totals = {
+            row[field]: row
+            for row in Appointment.objects.filter(**{f'{field}__in': chunk}, status__in=RESOLVED_STATUSES)
+            .values(field).annotate(**_counts()).order_by()
+        }
+        with transaction.atomic():
+            existing = {
+                getattr(stats, field): stats
+                for stats in NoShowStats.objects.select_for_update()
+                .filter(**{f'{field}__in': chunk, f'{other}__isnull': True})
+            }
+            to_create, to_update = [], []
+            for subject_id in chunk:
+                row = totals.get(subject_id, {})
+                resolved = row.get('resolved', 0)
+                stats = existing.get(subject_id)
+                if stats is None:
+                    if not resolved:
+                        continue
+                    stats = NoShowStats(**{field: subject_id})
+                    to_create.append(stats)
+                else:
+                    to_update.append(stats)
+                stats.resolved = resolved
+                stats.no_shows = row.get('no_shows', 0)
+                stats.checked_in = row.get('checked_in', 0)
+                stats.no_show_rate = stats.no_shows / resolved if resolved else 0.0
+                stats.last_session_at = row.get('last_session_at')
+                stats.updated_at = now()
+            NoShowStats.objects.bulk_create(to_create)
+            NoShowStats.objects.bulk_update(
+                to_update, ['resolved', 'no_shows', 'checked_in', 'no_show_rate', 'last_session_at', 'updated_at']
+            )
+
+
+def _reminder_breakdown():
+    """No-show rate of resolved sessions by which reminders went out."""
+    labels = {
+        (False, False): 'none',
+        (True, False): '1h',
+        (False, True): '15m',
+        (True, True): '1h+15m',
+    }
+    rows = (
+        Appointment.objects.filter(status__in=RESOLVED_STATUSES)
+        .values('reminder_sent', 'reminder_15_sent')
+        .annotate(resolved=Count('id'), no_shows=Count('id', filter=Q(status__in=NO_SHOW_STATUSES)))
+        .order_by()
+    )
+    return sorted(
+        (
+            {
+                'reminders': labels[(row['reminder_sent'], row['reminder_15_sent'])],
+                'resolved': row['resolved'],
+                'no_shows': row['no_shows'],
+                'no_show_rate': round(row['no_shows'] / row['resolved'], 4) if row['resolved'] else 0.0,
+            }
+            for row in rows
+        ),
+        key=lambda row: row['reminders'],
+    )
+
+
+def refresh_no_show_stats(full=False):
+    """
+    Bring NoShowStats up to date. Incremental runs only recompute patients
+    and therapists with an appointment updated since the last run; a full
+    run recomputes everyone and the reminder breakdown. The watermark and
+    the breakdown are kept in JobState for the report. Returns a summary.
+    """
+    started = now()
+    state = JobState.objects.filter(name=NO_SHOW_JOB).first()
+    watermark = None if full or state is None else state.watermark
+
+    resolved = Appointment.objects.filter(status__in=RESOLVED_STATUSES)
+    if watermark is None:
+        changed = resolved
+    else:
+        # Status corrections can also take a row out of the resolved set
+        changed = Appointment.objects.filter(updated_at__gte=watermark - NO_SHOW_LOOKBACK)
+
+    patient_ids = set(changed.values_list('patient_id', flat=True).distinct().order_by())
+    therapist_ids = set(changed.values_list('therapist_id', flat=True).distinct().order_by())
+    if watermark is None:
+        # Subjects whose only resolved rows were deleted or reopened
+        patient_ids |= set(NoShowStats.objects.filter(patient__isnull=False).values_list('patient_id', flat=True))
+        therapist_ids |= set(NoShowStats.objects.filter(therapist__isnull=False).values_list('therapist_id', flat=True))
+
+    _refresh_subjects('patient', patient_ids)
+    _refresh_subjects('therapist', therapist_ids)
+
+    summary = dict(state.data) if state else {}
+    if watermark is None or 'reminders' not in summary:
+        summary['reminders'] = _reminder_breakdown()
+    JobState.objects.update_or_create(name=NO_SHOW_JOB, defaults={'watermark': started, 'data': summary})
+
+    return {
+        'full': watermark is None,
+        'patients': len(patient_ids),
+        'therapists': len(therapist_ids),
+        'seconds': round((now() - started).total_seconds(), 3),
+    }
+
+
+def _smoothed(no_shows, resolved, prior_rate):
+    return (no_shows + PRIOR_WEIGHT * prior_rate) / (resolved + PRIOR_WEIGHT)
+
+
+def no_show_risk(patient_stats, therapist_stats, global_rate):
+    """
+    Estimated no-show probability of one session. The therapist's rate is
+    smoothed towards the global one and serves as the prior for the
+    patient's own history, so first-time patients inherit their
+    therapist's rate.
+    """
+    therapist_rate = global_rate
+    if therapist_stats:
+        therapist_rate = _smoothed(therapist_stats.no_shows, therapist_stats.resolved, global_rate)
+    if not patient_stats:
+        return therapist_rate
+    return _smoothed(patient_stats.no_shows, patient_stats.resolved, therapist_rate)
+
+
+def no_show_summary():
+    """Global no-show rate from the stored stats, plus the last job's reminder breakdown."""
+    # Every resolved appointment is counted in exactly one therapist row
+    totals = NoShowStats.objects.filter(therapist__isnull=False).aggregate(
+        resolved=Sum('resolved'), no_shows=Sum('no_shows')
+    )
+    resolved, no_shows = totals['resolved'] or 0, totals['no_shows'] or 0
+    state = JobState.objects.filter(name=NO_SHOW_JOB).first()
+    return {
+        'resolved': resolved,
+        'no_shows': no_shows,
+        'no_show_rate': no_shows / resolved if resolved else 0.0,
+        'updated_at': state.watermark if state else None,
+        'reminders': state.data.get('reminders', []) if state else [],
+    }
@@ -0,0 +1,120 @@
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from apps.notifications.tasks import send_notification_task
+from .analytics import record_transition
+from .models import AppointmentLog, AppointmentOutbox
+from .realtime import push_appointment_status
+from .utils import arm_session_reminders, queue_logs
+
+# event -> default AppointmentLog action (None: not logged)
+LOG_ACTIONS = {
+    'booked': None,
+    'confirm': "Appointment confirmed",
+    'reschedule': "Rescheduled",
+    'cancel': "Cancelled appointment",
+    'complete': "Status changed to completed",
+    'mark_no_show': "Status changed to no_show",
+}
+
+
+def _when(value):
+    return parse_datetime(value).strftime('%Y-%m-%d %H:%M')
+
+
+def _notifications(appointment, event, payload):
+    """(user, message) pairs for an event."""
+    patient = appointment.patient
+    therapist_user = appointment.therapist.user
+    when = _when(payload['new_scheduled_at'])
+
+    if event == 'booked':
+        if payload.get('recurring'):
+            return [(therapist_user, f"[Recurring Session] New session scheduled with {patient.username} on {when}.")]
+        return [(therapist_user, f"[New Request] {patient.username} has requested a session scheduled at {when}.")]
+    if event == 'confirm':
+        return [(patient, f"[Confirmed] Your session with {therapist_user.username} is confirmed for {when}.")]
+    if event == 'reschedule':
+        return [
+            (therapist_user, f"[Rescheduled] {patient.username} has rescheduled the session to {when}."),
+            (patient, f"[Rescheduled] Your session has been updated to {when}."),
+        ]
+    if event == 'cancel':
+        return [
+            (patient, f"[Cancelled] Your session scheduled at {when} has been cancelled by {payload.get('username')}."),
+            (therapist_user, f"[Cancelled] Your session with {patient.username} at {when} has been cancelled."),
+        ]
+    return []
+
+
+def _record_analytics(appointment, payload):
+    if 'new_status' in payload:
+        record_transition(
+            appointment.therapist_id,
+            appointment.duration_minutes,
+            payload.get('old_status'),
+            parse_datetime(payload['old_scheduled_at']) if payload.get('old_scheduled_at') else None,
+            payload['new_status'],
+            parse_datetime(payload['new_scheduled_at']),
+        )
+
+
+def flush_pending_analytics(appointment):
+    """
+    Apply the rollup deltas of the appointment's undelivered outbox entries
+    now, and drop the entries. Call inside the transaction that deletes the
+    appointment: its entries are cascade-deleted with it, so their deltas
+    (e.g. the "booked" increment) would otherwise never reach the rollups
+    while the delete's own delta does. Locking the entries makes a worker
+    delivering them right now finish first.
+    """
+    entries = list(
+        AppointmentOutbox.objects.select_for_update()
+        .filter(appointment=appointment, processed_at__isnull=True)
+        .order_by('id')
+    )
+    for entry in entries:
+        _record_analytics(appointment, entry.payload)
+    AppointmentOutbox.objects.filter(id__in=[entry.id for entry in entries]).delete()
+
+
+def deliver(entry):
+    """Run every side effect of one outbox entry. Raises to leave it pending."""
+    appointment = entry.appointment
+    payload = entry.payload
+    event = entry.event
+
+    # Analytics rollups
+    _record_analytics(appointment, payload)
+
+    # Reminders: a rescheduled appointment is pending again and is armed when its new time is confirmed
+    if event == 'confirm':
+        arm_session_reminders(appointment)
+
+    # Backfill a freed slot from the therapist's waitlist
+    freed_slot = {'cancel': 'new_scheduled_at', 'reschedule': 'old_scheduled_at'}.get(event)
+    if freed_slot and payload.get(freed_slot):
+        from .tasks import match_waitlist_for_slot
+        transaction.on_commit(lambda: match_waitlist_for_slot.delay(
+            appointment.therapist_id, payload[freed_slot], appointment.duration_minutes
+        ))
+
+    # Live status for anyone watching the appointment
+    push_appointment_status(appointment.id)
+
+    # Notifications, only once the entry is marked delivered
+    if payload.get('notify', True):
+        for user, message in _notifications(appointment, event, payload):
+            transaction.on_commit(
+                lambda user_id=user.id, message=message: send_notification_task.delay(user_id, message)
+            )
+
+    # Audit log, queued last so a failure above leaves nothing behind;
+    # rows for the whole batch are inserted together at commit
+    action = payload.get('log_action') or LOG_ACTIONS.get(event)
+    if action:
+        queue_logs([AppointmentLog(
+            appointment=appointment,
+            performed_by_id=payload.get('user_id'),
+            action=action,
+        )])
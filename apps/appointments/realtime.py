@@ -0,0 +1,81 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Appointment
+
+logger = logging.getLogger(__name__)
+
+APPOINTMENT_STATUS_KEY = 'appointments:status:{}'
+APPOINTMENT_STATUS_TTL = 60  # bulk .update() paths rely on this for expiry
+SNAPSHOT_FIELDS = (
+    'id', 'status', 'scheduled_at', 'checked_in', 'updated_at',
+    'patient_id', 'patient__username', 'therapist__user_id', 'therapist__user__username',
+)
+
+
+def status_group(appointment_id):
+    return f"appointment_{appointment_id}"
+
+
+def get_appointment_status(appointment_id):
+    """
+    Status snapshot of one appointment, including the participant ids used
+    for access checks. Served from the cache; None if it does not exist.
+    """
+    key = APPOINTMENT_STATUS_KEY.format(appointment_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = Appointment.objects.filter(pk=appointment_id).values(*SNAPSHOT_FIELDS).first()
+        if snapshot is None:
+            return None
+        cache.set(key, snapshot, APPOINTMENT_STATUS_TTL)
+    return snapshot
+
+
+def public_status(snapshot):
+    return {
+        "id": snapshot['id'],
+        "status": snapshot['status'],
+        "scheduled_at": snapshot['scheduled_at'],
+        "checked_in": snapshot['checked_in'],
+        "therapist": snapshot['therapist__user__username'],
+        "patient": snapshot['patient__username'],
+    }
+
+
+def invalidate_appointment_status(*appointment_ids):
+    cache.delete_many([APPOINTMENT_STATUS_KEY.format(appointment_id) for appointment_id in appointment_ids])
+
+
+def push_appointment_status(*appointment_ids):
+    """
+    Once the current transaction commits, refresh the cached snapshots and
+    send an `appointment_status` event to everyone subscribed to each
+    appointment (see AppointmentStatusConsumer). One query for all of them.
+    """
+    def push():
+        invalidate_appointment_status(*appointment_ids)
+        snapshots = list(Appointment.objects.filter(pk__in=appointment_ids).values(*SNAPSHOT_FIELDS))
+        cache.set_many(
+            {APPOINTMENT_STATUS_KEY.format(snapshot['id']): snapshot for snapshot in snapshots},
+            APPOINTMENT_STATUS_TTL,
+        )
+        channel_layer = get_channel_layer()
+        for snapshot in snapshots:
+            payload = public_status(snapshot)
+            payload['scheduled_at'] = payload['scheduled_at'].isoformat()
+            try:
+                async_to_sync(channel_layer.group_send)(
+                    status_group(snapshot['id']),
+                    {'type': 'appointment_status', 'appointment': payload},
+                )
+            except Exception as e:
+                # Clients fall back to the status endpoint; never fail the write for this
+                logger.warning(f"[Appointments] Status push for #{snapshot['id']} failed: {e}")
+                return
+
+    transaction.on_commit(push)
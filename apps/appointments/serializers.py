@@ -1,13 +1,16 @@
 ﻿from rest_framework import serializers
 from .models import Appointment
 from .models import AppointmentLog
+from .models import AppointmentLogArchive
 from .models import AppointmentFeedback
+from .models import WaitlistEntry
+from .waitlist import slot_is_held
+from apps.therapists.models import DAY_CHOICES
+from apps.therapists.utils import local_to_utc, therapist_zone
 from datetime import datetime
-from django.utils.timezone import make_aware
 from apps.therapists.models import TherapistProfile
 from rest_framework import serializers
 from datetime import datetime, timedelta
-from django.utils.timezone import make_aware
 from apps.appointments.models import Appointment
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -31,13 +34,15 @@ class AppointmentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'patient', 'status', 'notes', 'scheduled_at', 'duration_minutes']
 
+    # date/time in and out are wall-clock values in the therapist's zone
     def get_date_output(self, obj):
-        return obj.scheduled_at.date()
+        return obj.scheduled_at.astimezone(therapist_zone(obj.therapist)).date()
 
     def get_time_output(self, obj):
-        start = obj.scheduled_at.time().strftime('%H:%M')
+        zone = therapist_zone(obj.therapist)
+        start = obj.scheduled_at.astimezone(zone).strftime('%H:%M')
         end_dt = obj.scheduled_at + timedelta(minutes=obj.duration_minutes or 60)
-        end = end_dt.time().strftime('%H:%M')
+        end = end_dt.astimezone(zone).strftime('%H:%M')
         return {"start": start, "end": end}
 
     def validate(self, data):
@@ -56,14 +61,20 @@ class AppointmentSerializer(serializers.ModelSerializer):
         if end_time <= start_time:
             raise serializers.ValidationError("End time must be after start time.")
 
-        # Combine to datetime
-        scheduled_at = make_aware(datetime.combine(data['date'], start_time))
-        duration_minutes = int((datetime.combine(data['date'], end_time) - datetime.combine(data['date'], start_time)).total_seconds() // 60)
+        # Combine to datetime in the therapist's zone
+        therapist_profile = data.get('therapist')
+        zone = therapist_zone(therapist_profile)
+        scheduled_at = local_to_utc(zone, data['date'], start_time)
+        ends_at = local_to_utc(zone, data['date'], end_time)
+        if scheduled_at is None or ends_at is None:
+            raise serializers.ValidationError("This time does not exist in the therapist's timezone (daylight saving change).")
+        duration_minutes = int((ends_at - scheduled_at).total_seconds() // 60)
 
         # Double-booking check
-        therapist_profile = data.get('therapist')
-        if Appointment.objects.filter(therapist=therapist_profile, scheduled_at=scheduled_at).exists():
+        if Appointment.objects.filter(therapist=therapist_profile, scheduled_at=scheduled_at).exclude(status='cancelled').exists():
             raise serializers.ValidationError("This time slot is already booked.")
+        if slot_is_held(therapist_profile.id, scheduled_at, exclude_patient=user):
+            raise serializers.ValidationError("This time slot is being held for a waitlisted patient.")
 
         # Inject calculated fields
         data['scheduled_at'] = scheduled_at
@@ -78,13 +89,55 @@ class AppointmentSerializer(serializers.ModelSerializer):
         validated_data.pop('time')
         return super().create(validated_data)
 
-    
+
+class AppointmentListSerializer(serializers.ModelSerializer):
+    """
+    Read-only list representation with the same output shape as
+    AppointmentSerializer. Built straight from the row (end time comes from
+    the stored `ends_at`), without per-field serializer machinery.
+    """
+
+    class Meta:
+        model = Appointment
+        fields = [
+            'id', 'patient', 'therapist', 'session_type',
+            'status', 'scheduled_at', 'notes',
+            'is_recurring', 'recurring_group',
+            'duration_minutes'
+        ]
+        read_only_fields = fields
+
+    def to_representation(self, obj):
+        zone = therapist_zone(obj.therapist)
+        scheduled_at = obj.scheduled_at.astimezone(zone)
+        ends_at = (obj.ends_at or obj.scheduled_at + timedelta(minutes=obj.duration_minutes or 60)).astimezone(zone)
+        return {
+            'id': obj.id,
+            'patient': obj.patient_id,
+            'therapist': obj.therapist_id,
+            'session_type': obj.session_type,
+            'status': obj.status,
+            'scheduled_at': serializers.DateTimeField().to_representation(obj.scheduled_at),
+            'notes': obj.notes,
+            'is_recurring': obj.is_recurring,
+            'recurring_group': str(obj.recurring_group) if obj.recurring_group else None,
+            'date_output': scheduled_at.date().isoformat(),
+            'time_output': {"start": scheduled_at.strftime('%H:%M'), "end": ends_at.strftime('%H:%M')},
+            'duration_minutes': obj.duration_minutes,
+        }
+
+
 class AppointmentLogSerializer(serializers.ModelSerializer):
     performed_by_name = serializers.CharField(source='performed_by.username', read_only=True)
 
     class Meta:
         model = AppointmentLog
         fields = ['id', 'performed_by_name', 'action', 'notes', 'timestamp']
+
+
+class AppointmentLogArchiveSerializer(AppointmentLogSerializer):
+    class Meta(AppointmentLogSerializer.Meta):
+        model = AppointmentLogArchive
         
 
 
@@ -117,3 +170,34 @@ class AppointmentFeedbackSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data.pop('appointment_id')
         return super().create(validated_data)
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WaitlistEntry
+        fields = [
+            'id', 'therapist', 'days', 'earliest_time', 'latest_time', 'valid_until',
+            'status', 'offered_at', 'offered_duration', 'offer_expires_at', 'created_at'
+        ]
+        read_only_fields = ['id', 'status', 'offered_at', 'offered_duration', 'offer_expires_at', 'created_at']
+
+    def validate_days(self, value):
+        valid_days = {code for code, _ in DAY_CHOICES}
+        if any(day not in valid_days for day in value):
+            raise serializers.ValidationError(f"Days must be among {', '.join(sorted(valid_days))}.")
+        return value
+
+    def validate(self, data):
+        user = self.context['request'].user
+        if user.user_type != 'patient':
+            raise serializers.ValidationError("Only patients can join a waitlist.")
+
+        earliest, latest = data.get('earliest_time'), data.get('latest_time')
+        if earliest and latest and latest < earliest:
+            raise serializers.ValidationError("latest_time must be after earliest_time.")
+
+        if WaitlistEntry.objects.filter(
+            patient=user, therapist=data['therapist'], status__in=['waiting', 'offered']
+        ).exists():
+            raise serializers.ValidationError("You are already on this therapist's waitlist.")
+        return data
@@ -0,0 +1,40 @@
+# apps/appointments/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Appointment, AppointmentFeedback, AppointmentTombstone
+from .realtime import invalidate_appointment_status
+from .utils import apply_feedback_rating
+
+
+@receiver(post_save, sender=AppointmentFeedback)
+def add_feedback_rating(sender, instance, created, **kwargs):
+    if created:
+        apply_feedback_rating(instance.appointment.therapist_id, instance.rating)
+
+
+@receiver(post_delete, sender=AppointmentFeedback)
+def remove_feedback_rating(sender, instance, **kwargs):
+    apply_feedback_rating(instance.appointment.therapist_id, instance.rating, sign=-1)
+
+
+@receiver(post_save, sender=Appointment)
+def drop_cached_appointment_status(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_appointment_status(instance.pk))
+
+
+@receiver(post_delete, sender=Appointment)
+def leave_appointment_tombstone(sender, instance, origin=None, **kwargs):
+    # Only for direct deletes: a cascade from a deleted user or therapist
+    # profile would point the tombstone at a row that is about to vanish.
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin is None or origin_model is Appointment:
+        AppointmentTombstone.objects.create(
+            appointment_id=instance.pk,
+            patient_id=instance.patient_id,
+            therapist_id=instance.therapist_id,
+            scheduled_at=instance.scheduled_at,
+        )
+    transaction.on_commit(lambda: invalidate_appointment_status(instance.pk))
@@ -0,0 +1,93 @@
+from django.db import transaction
+
+from .models import AppointmentOutbox
+
+# event -> (statuses it may start from, status it ends in)
+TRANSITIONS = {
+    'confirm': (('pending',), 'confirmed'),
+    'reschedule': (('pending', 'confirmed'), 'pending'),
+    'cancel': (('pending', 'confirmed'), 'cancelled'),
+    'complete': (('confirmed',), 'completed'),
+    'mark_no_show': (('confirmed',), 'no_show'),
+}
+
+# update-status payload value -> event
+STATUS_EVENTS = {
+    'completed': 'complete',
+    'cancelled': 'cancel',
+    'no_show': 'mark_no_show',
+}
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def can_transition(appointment, event):
+    return appointment.status in TRANSITIONS[event][0]
+
+
+def _enqueue_outbox():
+    from .tasks import process_appointment_outbox
+    process_appointment_outbox.delay()
+
+
+def record_events(appointments, event, user=None, old_status=None, **payload):
+    """
+    Write one outbox row per appointment for `event` and schedule delivery
+    once the surrounding transaction commits. The caller's transaction is
+    what makes the change and its side effects atomic.
+    The new state defaults to each appointment's current status and time.
+    """
+    AppointmentOutbox.objects.bulk_create([
+        AppointmentOutbox(
+            appointment=appointment,
+            event=event,
+            payload={
+                'user_id': getattr(user, 'id', None),
+                'username': getattr(user, 'username', None),
+                'old_status': old_status,
+                'old_scheduled_at': appointment.scheduled_at if old_status else None,
+                'new_status': appointment.status,
+                'new_scheduled_at': appointment.scheduled_at,
+                **payload,
+            },
+        )
+        for appointment in appointments
+    ])
+    transaction.on_commit(_enqueue_outbox)
+
+
+def transition(appointment, event, user=None, notify=True, log_action=None, **changes):
+    """
+    Move `appointment` through a declared transition.
+    The row update and its outbox event commit together; notifications,
+    logs, analytics and reminder re-arming run later in the outbox worker.
+    Extra keyword arguments are field changes applied with the status
+    (e.g. scheduled_at for a reschedule).
+    """
+    sources, target = TRANSITIONS[event]
+    if appointment.status not in sources:
+        raise InvalidTransition(f"Cannot {event.replace('_', ' ')} a {appointment.status} appointment.")
+
+    old_status, old_scheduled_at = appointment.status, appointment.scheduled_at
+    with transaction.atomic():
+        appointment.status = target
+        for field, value in changes.items():
+            setattr(appointment, field, value)
+        if 'scheduled_at' in changes:
+            appointment.reminder_sent = False
+            appointment.reminder_15_sent = False
+            changes.update(reminder_sent=False, reminder_15_sent=False)
+        appointment.save(update_fields=['status', 'updated_at', *changes])
+
+        record_events(
+            [appointment], event, user,
+            old_status=old_status,
+            new_status=target,
+            old_scheduled_at=old_scheduled_at,
+            new_scheduled_at=appointment.scheduled_at,
+            notify=notify,
+            log_action=log_action,
+        )
+    return appointment
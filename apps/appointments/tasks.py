@@ -1,94 +1,275 @@
+import time as time_module
+from collections import defaultdict
 from celery import shared_task
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
 from django.utils.timezone import now, timedelta
-from apps.appointments.models import Appointment, ReminderLog
-from apps.notifications.utils import notify_user
+from apps.appointments.models import Appointment, AppointmentLog, AppointmentOutbox, JobState, ReminderLog, WaitlistEntry
+from apps.appointments.analytics import record_bulk_status_change
+from apps.appointments.realtime import push_appointment_status
+from apps.appointments.utils import REMINDER_FLAGS, REMINDER_MESSAGES, archive_appointment_logs
+from apps.notifications.tasks import send_bulk_notification_task
 import logging
 
 from celery.exceptions import Retry
 logger = logging.getLogger(__name__)
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def send_upcoming_session_reminders(self):
-    current_time = now()
 
-    # 1-hour reminder window
-    one_hour_target = current_time + timedelta(hours=1)
-    one_hour_window_start = one_hour_target - timedelta(minutes=1)
+def send_reminder_batch(reminder_type, queryset):
+    """
+    Claim and send one reminder type for every appointment in `queryset`.
+    Appointments and their users load in one query, the sent flag flips with
+    one UPDATE, logs are bulk-inserted, and recipients sharing a message are
+    notified by a single bulk task. Returns the number of appointments reminded.
+    """
+    flag = REMINDER_FLAGS[reminder_type]
 
-    # 15-minute reminder window
-    fifteen_min_target = current_time + timedelta(minutes=15)
-    fifteen_min_window_start = fifteen_min_target - timedelta(minutes=1)
+    with transaction.atomic():
+        appts = list(
+            queryset.filter(status='confirmed', **{flag: False})
+            .select_related('patient', 'therapist__user')
+            .select_for_update(skip_locked=True, of=('self',))
+        )
+        if not appts:
+            return 0
 
-    # ===== 1-HOUR REMINDERS =====
-    appts_1h = Appointment.objects.filter(
-        scheduled_at__range=(one_hour_window_start, one_hour_target),
-        status='confirmed',
-        reminder_sent=False
+        Appointment.objects.filter(id__in=[appt.id for appt in appts]).update(**{flag: True})
+
+        recipients = defaultdict(list)
+        reminder_logs = []
+        for appt in appts:
+            message = REMINDER_MESSAGES[reminder_type].format(time=appt.scheduled_at.strftime('%H:%M'))
+            recipients[f"[Patient Reminder] {message}"].append(appt.patient.id)
+            recipients[f"[Therapist Reminder] {message}"].append(appt.therapist.user.id)
+            reminder_logs.append(ReminderLog(appointment=appt, reminder_type=reminder_type, sent_to=appt.patient.email))
+            reminder_logs.append(ReminderLog(appointment=appt, reminder_type=reminder_type, sent_to=appt.therapist.user.email))
+        ReminderLog.objects.bulk_create(reminder_logs)
+
+    # One task per distinct message; each isolates its own recipient failures.
+    for message, user_ids in recipients.items():
+        send_bulk_notification_task.delay(list(dict.fromkeys(user_ids)), message)
+
+    logger.info(f"[{reminder_type} Reminder] Sent for {len(appts)} appointments")
+    return len(appts)
+
+
+@shared_task
+def send_slot_reminders(reminder_type, scheduled_at):
+    """
+    Deliver the reminders armed by `arm_session_reminders` for one start time.
+    Cancelled, rescheduled or already-reminded appointments no longer match the
+    claim filter, so duplicate or stale ETA tasks are no-ops.
+    """
+    return send_reminder_batch(
+        reminder_type,
+        Appointment.objects.filter(scheduled_at=parse_datetime(scheduled_at))
     )
 
-    for appt in appts_1h:
-            try:
-                message = f"Reminder: You have a session at {appt.scheduled_at.strftime('%H:%M')} (in 1 hour)."
-                notify_user(appt.patient, f"[Patient Reminder] {message}")
-                notify_user(appt.therapist.user, f"[Therapist Reminder] {message}")
 
-                ReminderLog.objects.create(appointment=appt, reminder_type='1h', sent_to=appt.patient.email)
-                ReminderLog.objects.create(appointment=appt, reminder_type='1h', sent_to=appt.therapist.user.email)
+@shared_task
+def send_upcoming_session_reminders():
+    """
+    Safety net for reminders whose ETA task was lost (broker restart, worker crash).
+    Reminders are normally armed on confirm/reschedule; this sweep sends
+    anything still unsent through the same batch pipeline.
+    """
+    current_time = now()
 
-                appt.reminder_sent = True
-                appt.save()
-                logger.info(f"[1h Reminder] Sent for appointment #{appt.id}")
-            except Exception as e:
-                logger.error(f"Retrying reminder for appointment #{appt.id} due to error: {str(e)}")
-                raise self.retry(exc=e)
+    # ===== 1-HOUR REMINDERS =====
+    sent_1h = send_reminder_batch('1h', Appointment.objects.filter(
+        scheduled_at__gt=current_time + timedelta(minutes=15),
+        scheduled_at__lte=current_time + timedelta(hours=1),
+    ))
 
     # ===== 15-MINUTE REMINDERS =====
-    appts_15m = Appointment.objects.filter(
-        scheduled_at__range=(fifteen_min_window_start, fifteen_min_target),
-        status='confirmed',
-        reminder_15_sent=False
-    )
+    sent_15m = send_reminder_batch('15m', Appointment.objects.filter(
+        scheduled_at__gt=current_time,
+        scheduled_at__lte=current_time + timedelta(minutes=15),
+    ))
 
-    for appt in appts_15m:
-        message = f"Reminder: Your session starts in 15 minutes at {appt.scheduled_at.strftime('%H:%M')}."
-        
-        # Notify both users
-        notify_user(appt.patient, f"[Patient Reminder] {message}")
-        notify_user(appt.therapist.user, f"[Therapist Reminder] {message}")
+    logger.info(f"[Reminder Sweep] Sent {sent_1h} 1h and {sent_15m} 15m pending reminders.")
 
-        # Log reminder
-        ReminderLog.objects.create(appointment=appt, reminder_type='15m', sent_to=appt.patient.email)
-        ReminderLog.objects.create(appointment=appt, reminder_type='15m', sent_to=appt.therapist.user.email)
 
-        appt.reminder_15_sent = True
-        appt.save()
-        logger.info(f"[15m Reminder] Sent for appointment #{appt.id}")
 
 
 
 
+AUTO_CLOSE_JOB = 'auto_close_past_appointments'
+# Re-scan this far behind the watermark to pick up late confirmations
+AUTO_CLOSE_LOOKBACK = timedelta(hours=6)
+AUTO_CLOSE_BATCH_SIZE = 1000
+
+
+def backfill_ends_at(repair=False):
+    """
+    Fill `ends_at` on rows written without Appointment.save() (bulk_create),
+    one UPDATE per distinct duration. With `repair`, also fix rows whose
+    scheduled_at or duration changed through .update(). Returns the rows fixed.
+    """
+    fixed = 0
+    durations = Appointment.objects.values_list('duration_minutes', flat=True).distinct().order_by()
+    for minutes in list(durations):
+        expected = F('scheduled_at') + timedelta(minutes=minutes or 60)
+        stale = Q(ends_at__isnull=True)
+        if repair:
+            stale |= ~Q(ends_at=expected)
+        fixed += Appointment.objects.filter(stale, duration_minutes=minutes).update(ends_at=expected)
+    return fixed
 
 
 @shared_task
-def auto_close_past_appointments():
+def auto_close_past_appointments(full=False):
+    """
+    Close confirmed appointments whose end time (`ends_at`) has passed:
+    checked-in ones become completed, the rest missed.
+    Incremental runs only look at sessions that ended since the last watermark
+    (minus a small lookback); `full=True` sweeps everything. The watermark and
+    the run's metrics are stored in JobState.
+    """
+    started = time_module.monotonic()
     now_time = now()
+    state = JobState.objects.filter(name=AUTO_CLOSE_JOB).first()
+    watermark = None if full or state is None else state.watermark
+    backfilled = backfill_ends_at(repair=full)
 
-    # All confirmed appointments in the past
-    past_appts = Appointment.objects.filter(
-        scheduled_at__lt=now_time,
-        status='confirmed'
-    )
+    past_appts = Appointment.objects.filter(status='confirmed', ends_at__lte=now_time)
+    if watermark:
+        past_appts = past_appts.filter(ends_at__gt=watermark - AUTO_CLOSE_LOOKBACK)
 
-    missed = 0
     completed = 0
+    missed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                past_appts.select_for_update(skip_locked=True)
+                .values_list('id', 'checked_in', 'therapist_id', 'scheduled_at', 'duration_minutes')[:AUTO_CLOSE_BATCH_SIZE]
+            )
+            if not batch:
+                break
+
+            completed_rows = [row for row in batch if row[1]]
+            missed_rows = [row for row in batch if not row[1]]
+            completed_ids = [row[0] for row in completed_rows]
+            missed_ids = [row[0] for row in missed_rows]
+            Appointment.objects.filter(id__in=completed_ids).update(status='completed', updated_at=now_time)
+            Appointment.objects.filter(id__in=missed_ids).update(status='missed', updated_at=now_time)
+            record_bulk_status_change([(*row[2:], 'confirmed') for row in completed_rows], 'completed')
+            record_bulk_status_change([(*row[2:], 'confirmed') for row in missed_rows], 'missed')
 
-    for appt in past_appts:
-        if appt.checked_in:
-            appt.status = 'completed'
-            completed += 1
-        else:
-            appt.status = 'missed'
-            missed += 1
-        appt.save()
+            AppointmentLog.objects.bulk_create(
+                [AppointmentLog(appointment_id=appt_id, action="Auto-closed as completed") for appt_id in completed_ids] +
+                [AppointmentLog(appointment_id=appt_id, action="Auto-closed as missed") for appt_id in missed_ids]
+            )
+            push_appointment_status(*completed_ids, *missed_ids)
+        completed += len(completed_ids)
+        missed += len(missed_ids)
 
-    logger.info(f"[Auto-Close] Updated {completed} completed and {missed} missed appointments.")
+    metrics = {
+        'completed': completed,
+        'missed': missed,
+        'backfilled': backfilled,
+        'full': full,
+        'ran_at': now_time.isoformat(),
+        'duration_ms': round((time_module.monotonic() - started) * 1000, 1),
+    }
+    JobState.objects.update_or_create(name=AUTO_CLOSE_JOB, defaults={'watermark': now_time, 'data': metrics})
+    logger.info(f"[Auto-Close] Updated {completed} completed and {missed} missed appointments.", extra={'metrics': metrics})
+    return metrics
+
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+
+
+@shared_task
+def process_appointment_outbox():
+    """
+    Deliver pending AppointmentOutbox entries. Each entry runs in its own
+    savepoint; a failing entry keeps its error and is retried by the next run
+    until OUTBOX_MAX_ATTEMPTS, without blocking the rest of the batch.
+    """
+    from apps.appointments.outbox import deliver
+
+    delivered = 0
+    failed_ids = []
+    while True:
+        with transaction.atomic():
+            entries = list(
+                AppointmentOutbox.objects.filter(processed_at__isnull=True, attempts__lt=OUTBOX_MAX_ATTEMPTS)
+                .exclude(id__in=failed_ids)
+                .select_related('appointment__patient', 'appointment__therapist__user')
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('id')[:OUTBOX_BATCH_SIZE]
+            )
+            if not entries:
+                break
+
+            for entry in entries:
+                try:
+                    with transaction.atomic():
+                        deliver(entry)
+                    entry.processed_at = now()
+                    delivered += 1
+                except Exception as e:
+                    entry.attempts += 1
+                    entry.last_error = str(e)
+                    failed_ids.append(entry.id)
+                    logger.error(f"[Outbox] {entry.event} for appointment #{entry.appointment_id} failed: {e}")
+            AppointmentOutbox.objects.bulk_update(entries, ['processed_at', 'attempts', 'last_error'])
+
+    if delivered or failed_ids:
+        logger.info(f"[Outbox] Delivered {delivered} events, {len(failed_ids)} failed.")
+    return delivered
+
+
+@shared_task
+def match_waitlist_for_slot(therapist_id, scheduled_at, duration_minutes):
+    from apps.appointments.waitlist import offer_freed_slot
+    entry = offer_freed_slot(therapist_id, parse_datetime(scheduled_at), duration_minutes)
+    return entry.id if entry else None
+
+
+@shared_task
+def expire_waitlist_offer(entry_id):
+    from apps.appointments.waitlist import release_offer
+    with transaction.atomic():
+        entry = WaitlistEntry.objects.select_for_update().filter(
+            id=entry_id, status='offered', offer_expires_at__lte=now()
+        ).first()
+        if entry:
+            logger.info(f"[Waitlist] Offer to entry #{entry_id} lapsed, passing the slot on.")
+            release_offer(entry)
+
+
+AUDIT_LOG_RETENTION_DAYS = 180
+
+
+@shared_task
+def archive_old_appointment_logs(days=AUDIT_LOG_RETENTION_DAYS):
+    moved = archive_appointment_logs(now() - timedelta(days=days))
+    logger.info(f"[Audit] Archived {moved} appointment log rows older than {days} days.")
+    return moved
+
+
+@shared_task
+def prune_appointment_tombstones(days=None):
+    """Delete calendar-sync tombstones past their retention; older sync tokens get a full sync."""
+    from apps.appointments.ical import TOMBSTONE_RETENTION_DAYS
+    from apps.appointments.models import AppointmentTombstone
+
+    days = days or TOMBSTONE_RETENTION_DAYS
+    deleted, _ = AppointmentTombstone.objects.filter(deleted_at__lt=now() - timedelta(days=days)).delete()
+    logger.info(f"[Calendar] Pruned {deleted} appointment tombstones older than {days} days.")
+    return deleted
+
+
+@shared_task
+def refresh_no_show_stats(full=False):
+    from apps.appointments.no_show import refresh_no_show_stats as refresh
+    result = refresh(full=full)
+    logger.info(
+        f"[NoShow] Refreshed {result['patients']} patients and {result['therapists']} therapists "
+        f"in {result['seconds']}s (full={result['full']})."
+    )
+    return result
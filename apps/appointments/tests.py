@@ -0,0 +1,18 @@
+import os
+
+from django.apps import apps
+from django.core.management import find_commands, load_command_class
+from django.test import SimpleTestCase
+
+
+class ManagementCommandTests(SimpleTestCase):
+    """Every command of the app imports and builds its parser, i.e. `--help` works."""
+
+    def test_commands_load(self):
+        app = apps.get_app_config('appointments')
+        commands = find_commands(os.path.join(app.path, 'management'))
+        self.assertIn('benchmark_scheduling', commands)
+        for name in commands:
+            with self.subTest(command=name):
+                command = load_command_class(app.name, name)
+                command.create_parser('manage.py', name).format_help()
@@ -1,13 +1,18 @@
 ﻿from django.urls import path
-from rest_framework.routers import DefaultRouter
-from .views import AppointmentViewSet, AdminAnalyticsViewSet, TherapistRatingAnalytics
+from rest_framework.routers import DefaultRouter, SimpleRouter
+from .views import AppointmentViewSet, AdminAnalyticsViewSet, TherapistRatingAnalytics, WaitlistEntryViewSet
 
 router = DefaultRouter()
 router.register(r'', AppointmentViewSet, basename='appointments')
 router.register(r'admin-analytics', AdminAnalyticsViewSet, basename='admin-analytics')
 
+# Registered apart so the appointment detail route does not swallow it
+waitlist_router = SimpleRouter()
+waitlist_router.register(r'waitlist', WaitlistEntryViewSet, basename='waitlist')
+
 urlpatterns = [
     path('admin/analytics/therapist-ratings/', TherapistRatingAnalytics.as_view(), name='therapist-ratings'),
 ]
 
+urlpatterns += waitlist_router.urls
 urlpatterns += router.urls  
@@ -1,19 +1,201 @@
-from django.db import models
-from .models import AppointmentLog
+import threading
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Cast, Round
+from django.utils.timezone import now, timedelta
+from .models import AppointmentLog, AppointmentLogArchive
+from apps.therapists.directory import invalidate_directory
+from apps.therapists.leaderboard import build_leaderboard, refresh_leaderboard_entry
+from apps.therapists.matching import invalidate_match_matrix
 from apps.therapists.models import TherapistProfile
 from .models import AppointmentFeedback
+
+# Reminder type -> how long before the session it fires
+REMINDER_OFFSETS = {
+    '1h': timedelta(hours=1),
+    '15m': timedelta(minutes=15),
+}
+# Reminder type -> Appointment flag that marks it as sent
+REMINDER_FLAGS = {
+    '1h': 'reminder_sent',
+    '15m': 'reminder_15_sent',
+}
+REMINDER_MESSAGES = {
+    '1h': "Reminder: You have a session at {time} (in 1 hour).",
+    '15m': "Reminder: Your session starts in 15 minutes at {time}.",
+}
+
+_log_buffer = threading.local()
+
+
+def _pending_logs(connection):
+    """
+    The list of log rows waiting for the current transaction to commit.
+    A buffer whose flush callback is no longer registered belongs to a
+    transaction that rolled back and is replaced.
+    """
+    flush = getattr(_log_buffer, 'flush', None)
+    if flush is None or not any(item[1] is flush for item in connection.run_on_commit):
+        entries = []
+
+        def flush():
+            if _log_buffer.flush is flush:
+                _log_buffer.flush = None
+            AppointmentLog.objects.bulk_create(entries)
+
+        _log_buffer.flush = flush
+        _log_buffer.entries = entries
+        transaction.on_commit(flush)
+    return _log_buffer.entries
+
+
+def queue_logs(entries):
+    """
+    Write AppointmentLog rows with the current transaction: they are
+    buffered and inserted in one batch when it commits. Outside a
+    transaction they are inserted straight away.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        AppointmentLog.objects.bulk_create(entries)
+        return
+    _pending_logs(connection).extend(entries)
+
+
 def log_action(appointment, user, action, notes=''):
-    AppointmentLog.objects.create(
+    queue_logs([AppointmentLog(
         appointment=appointment,
         performed_by=user,
         action=action,
         notes=notes
+    )])
+
+
+def archive_appointment_logs(older_than, batch_size=5000):
+    """
+    Move AppointmentLog rows with a timestamp before `older_than` into
+    AppointmentLogArchive, one batch per transaction. Returns the number
+    of rows moved.
+    """
+    fields = ['id', 'appointment_id', 'performed_by_id', 'action', 'timestamp', 'notes']
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                AppointmentLog.objects.filter(timestamp__lt=older_than)
+                .order_by('timestamp', 'id')
+                .values(*fields)[:batch_size]
+            )
+            if not rows:
+                break
+            AppointmentLogArchive.objects.bulk_create([
+                AppointmentLogArchive(**{field: row[field] for field in fields[1:]}) for row in rows
+            ])
+            AppointmentLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+    return moved
+def _average_rating_expression():
+    return Case(
+        When(rating_count=0, then=Value(Decimal('0.00'))),
+        default=Round(Cast(F('rating_sum'), models.FloatField()) / F('rating_count'), 2),
+        output_field=models.DecimalField(max_digits=3, decimal_places=2),
     )
-def update_therapist_average_rating(therapist):
-    feedbacks = AppointmentFeedback.objects.filter(appointment__therapist=therapist)
-    if feedbacks.exists():
-        average = feedbacks.aggregate(avg=models.Avg('rating'))['avg']
-        therapist.average_rating = round(average, 2)
-    else:
-        therapist.average_rating = 0
-    therapist.save()
\ No newline at end of file
+
+
+def apply_feedback_rating(therapist_id, rating, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) one feedback rating from the therapist's
+    running aggregates. Two UPDATEs in one transaction: the average must be
+    computed from the already-updated counters on every backend.
+    """
+    with transaction.atomic():
+        TherapistProfile.objects.filter(pk=therapist_id).update(**{
+            'rating_count': F('rating_count') + sign,
+            'rating_sum': F('rating_sum') + sign * rating,
+            f'rating_{rating}_count': F(f'rating_{rating}_count') + sign,
+        })
+        TherapistProfile.objects.filter(pk=therapist_id).update(average_rating=_average_rating_expression())
+        # .update() sends no signal; the directory, leaderboard and match scores use the rating
+        invalidate_directory(therapist_id)
+        refresh_leaderboard_entry(therapist_id)
+        invalidate_match_matrix()
+
+
+def update_therapist_average_rating(therapist=None):
+    """
+    Rebuild the rating aggregates from AppointmentFeedback for one therapist,
+    or for all therapists when `therapist` is None. Fixes any drift.
+    """
+    feedbacks = AppointmentFeedback.objects.all()
+    therapists = TherapistProfile.objects.all()
+    if therapist is not None:
+        feedbacks = feedbacks.filter(appointment__therapist=therapist)
+        therapists = therapists.filter(pk=therapist.pk)
+
+    distributions = {}
+    for row in feedbacks.values('appointment__therapist_id', 'rating').annotate(n=models.Count('id')).order_by():
+        distributions.setdefault(row['appointment__therapist_id'], {})[row['rating']] = row['n']
+
+    with transaction.atomic():
+        profiles = list(therapists.only('id'))
+        for profile in profiles:
+            distribution = distributions.get(profile.id, {})
+            profile.rating_count = sum(distribution.values())
+            profile.rating_sum = sum(star * n for star, n in distribution.items())
+            for star in range(1, 6):
+                setattr(profile, f'rating_{star}_count', distribution.get(star, 0))
+        TherapistProfile.objects.bulk_update(
+            profiles,
+            ['rating_count', 'rating_sum'] + [f'rating_{star}_count' for star in range(1, 6)],
+            batch_size=500
+        )
+        therapists.update(average_rating=_average_rating_expression())
+        invalidate_directory(*[profile.id for profile in profiles])
+        invalidate_match_matrix()
+        transaction.on_commit(build_leaderboard)
+
+def dispatch_session_reminder(reminder_type, scheduled_at, eta=None):
+    from .tasks import send_slot_reminders
+    send_slot_reminders.apply_async(
+        args=[reminder_type, scheduled_at.isoformat()],
+        eta=eta
+    )
+
+
+def arm_session_reminders(appointment):
+    """
+    Enqueue ETA tasks for the 1h/15m reminders of a confirmed appointment.
+    Tasks are keyed by start time, so every session starting in the same slot
+    is reminded by one batch. Tasks armed before a reschedule are harmless:
+    the appointment no longer matches the slot they were armed for.
+    """
+    if appointment.status != 'confirmed':
+        return
+
+    current_time = now()
+    if appointment.scheduled_at <= current_time:
+        return
+
+    armed = False
+    overdue = []
+    for reminder_type, offset in REMINDER_OFFSETS.items():
+        if getattr(appointment, REMINDER_FLAGS[reminder_type]):
+            continue
+        eta = appointment.scheduled_at - offset
+        if eta > current_time:
+            transaction.on_commit(
+                lambda rt=reminder_type, eta=eta: dispatch_session_reminder(
+                    rt, appointment.scheduled_at, eta=eta
+                )
+            )
+            armed = True
+        else:
+            overdue.append((offset, reminder_type))
+
+    # Confirmed late with nothing left to arm: send the closest reminder now.
+    if overdue and not armed:
+        reminder_type = min(overdue)[1]
+        transaction.on_commit(
+            lambda: dispatch_session_reminder(reminder_type, appointment.scheduled_at)
+        )
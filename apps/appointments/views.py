@@ -6,27 +6,68 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import now
-from django.db.models import Avg, Count
+from django.db.models import Count, Max, Sum
+from django.http import HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
+from django.db import IntegrityError, transaction
 from rest_framework.views import APIView
+from rest_framework.pagination import CursorPagination
+from rest_framework.exceptions import ValidationError
+from apps.core.idempotency import idempotent
 from apps.users.models import CustomUser
-from .models import Appointment, AppointmentFeedback, AppointmentLog
-from .serializers import AppointmentSerializer, AppointmentLogSerializer, AppointmentFeedbackSerializer
+from .models import Appointment, AppointmentFeedback, AppointmentLog, AppointmentLogArchive, AppointmentTombstone, NoShowStats, TherapistDailyStats, WaitlistEntry
+from .no_show import no_show_risk, no_show_summary
+from .realtime import get_appointment_status, public_status, push_appointment_status
+from .ical import SYNC_TOKEN_LOOKBACK, TOMBSTONE_RETENTION_DAYS, build_icalendar, decode_sync_token, encode_sync_token, feed_etag
+from .serializers import AppointmentSerializer, AppointmentListSerializer, AppointmentLogSerializer, AppointmentLogArchiveSerializer, AppointmentFeedbackSerializer, WaitlistEntrySerializer
+from .waitlist import held_slots, release_offer, slot_is_held
 from .utils import log_action
-from apps.therapists.models import TherapistProfile, TherapistAvailability
+from .analytics import record_appointment_deleted
+from .outbox import flush_pending_analytics
+from .state_machine import InvalidTransition, STATUS_EVENTS, TRANSITIONS, can_transition, record_events, transition
+from apps.therapists.models import TherapistProfile
+from apps.therapists.utils import get_zone, local_to_utc, therapist_zone, to_zone, utc_slots
 from django.utils.timezone import now
-from datetime import datetime, timedelta, time
+from datetime import datetime, timedelta, time, timezone as dt_timezone
 from rest_framework.permissions import IsAdminUser
 from apps.appointments.models import Appointment, ReminderLog
 from apps.notifications.utils import notify_user
 from django.utils.timezone import now
-from django.utils.timezone import make_aware
 CANCELLATION_WINDOW_HOURS = 6
 
+
+class AppointmentCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('scheduled_at', 'id')
+
+
+class AppointmentLogCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-timestamp', '-id')
+
+
 class AppointmentViewSet(viewsets.ModelViewSet):
     serializer_class = AppointmentSerializer
     permission_classes = [IsAuthenticated]
 
+    @property
+    def paginator(self):
+        # Opt-in so existing clients keep receiving a plain list:
+        # ?paginate=cursor starts paging, the returned links carry ?cursor=.
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            use_cursor = params.get('paginate') == 'cursor' or 'cursor' in params
+            self._paginator = AppointmentCursorPagination() if use_cursor else None
+        return self._paginator
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return AppointmentListSerializer
+        return AppointmentSerializer
 
     def get_queryset(self):
         user = self.request.user
@@ -60,18 +101,37 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         if recurring_group:
             queryset = queryset.filter(recurring_group=recurring_group)
 
-        return queryset.order_by('scheduled_at')
+        if self.action == 'list':
+            return (
+                queryset.select_related('therapist')
+                .only(*AppointmentListSerializer.Meta.fields, 'ends_at', 'therapist__timezone')
+                .order_by('scheduled_at', 'id')
+            )
+        return queryset.select_related('patient', 'therapist__user').order_by('scheduled_at', 'id')
 
 
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
-        appointment = serializer.save(patient=self.request.user)
-        
-        notify_user(
-            appointment.therapist.user,
-            f"[New Request] {appointment.patient.username} has requested a session scheduled at {appointment.scheduled_at.strftime('%Y-%m-%d %H:%M')}."
-        )
+        try:
+            with transaction.atomic():
+                appointment = serializer.save(patient=self.request.user)
+                record_events([appointment], 'booked', self.request.user)
+        except IntegrityError:
+            # Lost a race for the slot after validation passed
+            raise ValidationError("This time slot is already booked.")
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            flush_pending_analytics(instance)
+            record_appointment_deleted(instance)
+            instance.delete()
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @idempotent
     def reschedule(self, request, pk=None):
         appointment = self.get_object()
 
@@ -85,20 +145,16 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         new_time = parse_datetime(new_time_raw)
         if new_time is None:
             return Response({"detail": "Invalid datetime format."}, status=400)
+        if slot_is_held(appointment.therapist_id, new_time, exclude_patient=request.user):
+            return Response({"detail": "This time slot is being held for a waitlisted patient."}, status=400)
 
-        appointment.scheduled_time = new_time
-        appointment.status = 'rescheduled'
-        appointment.save()
-
-        log_action(appointment, request.user, "Rescheduled")
-        notify_user(
-            appointment.therapist.user,
-            f"[Rescheduled] {appointment.patient.username} has rescheduled the session to {appointment.scheduled_time.strftime('%Y-%m-%d %H:%M')}."
-        )
-        notify_user(
-            appointment.patient,
-            f"[Rescheduled] Your session has been updated to {appointment.scheduled_time.strftime('%Y-%m-%d %H:%M')}."
-        )
+        # Back to pending: the therapist confirms the new time
+        try:
+            transition(appointment, 'reschedule', request.user, scheduled_at=new_time)
+        except InvalidTransition as e:
+            return Response({"detail": str(e)}, status=400)
+        except IntegrityError:
+            return Response({"detail": "This time slot is already booked."}, status=400)
 
         return Response({"detail": "Appointment rescheduled successfully."}, status=status.HTTP_200_OK)
 
@@ -117,10 +173,14 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             queryset = Appointment.objects.filter(patient=user)
 
         appointment = get_object_or_404(queryset, id=pk)
-        appointment.status = new_status
-        appointment.save()
+        try:
+            transition(
+                appointment, STATUS_EVENTS[new_status], user,
+                notify=False, log_action=f"Status changed to {new_status}"
+            )
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=400)
 
-        log_action(appointment, user, f"Status changed to {new_status}")
         return Response({'detail': f'Appointment marked as {new_status}'}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['get'], url_path='logs')
@@ -133,9 +193,19 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             queryset = Appointment.objects.filter(patient=user)
 
         appointment = get_object_or_404(queryset, id=pk)
-        logs = AppointmentLog.objects.filter(appointment=appointment).order_by('-timestamp')
-        serializer = AppointmentLogSerializer(logs, many=True)
-        return Response(serializer.data)
+        # ?archived=true reads rows moved out by archive_old_appointment_logs
+        if request.query_params.get('archived') == 'true':
+            logs, serializer_class = AppointmentLogArchive.objects.all(), AppointmentLogArchiveSerializer
+        else:
+            logs, serializer_class = AppointmentLog.objects.all(), AppointmentLogSerializer
+        logs = logs.filter(appointment=appointment).select_related('performed_by').order_by('-timestamp', '-id')
+
+        params = request.query_params
+        if params.get('paginate') == 'cursor' or 'cursor' in params:
+            paginator = AppointmentLogCursorPagination()
+            page = paginator.paginate_queryset(logs, request, view=self)
+            return paginator.get_paginated_response(serializer_class(page, many=True).data)
+        return Response(serializer_class(logs, many=True).data)
 
     @action(detail=True, methods=['patch'], url_path='confirm')
     def confirm_appointment(self, request, pk=None):
@@ -147,17 +217,10 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         therapist_profile = get_object_or_404(TherapistProfile, user=user)
         appointment = get_object_or_404(Appointment, therapist=therapist_profile, id=pk)
 
-        if appointment.status != 'pending':
+        if not can_transition(appointment, 'confirm'):
             return Response({"error": "Only pending appointments can be confirmed."}, status=400)
 
-        appointment.status = 'confirmed'
-        appointment.save()
-
-        log_action(appointment, user, "Appointment confirmed")
-        notify_user(
-            appointment.patient,
-            f"[Confirmed] Your session with {appointment.therapist.user.username} is confirmed for {appointment.scheduled_at.strftime('%Y-%m-%d %H:%M')}."
-        )
+        transition(appointment, 'confirm', user)
         return Response({"detail": "Appointment confirmed successfully."}, status=status.HTTP_200_OK)
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def cancel(self, request, pk=None):
@@ -168,46 +231,31 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         if appointment.status == 'cancelled':
             return Response({"detail": "Appointment already cancelled."}, status=400)
 
-        if user != appointment.patient and user != appointment.therapist:
+        if user != appointment.patient and user != appointment.therapist.user:
             return Response({"detail": "You are not allowed to cancel this appointment."}, status=403)
 
         time_diff = appointment.scheduled_at - now()
         if time_diff < timedelta(hours=CANCELLATION_WINDOW_HOURS):
             return Response({"detail": f"Cannot cancel within {CANCELLATION_WINDOW_HOURS} hours of appointment."}, status=400)
 
-        appointment.status = 'cancelled'
-        appointment.save()
-
-        log_action(appointment, user, "Cancelled appointment")
-        notify_user(
-            appointment.patient,
-            f"[Cancelled] Your session scheduled at {appointment.scheduled_at.strftime('%Y-%m-%d %H:%M')} has been cancelled by {user.username}."
-        )
-        notify_user(
-            appointment.therapist.user,
-            f"[Cancelled] Your session with {appointment.patient.username} at {appointment.scheduled_at.strftime('%Y-%m-%d %H:%M')} has been cancelled."
-        )
+        try:
+            transition(appointment, 'cancel', user)
+        except InvalidTransition as e:
+            return Response({"detail": str(e)}, status=400)
         return Response({"detail": "Appointment cancelled successfully."}, status=status.HTTP_200_OK)
     @action(detail=True, methods=['get'], url_path='status', permission_classes=[IsAuthenticated])
     def get_status(self, request, pk=None):
-        # Don't filter cancelled appointments here
-        try:
-            appointment = Appointment.objects.get(pk=pk)
-        except Appointment.DoesNotExist:
+        # Don't filter cancelled appointments here; served from the status cache
+        snapshot = get_appointment_status(pk)
+        if snapshot is None:
             return Response({"detail": "Appointment not found."}, status=404)
     
         # Only allow patient or therapist to view
         user = request.user
-        if appointment.patient != user and appointment.therapist != getattr(user, 'therapistprofile', None):
+        if user.id not in (snapshot['patient_id'], snapshot['therapist__user_id']):
             return Response({"detail": "You do not have permission to view this appointment."}, status=403)
     
-        return Response({
-            "id": appointment.id,
-            "status": appointment.status,
-            "scheduled_at": appointment.scheduled_at,
-            "therapist": appointment.therapist.user.username,
-            "patient": appointment.patient.username
-        })
+        return Response(public_status(snapshot))
 
     @action(detail=True, methods=['get', 'post'], permission_classes=[IsAuthenticated])
     def feedback(self, request, pk=None):
@@ -232,12 +280,15 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
         serializer = AppointmentFeedbackSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save(appointment=appointment, patient=request.user)
+            # The therapist's rating aggregates are updated by signal in the same transaction
+            with transaction.atomic():
+                serializer.save(appointment=appointment, patient=request.user)
             log_action(appointment, request.user, "Feedback submitted")
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     @action(detail=False, methods=["post"], url_path="recurring", permission_classes=[IsAuthenticated])
+    @idempotent
     def create_recurring(self, request):
         user = request.user
         data = request.data
@@ -264,6 +315,12 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         except TherapistProfile.DoesNotExist:
             return Response({"error": "Therapist not found."}, status=404)
 
+        # Naive start times are wall-clock times in the therapist's zone
+        zone = therapist_zone(therapist)
+        local_start = start_datetime.astimezone(zone) if start_datetime.tzinfo else start_datetime
+        if local_to_utc(zone, local_start.date(), local_start.time()) is None:
+            return Response({"error": "start_date falls in a daylight-saving gap in the therapist's timezone."}, status=400)
+
         try:
             patient = CustomUser.objects.get(id=patient_id, user_type="patient")
         except CustomUser.DoesNotExist:
@@ -276,23 +333,30 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
         group_id = uuid.uuid4()  # 🔁 assign same group to all
     
-        created_ids = []
-        for i in range(occurrences):
-            scheduled_at = start_datetime + i * delta
-            appointment = Appointment.objects.create(
-                patient=patient,
-                therapist=therapist,
-                scheduled_at=scheduled_at,
-                duration_minutes=duration,
-                status="pending",
-                is_recurring=True,
-                recurring_group=group_id
-            )
-            created_ids.append(appointment.id)
-        notify_user(
-            therapist.user,
-            f"[Recurring Session] New session scheduled with {patient.username} on {scheduled_at.strftime('%Y-%m-%d %H:%M')}."
-        )
+        created = []
+        try:
+            with transaction.atomic():
+                for i in range(occurrences):
+                    # Step in local wall time so the series keeps its hour across DST changes
+                    scheduled_at = local_to_utc(zone, local_start.date() + i * delta, local_start.time())
+                    if scheduled_at is None:
+                        scheduled_at = datetime.combine(local_start.date() + i * delta, local_start.time(), tzinfo=zone).astimezone(dt_timezone.utc)
+                    appointment = Appointment.objects.create(
+                        patient=patient,
+                        therapist=therapist,
+                        scheduled_at=scheduled_at,
+                        duration_minutes=duration,
+                        status="pending",
+                        is_recurring=True,
+                        recurring_group=group_id
+                    )
+                    created.append(appointment)
+                # The therapist hears about the series once, for its last session
+                record_events(created[:-1], 'booked', user, recurring=True, notify=False)
+                record_events(created[-1:], 'booked', user, recurring=True)
+        except IntegrityError:
+            return Response({"error": "One of the sessions collides with an existing booking."}, status=400)
+        created_ids = [appointment.id for appointment in created]
         return Response({
             "message": f"{len(created_ids)} recurring appointments created.",
             "appointments": created_ids,
@@ -322,7 +386,16 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             return Response({"error": "Only therapists or admin can cancel recurring appointments."},
                             status=status.HTTP_403_FORBIDDEN)
     
-        count = appointments.update(status="cancelled")
+        with transaction.atomic():
+            to_cancel = list(appointments.filter(status__in=TRANSITIONS['cancel'][0]).select_for_update())
+            count = Appointment.objects.filter(id__in=[appt.id for appt in to_cancel]).update(
+                status="cancelled", active_slot=None, updated_at=now()
+            )
+            for old_status in TRANSITIONS['cancel'][0]:
+                group = [appt for appt in to_cancel if appt.status == old_status]
+                for appt in group:
+                    appt.status = "cancelled"
+                record_events(group, 'cancel', user, old_status=old_status, notify=False)
     
         return Response({"message": f"{count} appointments cancelled."}, status=status.HTTP_200_OK)
     
@@ -347,36 +420,123 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         except TherapistProfile.DoesNotExist:
             return Response({"error": "Therapist profile not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        work_start = profile.available_from
-        work_end = profile.available_to
-        slot_duration = 60  # minutes
-
-        start_datetime = make_aware(datetime.combine(date_obj, work_start))
-        end_datetime = make_aware(datetime.combine(date_obj, work_end))
-
-        appointments = Appointment.objects.filter(
-            therapist=profile,
-            scheduled_at__range=(start_datetime, end_datetime)
-        )
-
-        booked_times = set(appt.scheduled_at.time() for appt in appointments)
+        # ?date is a day in the therapist's zone; ?tz picks the output zone
+        output_zone_name = request.query_params.get("tz") or profile.timezone
+        output_zone = get_zone(output_zone_name)
+        if output_zone is None:
+            return Response({"error": f"Unknown timezone '{output_zone_name}'."}, status=status.HTTP_400_BAD_REQUEST)
 
-        available_slots = []
-        current_time = start_datetime
-        while current_time + timedelta(minutes=slot_duration) <= end_datetime:
-            if current_time.time() not in booked_times:
-                available_slots.append({
-                    "start": current_time.strftime("%H:%M"),
-                    "end": (current_time + timedelta(minutes=slot_duration)).strftime("%H:%M")
-                })
-            current_time += timedelta(minutes=slot_duration)
+        slot_duration = 60  # minutes
+        slots = utc_slots(profile, date_obj, slot_duration)
+
+        booked_times = set()
+        if slots:
+            booked_times = set(
+                Appointment.objects.filter(
+                    therapist=profile,
+                    scheduled_at__gte=slots[0][0],
+                    scheduled_at__lt=slots[-1][1],
+                ).exclude(status='cancelled').values_list('scheduled_at', flat=True)
+            )
+            # Slots a waitlist offer holds for another patient would be refused at booking
+            patient = request.user if request.user.is_authenticated else None
+            booked_times |= held_slots(profile.id, slots[0][0], slots[-1][1], exclude_patient=patient)
+        free = [(start, end) for start, end in slots if start not in booked_times]
+
+        starts = to_zone([start for start, _ in free], output_zone)
+        ends = to_zone([end for _, end in free], output_zone)
+        available_slots = [
+            {
+                "start": start.strftime("%H:%M"),
+                "end": end.strftime("%H:%M"),
+                "start_utc": utc_start.isoformat(),
+            }
+            for start, end, (utc_start, _) in zip(starts, ends, free)
+        ]
 
         return Response({
             "date": date_str,
             "therapist_id": therapist_id,
+            "therapist_timezone": profile.timezone,
+            "timezone": output_zone_name,
             "available_slots": available_slots
         })
     
+    @action(detail=False, methods=["get"], url_path="calendar-feed", permission_classes=[IsAuthenticated])
+    def calendar_feed(self, request):
+        """
+        Calendar sync feed for the current user (?output=json|ics).
+        Supports If-None-Match, and ?sync_token= returns only appointments
+        changed (or deleted) since the token was issued, plus a short overlap
+        before it: clients must dedupe by id. A token older than the
+        tombstone retention gets a full sync.
+        """
+        user = request.user
+        output = request.query_params.get('output', 'json')
+        if output not in ('json', 'ics'):
+            return Response({"error": "output must be 'json' or 'ics'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if user.user_type == 'therapist':
+            appointments = Appointment.objects.filter(therapist__user=user)
+            tombstones = AppointmentTombstone.objects.filter(therapist__user=user)
+        else:
+            appointments = Appointment.objects.filter(patient=user)
+            tombstones = AppointmentTombstone.objects.filter(patient=user)
+
+        # Two index-only aggregates decide whether anything changed at all
+        state = appointments.aggregate(last_updated=Max('updated_at'), total=Count('id'))
+        last_deleted = tombstones.aggregate(last=Max('deleted_at'))['last']
+        etag = feed_etag(user.id, output, request.query_params.get('sync_token', ''),
+                         state['last_updated'], state['total'], last_deleted)
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        since = None
+        token = request.query_params.get('sync_token')
+        if token:
+            since = decode_sync_token(token)
+            if since is None:
+                return Response({"error": "Invalid sync_token."}, status=status.HTTP_400_BAD_REQUEST)
+            if since < now() - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+                # Deletions that old may have been pruned
+                since = None
+        if since is not None:
+            appointments = appointments.filter(updated_at__gt=since - SYNC_TOKEN_LOOKBACK)
+            # Tombstones from before scheduled_at was recorded fall back to their deletion time
+            deleted = [
+                (appointment_id, scheduled_at or deleted_at)
+                for appointment_id, scheduled_at, deleted_at in tombstones.filter(
+                    deleted_at__gt=since - SYNC_TOKEN_LOOKBACK
+                ).values_list('appointment_id', 'scheduled_at', 'deleted_at')
+            ]
+        else:
+            deleted = []
+
+        next_token = encode_sync_token(max(filter(None, [state['last_updated'], last_deleted, since]), default=None))
+        appointments = appointments.order_by('scheduled_at', 'id')
+
+        if output == 'ics':
+            response = HttpResponse(
+                build_icalendar(appointments.select_related('patient', 'therapist__user'), deleted),
+                content_type='text/calendar; charset=utf-8'
+            )
+            if next_token:
+                response['X-Sync-Token'] = next_token
+        else:
+            response = Response({
+                "sync_token": next_token,
+                "full_sync": since is None,
+                "appointments": AppointmentListSerializer(
+                    appointments.select_related('therapist').only(*AppointmentListSerializer.Meta.fields, 'ends_at', 'therapist__timezone'), many=True
+                ).data,
+                "deleted": [appointment_id for appointment_id, _ in deleted],
+            })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
     @action(detail=True, methods=["post"], url_path=r"trigger-reminder", permission_classes=[IsAdminUser])
     def trigger_reminder(self, request, pk=None):
         try:
@@ -402,13 +562,20 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["post"], url_path="check-in", permission_classes=[IsAuthenticated])
     def check_in(self, request, pk=None):
-        appointment = self.get_object()
+        appointment = get_object_or_404(
+            Appointment.objects.exclude(status='cancelled').only(
+                'id', 'patient_id', 'checked_in', 'scheduled_at', 'duration_minutes'
+            ),
+            pk=pk
+        )
 
-        if request.user != appointment.patient:
+        if request.user.id != appointment.patient_id:
             return Response({"error": "Only the patient can check in."}, status=403)
 
-        appointment.checked_in = True
-        appointment.save()
+        if not appointment.checked_in:
+            appointment.checked_in = True
+            appointment.save(update_fields=['checked_in', 'updated_at'])
+            push_appointment_status(appointment.id)
 
         return Response({"message": f"Patient checked in for appointment #{appointment.id}."}, status=200)
     
@@ -430,27 +597,125 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         ReminderLog.objects.create(appointment=appointment, reminder_type='confirm', sent_to=appointment.therapist.user.email)
 
         return Response({"message": f"Confirmation resent for appointment #{appointment.id}"}, status=200)
+class WaitlistEntryViewSet(mixins.CreateModelMixin,
+                           mixins.ListModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.user_type == 'therapist':
+            queryset = WaitlistEntry.objects.filter(therapist__user=user)
+        else:
+            queryset = WaitlistEntry.objects.filter(patient=user)
+        return queryset.order_by('created_at')
+
+    def perform_create(self, serializer):
+        serializer.save(patient=self.request.user)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            entry = get_object_or_404(self.get_queryset().select_for_update(), pk=kwargs['pk'], patient=request.user)
+            was_offered = entry.status == 'offered'
+            if was_offered:
+                release_offer(entry)
+            entry.status = 'withdrawn'
+            entry.save(update_fields=['status'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def accept(self, request, pk=None):
+        with transaction.atomic():
+            entry = get_object_or_404(
+                WaitlistEntry.objects.select_for_update().select_related('therapist'), pk=pk, patient=request.user
+            )
+            if entry.status != 'offered' or entry.offer_expires_at <= now():
+                return Response({"error": "This offer is no longer available."}, status=400)
+            if Appointment.objects.filter(
+                therapist=entry.therapist, scheduled_at=entry.offered_at
+            ).exclude(status='cancelled').exists():
+                return Response({"error": "This time slot is already booked."}, status=400)
+
+            appointment = Appointment.objects.create(
+                patient=request.user,
+                therapist=entry.therapist,
+                scheduled_at=entry.offered_at,
+                duration_minutes=entry.offered_duration,
+            )
+            record_events([appointment], 'booked', request.user, waitlist_entry_id=entry.id)
+            entry.status = 'booked'
+            entry.save(update_fields=['status'])
+        return Response(AppointmentSerializer(appointment, context={'request': request}).data, status=201)
+
+    @action(detail=True, methods=['post'])
+    def decline(self, request, pk=None):
+        with transaction.atomic():
+            entry = get_object_or_404(WaitlistEntry.objects.select_for_update(), pk=pk, patient=request.user)
+            if entry.status != 'offered':
+                return Response({"error": "There is no open offer on this entry."}, status=400)
+            release_offer(entry)
+        return Response({"status": "declined"})
+
+
 class AdminAnalyticsViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAdminUser]
 
     @action(detail=False, methods=['get'], url_path='summary')
     def summary(self, request):
-        total_appointments = Appointment.objects.count()
-        status_counts = Appointment.objects.values('status').annotate(count=Count('id'))
-        therapists = TherapistProfile.objects.all()
+        """
+        Served from TherapistDailyStats rollups in a constant number of queries.
+        Optional ?start=YYYY-MM-DD&end=YYYY-MM-DD restricts the date range.
+        """
+        try:
+            start = datetime.strptime(request.query_params['start'], "%Y-%m-%d").date() if request.query_params.get('start') else None
+            end = datetime.strptime(request.query_params['end'], "%Y-%m-%d").date() if request.query_params.get('end') else None
+        except ValueError:
+            return Response({"error": "Invalid date format. Use YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+        appointments = Appointment.objects.all()
+        stats = TherapistDailyStats.objects.all()
+        if start:
+            appointments = appointments.filter(scheduled_at__date__gte=start)
+            stats = stats.filter(date__gte=start)
+        if end:
+            appointments = appointments.filter(scheduled_at__date__lte=end)
+            stats = stats.filter(date__lte=end)
+
+        total_appointments = appointments.count()
+        status_counts = appointments.values('status').annotate(count=Count('id')).order_by()
+
+        totals = {
+            row['therapist_id']: row
+            for row in stats.values('therapist_id').annotate(
+                sessions=Sum('booked'),
+                completed_sessions=Sum('completed'),
+                cancelled_sessions=Sum('cancelled'),
+                missed_sessions=Sum('missed'),
+                session_minutes=Sum('minutes'),
+            ).order_by()
+        }
+        therapists = TherapistProfile.objects.select_related('user').annotate(
+            availability_slots=Count('availabilities')
+        ).order_by('id')
 
         therapist_data = []
         for therapist in therapists:
-            total_sessions = Appointment.objects.filter(therapist=therapist).count()
-            completed_sessions = Appointment.objects.filter(therapist=therapist, status='completed').count()
-            available_slots = TherapistAvailability.objects.filter(therapist=therapist).count()
+            row = totals.get(therapist.id, {})
+            total_sessions = row.get('sessions') or 0
+            available_slots = therapist.availability_slots
             utilization = (total_sessions / available_slots) * 100 if available_slots else 0
 
             therapist_data.append({
                 'therapist_id': therapist.id,
                 'name': therapist.user.username,
                 'sessions': total_sessions,
-                'completed': completed_sessions,
+                'completed': row.get('completed_sessions') or 0,
+                'cancelled': row.get('cancelled_sessions') or 0,
+                'missed': row.get('missed_sessions') or 0,
+                'minutes': row.get('session_minutes') or 0,
                 'availability_slots': available_slots,
                 'utilization_percent': round(utilization, 2),
             })
@@ -461,12 +726,93 @@ class AdminAnalyticsViewSet(viewsets.ViewSet):
             'therapist_summary': therapist_data
         })
 
+    @action(detail=False, methods=['get'], url_path='scheduling-report')
+    def scheduling_report(self, request):
+        """
+        Upcoming sessions ranked by no-show risk, expected no-shows per
+        therapist, and no-show rates by reminder combination. Reads the
+        NoShowStats features from refresh_no_show_stats.
+        ?days= (default 7) sets the window, ?threshold= (default 0.3) the risk cut-off.
+        """
+        try:
+            days = int(request.query_params.get('days', 7))
+            threshold = float(request.query_params.get('threshold', 0.3))
+        except ValueError:
+            return Response({"error": "days must be an integer and threshold a number."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= days <= 90 or not 0 <= threshold <= 1:
+            return Response({"error": "days must be 1-90 and threshold 0-1."}, status=status.HTTP_400_BAD_REQUEST)
+
+        start = now()
+        end = start + timedelta(days=days)
+        sessions = list(
+            Appointment.objects.filter(status__in=['pending', 'confirmed'], scheduled_at__gte=start, scheduled_at__lt=end)
+            .values('id', 'patient_id', 'therapist_id', 'scheduled_at', 'status', 'reminder_sent', 'reminder_15_sent')
+            .order_by('scheduled_at')
+        )
+        patient_stats = {
+            stats.patient_id: stats
+            for stats in NoShowStats.objects.filter(patient_id__in={s['patient_id'] for s in sessions}, therapist__isnull=True)
+        }
+        therapist_stats = {
+            stats.therapist_id: stats
+            for stats in NoShowStats.objects.filter(therapist_id__in={s['therapist_id'] for s in sessions}, patient__isnull=True)
+        }
+        summary = no_show_summary()
+
+        at_risk = []
+        therapists = {}
+        for session in sessions:
+            history = patient_stats.get(session['patient_id'])
+            risk = no_show_risk(history, therapist_stats.get(session['therapist_id']), summary['no_show_rate'])
+
+            load = therapists.setdefault(session['therapist_id'], {'therapist_id': session['therapist_id'], 'upcoming': 0, 'expected_no_shows': 0.0})
+            load['upcoming'] += 1
+            load['expected_no_shows'] += risk
+
+            if risk >= threshold:
+                at_risk.append({
+                    'appointment_id': session['id'],
+                    'patient_id': session['patient_id'],
+                    'therapist_id': session['therapist_id'],
+                    'scheduled_at': session['scheduled_at'],
+                    'status': session['status'],
+                    'risk': round(risk, 3),
+                    'patient_history': {'resolved': history.resolved, 'no_shows': history.no_shows} if history else None,
+                })
+
+        for load in therapists.values():
+            # Whole sessions that are, on average, expected to go unattended
+            load['suggested_overbook'] = int(load['expected_no_shows'])
+            load['expected_no_shows'] = round(load['expected_no_shows'], 2)
+
+        at_risk.sort(key=lambda row: row['risk'], reverse=True)
+        return Response({
+            'window': {'start': start, 'end': end},
+            'global_no_show_rate': round(summary['no_show_rate'], 4),
+            'stats_updated_at': summary['updated_at'],
+            'at_risk_sessions': at_risk[:200],
+            'at_risk_count': len(at_risk),
+            'therapist_load': sorted(therapists.values(), key=lambda row: row['expected_no_shows'], reverse=True),
+            'reminder_effectiveness': summary['reminders'],
+        })
+
 class TherapistRatingAnalytics(APIView):
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request):
-        ratings = AppointmentFeedback.objects.values('appointment__therapist')\
-            .annotate(avg_rating=Avg('rating'))
+        therapists = TherapistProfile.objects.filter(rating_count__gt=0).only(
+            'id', 'average_rating', 'rating_count',
+            'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+        )
+        ratings = [
+            {
+                'appointment__therapist': therapist.id,
+                'avg_rating': therapist.average_rating,
+                'rating_count': therapist.rating_count,
+                'distribution': therapist.rating_distribution,
+            }
+            for therapist in therapists
+        ]
 
         return Response(ratings)
 
@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.utils.timezone import now, timedelta
+
+from apps.notifications.tasks import send_notification_task
+from apps.therapists.models import TherapistProfile
+from apps.therapists.utils import therapist_zone
+from .models import Appointment, WaitlistEntry
+
+WAITLIST_HOLD_MINUTES = 15
+
+
+def _live_offers(therapist_id, exclude_patient=None):
+    offers = WaitlistEntry.objects.filter(therapist_id=therapist_id, status='offered', offer_expires_at__gt=now())
+    if exclude_patient is not None:
+        offers = offers.exclude(patient=exclude_patient)
+    return offers
+
+
+def slot_is_held(therapist_id, scheduled_at, exclude_patient=None):
+    """True if a live waitlist offer is holding this slot for someone else."""
+    return _live_offers(therapist_id, exclude_patient).filter(offered_at=scheduled_at).exists()
+
+
+def held_slots(therapist_id, start, end, exclude_patient=None):
+    """Starts in [start, end) that slot_is_held() would refuse, in one query."""
+    return set(
+        _live_offers(therapist_id, exclude_patient)
+        .filter(offered_at__gte=start, offered_at__lt=end)
+        .values_list('offered_at', flat=True)
+    )
+
+
+def entry_matches(entry, slot_start, zone):
+    """Whether the slot fits the entry's preferences, which are wall-clock times in the therapist's `zone`."""
+    local = slot_start.astimezone(zone)
+    if entry.valid_until and local.date() > entry.valid_until:
+        return False
+    if entry.days and local.strftime('%a') not in entry.days:
+        return False
+    if entry.earliest_time and local.time() < entry.earliest_time:
+        return False
+    if entry.latest_time and local.time() > entry.latest_time:
+        return False
+    return True
+
+
+def offer_freed_slot(therapist_id, slot_start, duration_minutes):
+    """
+    Offer a freed slot to the longest-waiting patient whose preferences fit
+    it, and hold it for WAITLIST_HOLD_MINUTES. Entries that already let an
+    offer for this slot lapse are skipped. Returns the entry offered, if any.
+    """
+    if slot_start <= now():
+        return None
+    zone = therapist_zone(TherapistProfile.objects.only('id', 'timezone').get(pk=therapist_id))
+
+    with transaction.atomic():
+        if Appointment.objects.filter(therapist_id=therapist_id, scheduled_at=slot_start).exclude(status='cancelled').exists():
+            return None
+        if slot_is_held(therapist_id, slot_start):
+            return None
+
+        candidates = (
+            WaitlistEntry.objects.filter(therapist_id=therapist_id, status='waiting')
+            .exclude(offered_at=slot_start)
+            .select_for_update(skip_locked=True)
+            .order_by('created_at')
+        )
+        entry = next((candidate for candidate in candidates if entry_matches(candidate, slot_start, zone)), None)
+        if entry is None:
+            return None
+
+        entry.status = 'offered'
+        entry.offered_at = slot_start
+        entry.offered_duration = duration_minutes
+        entry.offer_expires_at = now() + timedelta(minutes=WAITLIST_HOLD_MINUTES)
+        entry.save(update_fields=['status', 'offered_at', 'offered_duration', 'offer_expires_at'])
+
+        transaction.on_commit(lambda: _announce_offer(entry, zone))
+    return entry
+
+
+def _announce_offer(entry, zone):
+    from .tasks import expire_waitlist_offer
+    send_notification_task.delay(
+        entry.patient_id,
+        f"A session at {entry.offered_at.astimezone(zone).strftime('%Y-%m-%d %H:%M')} ({zone}) just opened up. "
+        f"It is held for you for {WAITLIST_HOLD_MINUTES} minutes.",
+        "Slot available",
+        {"waitlist_entry_id": entry.id, "scheduled_at": entry.offered_at.isoformat()}
+    )
+    expire_waitlist_offer.apply_async(args=[entry.id], eta=entry.offer_expires_at)
+
+
+def release_offer(entry):
+    """Put an unanswered or declined offer back and pass the slot on."""
+    slot_start, duration = entry.offered_at, entry.offered_duration
+    with transaction.atomic():
+        entry.status = 'waiting'
+        entry.offer_expires_at = None
+        # offered_at stays so the matcher skips this entry for the same slot
+        entry.save(update_fields=['status', 'offer_expires_at'])
+        return offer_freed_slot(entry.therapist_id, slot_start, duration)
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_TTL = 60 * 60 * 24  # how long a stored response is replayed
+IDEMPOTENCY_LOCK_TTL = 30  # upper bound on one in-flight request
+IDEMPOTENCY_WAIT = 5  # how long a duplicate waits for the first request to finish
+IDEMPOTENCY_POLL_INTERVAL = 0.1
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{request.path}:{body}".encode()).hexdigest()
+
+
+def _replay(stored):
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """
+    Make a view method safe to retry with an Idempotency-Key header.
+
+    The first request for a (user, key) pair runs and its response is stored
+    for IDEMPOTENCY_TTL; repeats get the stored response without touching
+    the database. A duplicate that arrives while the first is still running
+    waits for it instead of running a second time. Reusing a key for a
+    different request is rejected. Without the header nothing changes.
+    Server errors are not stored, so they can be retried.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"detail": f"{IDEMPOTENCY_HEADER} must be at most 255 characters."}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = f"idempotency:{request.user.pk}:{hashlib.sha256(key.encode()).hexdigest()}"
+        lock_key = f"{cache_key}:lock"
+        fingerprint = _fingerprint(request)
+
+        stored = cache.get(cache_key)
+        if stored is None and not cache.add(lock_key, fingerprint, IDEMPOTENCY_LOCK_TTL):
+            # Another request with this key is in flight: wait for its response
+            deadline = time.monotonic() + IDEMPOTENCY_WAIT
+            while stored is None and time.monotonic() < deadline:
+                time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+                stored = cache.get(cache_key)
+            if stored is None:
+                return Response(
+                    {"detail": "A request with this Idempotency-Key is still in progress."},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+        if stored is not None:
+            if stored['fingerprint'] != fingerprint:
+                return Response(
+                    {"detail": "This Idempotency-Key was already used for a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            return _replay(stored)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code < 500:
+                cache.set(cache_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }, IDEMPOTENCY_TTL)
+        finally:
+            cache.delete(lock_key)
+        return response
+
+    return wrapper
@@ -14,3 +14,15 @@ def send_notification_task(self, user_id, message, title="GRACE App", data=None)
         return "[⚠️ Notification Failed] User not found."
     except Exception as e:
         raise self.retry(exc=e)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_bulk_notification_task(self, user_ids, message, title="GRACE App", data=None):
+    User = get_user_model()
+    from apps.notifications.utils import notify_users_bulk
+    users = User.objects.filter(id__in=user_ids).only('id', 'username', 'email', 'fcm_token')
+    failed = notify_users_bulk(users, message, title, data)
+    # Callers mark reminders as sent before queuing them: retry only the recipients that failed
+    if failed and self.request.retries < self.max_retries:
+        raise self.retry(args=[[user.id for user in failed], message, title, data], kwargs={})
+    return f"[✅ Bulk Notification Sent] {len(user_ids) - len(failed)}/{len(user_ids)} recipients"
@@ -2,10 +2,13 @@ import os
 import logging
 import firebase_admin
 from firebase_admin import credentials, messaging
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection, send_mail
 
 logger = logging.getLogger(__name__)
 
+# FCM rejects multicast messages with more than 500 tokens
+FCM_MULTICAST_LIMIT = 500
+
 # Absolute path to firebase_credentials.json
 FIREBASE_CRED_PATH = os.path.abspath(
     os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'firebase_credentials.json')
@@ -65,3 +68,75 @@ def notify_user(user, message, title="GRACE App", data=None):
             logger.info(f"[Email] Sent to {user.email}")
         except Exception as e:
             logger.error(f"[Email Error] {e}")
+
+
+def notify_users_bulk(users, message, title="GRACE App", data=None):
+    """
+    Send the same notification to many users at once.
+    Push goes out as FCM multicast batches; users without a token (or whose
+    token failed) fall back to email over a single pooled SMTP connection.
+    A failing recipient is logged and returned, never raised.
+    :param users: iterable of User instances
+    :return: list of users that could not be notified
+    """
+    data = {str(k): str(v) for k, v in (data or {}).items()}
+    users = list(users)
+
+    email_users = []
+    push_users = []
+    for user in users:
+        if FIREBASE_AVAILABLE and getattr(user, 'fcm_token', None):
+            push_users.append(user)
+        else:
+            email_users.append(user)
+
+    # Firebase Push (multicast)
+    for i in range(0, len(push_users), FCM_MULTICAST_LIMIT):
+        batch = push_users[i:i + FCM_MULTICAST_LIMIT]
+        try:
+            msg = messaging.MulticastMessage(
+                notification=messaging.Notification(
+                    title=title,
+                    body=message,
+                ),
+                tokens=[user.fcm_token for user in batch],
+                data=data
+            )
+            response = messaging.send_each_for_multicast(msg)
+            for user, result in zip(batch, response.responses):
+                if not result.success:
+                    logger.error(f"[Firebase Error] {user.username}: {result.exception}")
+                    email_users.append(user)
+            logger.info(f"[Firebase] Multicast sent to {response.success_count}/{len(batch)} devices")
+        except Exception as e:
+            logger.error(f"[Firebase Error] {e}")
+            email_users.extend(batch)
+
+    # Fallback Email (one SMTP connection for the whole batch)
+    failed = []
+    email_users = [user for user in email_users if user.email]
+    if email_users:
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"[Email Error] {e}")
+            return email_users
+
+        try:
+            for user in email_users:
+                try:
+                    EmailMessage(
+                        subject=title,
+                        body=message,
+                        to=[user.email],
+                        connection=connection,
+                    ).send()
+                except Exception as e:
+                    logger.error(f"[Email Error] {user.email}: {e}")
+                    failed.append(user)
+            logger.info(f"[Email] Sent to {len(email_users) - len(failed)} recipients")
+        finally:
+            connection.close()
+
+    return failed
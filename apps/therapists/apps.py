@@ -2,9 +2,13 @@ from django.apps import AppConfig
 
 
 class TherapistsConfig(AppConfig):
+    default = True
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.therapists'
 
+    def ready(self):
+        import apps.therapists.signals
+
 
 class UsersConfig(AppConfig):
     name = 'apps.users'
@@ -0,0 +1,148 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.dateparse import parse_time
+from django.utils.timezone import now
+
+from .models import DAY_CHOICES, TherapistAvailability, TherapistProfile
+from .utils import DAY_INDEX, _week_start, get_zone, weekly_hour_mask
+
+HOUR_MASKS_TTL = 60 * 60 * 24 * 8  # a week's masks are precomputed the week before
+PROFILE_FIELDS = ('id', 'timezone', 'available_from', 'available_to')
+
+
+def _hour_masks_key(week):
+    return f"therapists:hour_masks:{week.isoformat()}"
+
+
+def current_week(day=None):
+    """Monday (UTC) of the week containing `day`, default today."""
+    return _week_start(day or now().date())
+
+
+def profile_windows(profile_ids):
+    """{profile id: [(day code, start, end)]} of the weekly schedules of `profile_ids`, one query."""
+    windows = {}
+    rows = TherapistAvailability.objects.filter(therapist_id__in=profile_ids).values_list(
+        'therapist_id', 'day', 'start_time', 'end_time'
+    )
+    for therapist_id, day, start, end in rows:
+        windows.setdefault(therapist_id, []).append((day, start, end))
+    return windows
+
+
+def therapist_hour_mask(values, windows, week):
+    """UTC hour mask of one therapist for `week`, from their schedule or else their daily hours."""
+    if not windows:
+        # No weekly schedule: the working hours apply every day
+        windows = [(day, values['available_from'], values['available_to']) for day in DAY_INDEX]
+    zone = get_zone(values['timezone']) or get_zone('UTC')
+    return weekly_hour_mask(zone, windows, reference_day=week)
+
+
+def build_hour_masks(week=None):
+    """
+    {profile id: 168-bit mask of the UTC hours they work} for every active
+    therapist in the week starting `week` (default this week). Offsets come
+    from that week, so DST changes land in the right week. Two queries.
+    """
+    week = week or current_week()
+    profiles = list(TherapistProfile.objects.filter(is_active=True).values(*PROFILE_FIELDS))
+    windows = profile_windows([values['id'] for values in profiles])
+    masks = {values['id']: therapist_hour_mask(values, windows.get(values['id']), week) for values in profiles}
+    cache.set(_hour_masks_key(week), masks, HOUR_MASKS_TTL)
+    return masks
+
+
+def get_hour_masks(week=None):
+    week = week or current_week()
+    masks = cache.get(_hour_masks_key(week))
+    if masks is None:
+        masks = build_hour_masks(week)
+    return masks
+
+
+def _cached_weeks():
+    this_week = current_week()
+    return [this_week, this_week + timedelta(days=7)]
+
+
+def refresh_hour_mask(profile_id):
+    """
+    Recompute one therapist's mask in every cached week once the current
+    transaction commits, or drop it when they are no longer active.
+    """
+    def refresh():
+        values = TherapistProfile.objects.filter(pk=profile_id, is_active=True).values(*PROFILE_FIELDS).first()
+        windows = profile_windows([profile_id]).get(profile_id) if values else None
+        for week in _cached_weeks():
+            masks = cache.get(_hour_masks_key(week))
+            if masks is None:
+                continue
+            if values is None:
+                masks.pop(profile_id, None)
+            else:
+                masks[profile_id] = therapist_hour_mask(values, windows, week)
+            cache.set(_hour_masks_key(week), masks, HOUR_MASKS_TTL)
+
+    transaction.on_commit(refresh)
+
+
+def invalidate_hour_masks():
+    cache.delete_many([_hour_masks_key(week) for week in _cached_weeks()])
+
+
+def patient_hour_mask(zone, days=None, start=None, end=None, week=None):
+    """
+    UTC hour mask of the hours a patient in `zone` asks for: `days` (default
+    every day) from `start` to `end` (default the usual working hours).
+    """
+    days = days or list(DAY_INDEX)
+    start = start or TherapistProfile._meta.get_field('available_from').default
+    end = end or TherapistProfile._meta.get_field('available_to').default
+    return weekly_hour_mask(zone, [(day, start, end) for day in days], reference_day=week or current_week())
+
+
+def overlap_hours(requested, masks=None):
+    """{profile id: hours shared with the `requested` mask} for therapists sharing at least one."""
+    masks = get_hour_masks() if masks is None else masks
+    overlaps = {}
+    for profile_id, mask in masks.items():
+        hours = (mask & requested).bit_count()
+        if hours:
+            overlaps[profile_id] = hours
+    return overlaps
+
+
+def overlap_from_params(params):
+    """
+    ({profile id: overlapping hours} or None, error) for the `timezone`,
+    `days`, `from_time`, `to_time` and `min_overlap` query params. None
+    when no timezone is given, i.e. no overlap filter was asked for.
+    """
+    if not params.get('timezone'):
+        return None, None
+    zone = get_zone(params['timezone'])
+    if zone is None:
+        return None, "Unknown timezone."
+
+    days = [day.strip() for day in params.get('days', '').split(',') if day.strip()]
+    valid_days = {code for code, _ in DAY_CHOICES}
+    if any(day not in valid_days for day in days):
+        return None, f"days must be comma-separated values of {', '.join(code for code, _ in DAY_CHOICES)}."
+
+    try:
+        start = parse_time(params['from_time']) if params.get('from_time') else None
+        end = parse_time(params['to_time']) if params.get('to_time') else None
+        min_overlap = int(params.get('min_overlap') or 1)
+    except ValueError:
+        return None, "from_time and to_time must be HH:MM times and min_overlap a number."
+    if (params.get('from_time') and start is None) or (params.get('to_time') and end is None):
+        return None, "from_time and to_time must be HH:MM times and min_overlap a number."
+
+    requested = patient_hour_mask(zone, days, start, end)
+    if not requested:
+        return None, "to_time must be after from_time."
+    overlaps = overlap_hours(requested)
+    return {profile_id: hours for profile_id, hours in overlaps.items() if hours >= max(min_overlap, 1)}, None
@@ -0,0 +1,287 @@
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from apps.users.models import CustomUser
+
+from .availability import invalidate_hour_masks
+from .directory import invalidate_directory
+from .leaderboard import invalidate_leaderboard
+from .matching import invalidate_match_matrix
+from .models import TherapistAvailability, TherapistProfile
+from .search import rebuild_search_index
+from .serializers import TherapistImportSerializer
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+FORMATS = ('csv', 'jsonl')
+CONFLICT_MODES = ('skip', 'update')
+
+USER_FIELDS = ['email', 'username', 'first_name', 'last_name']
+PROFILE_FIELDS = [
+    'bio', 'specialties', 'gender', 'session_fee', 'experience', 'languages', 'timezone',
+    'available_from', 'available_to', 'is_active', 'verified',
+]
+EXPORT_FIELDS = USER_FIELDS + PROFILE_FIELDS + ['availability']
+
+
+def detect_format(filename, default='csv'):
+    for file_format in FORMATS:
+        if filename and filename.lower().endswith(f'.{file_format}'):
+            return file_format
+    return default
+
+
+def read_records(stream, file_format):
+    """Yield (line number, record dict or None, parse error or None) from a text stream, one at a time."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, "More cells than header columns."
+            else:
+                yield reader.line_num, row, None
+        return
+
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if isinstance(record, dict):
+            yield number, record, None
+        else:
+            yield number, None, "Each line must be a JSON object."
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = self.created = self.updated = self.skipped = self.invalid = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows, 'created': self.created, 'updated': self.updated,
+            'skipped': self.skipped, 'invalid': self.invalid, 'errors': self.errors,
+        }
+
+
+def import_therapists(stream, file_format='csv', on_conflict='skip', dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Create therapists (user, profile and weekly availability) from a CSV or
+    JSONL text stream. Rows are read and written `batch_size` at a time, so
+    memory does not grow with the file; each batch is its own transaction.
+    Existing therapists (matched by email) are skipped, or with
+    on_conflict='update' get the profile fields present in the row.
+    Returns a report dict; invalid rows are reported, not fatal.
+    """
+    report = ImportReport()
+    for batch in _batches(read_records(stream, file_format), batch_size):
+        _import_batch(batch, report, on_conflict, dry_run)
+    return report.as_dict()
+
+
+def _refresh_caches(profile_ids):
+    # Bulk writes send no signals: refresh what the profile signals keep up to date
+    invalidate_directory(*profile_ids)
+    invalidate_match_matrix()
+    invalidate_leaderboard()
+    invalidate_hour_masks()
+
+
+def _import_batch(batch, report, on_conflict, dry_run):
+    valid = []
+    emails, usernames = set(), set()
+    for line, record, error in batch:
+        report.rows += 1
+        if error:
+            report.error(line, error)
+            continue
+        serializer = TherapistImportSerializer(data=record)
+        if not serializer.is_valid():
+            report.error(line, serializer.errors)
+            continue
+        data = serializer.validated_data
+        if data['email'].lower() in emails:
+            report.error(line, {'email': ["Duplicate email in this batch."]})
+            continue
+        emails.add(data['email'].lower())
+        given = {field for field, value in record.items() if value not in ('', None)}
+        valid.append((line, data, given))
+
+    # One query each for every conflict in the batch
+    existing = {
+        user.email_lower: user
+        for user in CustomUser.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=emails)
+        .only('id', 'email', 'user_type')
+    }
+    taken = set(CustomUser.objects.filter(username__in=[data['username'] for _, data, _ in valid])
+                .values_list('username', flat=True))
+
+    new, updates = [], []
+    for line, data, given in valid:
+        user = existing.get(data['email'].lower())
+        if user is None:
+            if data['username'] in taken or data['username'] in usernames:
+                report.error(line, {'username': ["This username is already taken."]})
+                continue
+            usernames.add(data['username'])
+            new.append(data)
+        elif user.user_type != 'therapist':
+            report.error(line, {'email': ["This email belongs to a non-therapist account."]})
+        elif on_conflict == 'update':
+            updates.append((user, data, given))
+        else:
+            report.skipped += 1
+
+    if dry_run:
+        report.created += len(new)
+        report.updated += len(updates)
+        return
+
+    with transaction.atomic():
+        created_ids, updated_ids = _create(new), _update(updates)
+        rebuild_search_index(TherapistProfile.objects.filter(id__in=created_ids + updated_ids))
+    report.created += len(created_ids)
+    report.updated += len(updated_ids)
+    if created_ids or updated_ids:
+        # New therapists only appear in lists; updated ones may have cached detail pages
+        _refresh_caches(updated_ids)
+
+
+def _availability(profile_id, windows):
+    return [
+        TherapistAvailability(
+            therapist_id=profile_id, day=window['day'], start_time=window['start_time'], end_time=window['end_time']
+        )
+        for window in windows
+    ]
+
+
+def _create(rows):
+    if not rows:
+        return []
+    # Imported accounts get an unusable password; therapists set one via password reset.
+    # It is random, so it also tells the rows inserted here from any other account.
+    password = make_password(None)
+    CustomUser.objects.bulk_create([
+        CustomUser(user_type='therapist', password=password, **{field: data[field] for field in USER_FIELDS})
+        for data in rows
+    ], ignore_conflicts=True)
+    user_ids = dict(
+        CustomUser.objects.filter(email__in=[data['email'] for data in rows], password=password).values_list('email', 'id')
+    )
+    # A row whose insert was ignored (an account created concurrently) is left alone
+    rows = [data for data in rows if data['email'] in user_ids]
+
+    # bulk_create skips the post_save signal that normally creates the profile
+    TherapistProfile.objects.bulk_create([
+        TherapistProfile(user_id=user_ids[data['email']], **{field: data[field] for field in PROFILE_FIELDS})
+        for data in rows
+    ], ignore_conflicts=True)
+    profile_ids = dict(TherapistProfile.objects.filter(user_id__in=user_ids.values()).values_list('user_id', 'id'))
+
+    TherapistAvailability.objects.bulk_create([
+        window
+        for data in rows if data.get('availability')
+        for window in _availability(profile_ids[user_ids[data['email']]], data['availability'])
+    ])
+    return list(profile_ids.values())
+
+
+def _update(rows):
+    if not rows:
+        return []
+    profiles = {profile.user_id: profile for profile in TherapistProfile.objects.filter(user_id__in=[user.id for user, _, _ in rows])}
+    user_fields, profile_fields = set(), set()
+    replaced, windows = [], []
+    for user, data, given in rows:
+        for field in {'first_name', 'last_name'} & given:
+            setattr(user, field, data[field])
+            user_fields.add(field)
+        profile = profiles.get(user.id)
+        if profile is None:
+            profile = profiles[user.id] = TherapistProfile.objects.create(user=user)
+        for field in set(PROFILE_FIELDS) & given:
+            setattr(profile, field, data[field])
+            profile_fields.add(field)
+        if 'availability' in given:
+            replaced.append(profile.id)
+            windows += _availability(profile.id, data['availability'])
+
+    if user_fields:
+        CustomUser.objects.bulk_update([user for user, _, _ in rows], sorted(user_fields))
+    if profile_fields:
+        TherapistProfile.objects.bulk_update(list(profiles.values()), sorted(profile_fields))
+    if replaced:
+        TherapistAvailability.objects.filter(therapist_id__in=replaced).delete()
+        TherapistAvailability.objects.bulk_create(windows)
+    return [profile.id for profile in profiles.values()]
+
+
+def export_records(queryset=None, file_format='csv'):
+    """Yield each therapist as a dict in the import format, streaming `queryset` in chunks."""
+    queryset = queryset if queryset is not None else TherapistProfile.objects.all()
+    profiles = queryset.select_related('user').prefetch_related('availabilities').order_by('id')
+    for profile in profiles.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        record = {field: getattr(profile.user, field) for field in USER_FIELDS}
+        record.update({field: getattr(profile, field) for field in PROFILE_FIELDS})
+        windows = sorted(profile.availabilities.all(), key=lambda window: (window.day, window.start_time))
+        if file_format == 'csv':
+            record['languages'] = ', '.join(profile.languages or [])
+            record['availability'] = '; '.join(
+                f"{window.day} {window.start_time:%H:%M}-{window.end_time:%H:%M}" for window in windows
+            )
+        else:
+            record['availability'] = [
+                {'day': window.day, 'start_time': f"{window.start_time:%H:%M}", 'end_time': f"{window.end_time:%H:%M}"}
+                for window in windows
+            ]
+        yield record
+
+
+class _Echo:
+    """File-like object whose write() hands the line back, for csv.writer without a buffer."""
+
+    def write(self, value):
+        return value
+
+
+def render_records(records, file_format='csv'):
+    """Yield the text of `records` in CSV or JSONL, one line at a time."""
+    if file_format == 'csv':
+        writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+        yield writer.writerow(dict(zip(EXPORT_FIELDS, EXPORT_FIELDS)))
+        for record in records:
+            yield writer.writerow(record)
+    else:
+        for record in records:
+            yield json.dumps(record, default=str, ensure_ascii=False) + '\n'
+
+
+def bulk_set_flags(profile_ids, **flags):
+    """Set `flags` (e.g. verified=True, is_active=False) on many therapists with one UPDATE."""
+    profile_ids = list(profile_ids)
+    updated = TherapistProfile.objects.filter(id__in=profile_ids).update(**flags)
+    if updated:
+        _refresh_caches(profile_ids)
+    return updated
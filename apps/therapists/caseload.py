@@ -0,0 +1,119 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Case, Count, FloatField, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from apps.appointments.models import Appointment
+from apps.chat.models import ChatMessage
+from apps.mood.models import MoodLog
+from apps.training.models import AssignedTraining
+
+CASELOAD_CACHE_TTL = 60  # short: unread counts and moods change all the time
+TREND_WINDOW = timedelta(days=7)
+TREND_THRESHOLD = 0.25  # average score change that counts as improving/declining
+OPEN_TRAINING_STATUSES = ('assigned', 'in_progress')
+UPCOMING_STATUSES = ('pending', 'confirmed')
+
+# MoodLog.mood -> score used to compare one week with the previous one
+MOOD_SCORES = {
+    'happy': 2,
+    'calm': 1,
+    'tired': 0,
+    'anxious': -1,
+    'sad': -2,
+    'angry': -2,
+}
+
+
+def _caseload_key(therapist_user_id):
+    return f"therapists:caseload:{therapist_user_id}"
+
+
+def invalidate_caseload(therapist_user_id):
+    """Drop the therapist's cached caseload once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete(_caseload_key(therapist_user_id)))
+
+
+def _count(queryset, patient_field='patient_id'):
+    """Correlated COUNT(*) of `queryset` per patient, 0 when there is none."""
+    counted = queryset.order_by().values(patient_field)
+    return Coalesce(
+        Subquery(counted.annotate(total=Count('pk')).values('total')[:1], output_field=IntegerField()),
+        Value(0),
+    )
+
+
+def _mood_score(since, until=None):
+    """Correlated average mood score of the patient's logs in [since, until)."""
+    logs = MoodLog.objects.filter(patient_id=OuterRef('pk'), created_at__gte=since)
+    if until is not None:
+        logs = logs.filter(created_at__lt=until)
+    score = Case(
+        *[When(mood=mood, then=Value(value)) for mood, value in MOOD_SCORES.items()],
+        output_field=FloatField(),
+    )
+    return Subquery(
+        logs.order_by().values('patient_id').annotate(score=Avg(score)).values('score')[:1],
+        output_field=FloatField(),
+    )
+
+
+def caseload_queryset(therapist_user):
+    """
+    The therapist's connected patients, each annotated with their last mood,
+    the average mood score of this and the previous week, open trainings,
+    next upcoming appointment with this therapist and unread chat messages
+    from them. Everything is a correlated subquery: one query in total.
+    """
+    current = now()
+    latest_mood = MoodLog.objects.filter(patient_id=OuterRef('pk')).order_by('-created_at')
+    upcoming = Appointment.objects.filter(
+        patient_id=OuterRef('pk'),
+        therapist__user=therapist_user,
+        status__in=UPCOMING_STATUSES,
+        scheduled_at__gte=current,
+    ).order_by('scheduled_at')
+
+    return therapist_user.connected_clients.annotate(
+        last_mood=Subquery(latest_mood.values('mood')[:1]),
+        last_mood_at=Subquery(latest_mood.values('created_at')[:1]),
+        mood_score=_mood_score(current - TREND_WINDOW),
+        previous_mood_score=_mood_score(current - 2 * TREND_WINDOW, current - TREND_WINDOW),
+        open_trainings=_count(AssignedTraining.objects.filter(
+            patient_id=OuterRef('pk'), status__in=OPEN_TRAINING_STATUSES
+        )),
+        next_appointment_id=Subquery(upcoming.values('id')[:1]),
+        next_appointment_at=Subquery(upcoming.values('scheduled_at')[:1]),
+        next_appointment_type=Subquery(upcoming.values('session_type')[:1]),
+        unread_messages=_count(ChatMessage.objects.filter(
+            sender_id=OuterRef('pk'), thread__therapist=therapist_user, is_read=False
+        ), patient_field='sender_id'),
+    ).order_by('username')
+
+
+def mood_trend(score, previous_score):
+    """'improving', 'declining' or 'stable' between two weekly averages; None without both."""
+    if score is None or previous_score is None:
+        return None
+    change = score - previous_score
+    if change >= TREND_THRESHOLD:
+        return 'improving'
+    if change <= -TREND_THRESHOLD:
+        return 'declining'
+    return 'stable'
+
+
+def get_caseload(therapist_user, serialize):
+    """
+    The serialized caseload of `therapist_user`, cached for CASELOAD_CACHE_TTL
+    seconds. `serialize(queryset)` turns caseload_queryset() into data.
+    """
+    key = _caseload_key(therapist_user.id)
+    data = cache.get(key)
+    if data is None:
+        data = serialize(caseload_queryset(therapist_user))
+        cache.set(key, data, CASELOAD_CACHE_TTL)
+    return data
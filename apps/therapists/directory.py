@@ -0,0 +1,125 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+DIRECTORY_CACHE_TTL = 60 * 5
+DIRECTORY_MAX_AGE = 60  # what clients and proxies may reuse without asking
+DIRECTORY_LOCK_TTL = 10  # upper bound on rebuilding one response
+DIRECTORY_WAIT = 2  # how long a request waits for another one's rebuild
+DIRECTORY_POLL_INTERVAL = 0.05
+LIST_SCOPE = 'list'
+
+
+def _version_key(scope):
+    return f"therapists:directory:version:{scope}"
+
+
+def profile_scope(profile_id):
+    return f"profile:{profile_id}"
+
+
+def directory_version(scope):
+    key = _version_key(scope)
+    # Not expiring: a dropped version would bring back stale entries
+    cache.add(key, 1, None)
+    return cache.get(key) or 1
+
+
+def invalidate_directory(*profile_ids):
+    """
+    Retire cached directory responses once the current transaction commits:
+    every list page, and the detail pages of `profile_ids`. Old entries are
+    never read again and expire on their own.
+    """
+    scopes = [LIST_SCOPE] + [profile_scope(profile_id) for profile_id in profile_ids]
+
+    def bump():
+        for scope in scopes:
+            try:
+                cache.incr(_version_key(scope))
+            except ValueError:
+                cache.set(_version_key(scope), 2, None)
+
+    transaction.on_commit(bump)
+
+
+def _normalized_params(request):
+    """Query params sorted and without empty values, so equivalent URLs share an entry."""
+    return sorted(
+        (name, sorted(value for value in request.query_params.getlist(name) if value != ''))
+        for name in request.query_params
+        if any(value != '' for value in request.query_params.getlist(name))
+    )
+
+
+def _etag(data):
+    body = json.dumps(data, sort_keys=True, default=str)
+    return f'"{hashlib.sha256(body.encode()).hexdigest()[:32]}"'
+
+
+def _not_modified(request, etag):
+    candidates = [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+    return etag in candidates or '*' in candidates
+
+
+def _respond(request, stored):
+    if _not_modified(request, stored['etag']):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(stored['data'], status=stored['status'])
+    response['ETag'] = stored['etag']
+    response['Cache-Control'] = f"public, max-age={DIRECTORY_MAX_AGE}"
+    return response
+
+
+def cache_public_response(name, per_object=False):
+    """
+    Cache the successful responses of a public, user-independent view method,
+    keyed by `name`, the normalized query params and the host (photo URLs
+    are absolute). Entries are tied to a version that invalidate_directory()
+    bumps: the list scope, or for `per_object` views the scope of the
+    profile in kwargs['pk']. Adds an ETag and answers If-None-Match with 304.
+
+    On a miss only one request rebuilds the response; concurrent requests
+    for the same entry wait for it instead of all hitting the database.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            scope = profile_scope(kwargs.get('pk')) if per_object else LIST_SCOPE
+            fingerprint = hashlib.sha256(
+                json.dumps([request.get_host(), kwargs, _normalized_params(request)], default=str).encode()
+            ).hexdigest()
+            cache_key = f"therapists:directory:{name}:{directory_version(scope)}:{fingerprint}"
+            lock_key = f"{cache_key}:lock"
+
+            stored = cache.get(cache_key)
+            if stored is None and not cache.add(lock_key, 1, DIRECTORY_LOCK_TTL):
+                deadline = time.monotonic() + DIRECTORY_WAIT
+                while stored is None and time.monotonic() < deadline:
+                    time.sleep(DIRECTORY_POLL_INTERVAL)
+                    stored = cache.get(cache_key)
+                if stored is None:
+                    # The rebuild is taking too long: serve this one uncached
+                    return view_method(self, request, *args, **kwargs)
+            if stored is not None:
+                return _respond(request, stored)
+
+            try:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                stored = {'data': response.data, 'status': response.status_code, 'etag': _etag(response.data)}
+                cache.set(cache_key, stored, DIRECTORY_CACHE_TTL)
+            finally:
+                cache.delete(lock_key)
+            return _respond(request, stored)
+
+        return wrapper
+    return decorator
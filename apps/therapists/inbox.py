@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils.timezone import now
+
+from .models import TherapistProfile, TherapistRequest
+
+
+def _request_email(therapist_user, requests):
+    if len(requests) == 1:
+        patient = requests[0].patient
+        return "New Patient Request", (
+            f"Dear {therapist_user.username},\n\n"
+            f"You have a new connection request from {patient.username} ({patient.email}).\n"
+            f"Please log in to your GRACE account to respond."
+        )
+    lines = "\n".join(f"- {request.patient.username} ({request.patient.email})" for request in requests)
+    return f"{len(requests)} New Patient Requests", (
+        f"Dear {therapist_user.username},\n\n"
+        f"You have {len(requests)} new connection requests:\n{lines}\n\n"
+        f"Please log in to your GRACE account to respond."
+    )
+
+
+def _claim(therapist_id):
+    """
+    Mark the therapist's pending, not yet notified requests as notified and
+    return them. A unique timestamp identifies this claim, so concurrent
+    workers never email the same request twice.
+    """
+    stamp = now()
+    with transaction.atomic():
+        updated = TherapistRequest.objects.filter(
+            therapist_id=therapist_id, status='pending', notified_at__isnull=True
+        ).update(notified_at=stamp)
+    if not updated:
+        return []
+    return list(
+        TherapistRequest.objects.filter(therapist_id=therapist_id, notified_at=stamp)
+        .select_related('patient').order_by('created_at')
+    )
+
+
+def notify_pending_requests(therapist_id, force=False):
+    """
+    Email the therapist about pending requests they were not told about yet:
+    one email for all of them. A therapist with request_digest_size N is only
+    emailed once N requests are waiting, unless `force` (the periodic digest).
+    Returns the number of requests covered. On a mail error the requests are
+    released again and the error is raised, so the caller can retry.
+    """
+    profile = TherapistProfile.objects.select_related('user').only(
+        'id', 'request_digest_size', 'user__username', 'user__email'
+    ).get(pk=therapist_id)
+    if profile.request_digest_size and not force:
+        waiting = TherapistRequest.objects.filter(
+            therapist_id=therapist_id, status='pending', notified_at__isnull=True
+        ).count()
+        if waiting < profile.request_digest_size:
+            return 0
+
+    requests = _claim(therapist_id)
+    if not requests:
+        return 0
+    subject, message = _request_email(profile.user, requests)
+    try:
+        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [profile.user.email], fail_silently=False)
+    except Exception:
+        TherapistRequest.objects.filter(id__in=[request.id for request in requests]).update(notified_at=None)
+        raise
+    return len(requests)
+
+
+def send_acceptance_email(therapist_request):
+    patient, therapist = therapist_request.patient, therapist_request.therapist.user
+    send_mail(
+        "Request Accepted",
+        (
+            f"Dear {patient.username},\n\n"
+            f"Your request was accepted by therapist {therapist.username} ({therapist.email}).\n"
+            f"You are now connected on GRACE and can begin chatting or booking sessions."
+        ),
+        settings.DEFAULT_FROM_EMAIL,
+        [patient.email],
+        fail_silently=False,
+    )
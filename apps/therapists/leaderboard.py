@@ -0,0 +1,194 @@
+import json
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+from django.utils.text import slugify
+
+from .models import TherapistProfile
+from .search import language_tags, specialty_tags
+
+LEADERBOARD_PREFIX = 'therapists:leaderboard'
+LEADERBOARD_TTL = 60 * 15  # backstop: a rebuild also picks up rating changes made without signals
+OVERALL_BOARD = 'all'
+MAX_LEADERBOARD_PAGE = 100
+REVIEW_SCALE = 2 ** 32  # review counts below this keep the rating as the leading part of the score
+
+ENTRY_FIELDS = ('id', 'user_id', 'average_rating', 'rating_count', 'specialties', 'languages')
+
+# With a Redis cache, in the cache's key space:
+#   board:<name>   sorted set of the ranked members (zero-padded profile ids)
+#   entry:<member> the JSON entry of one therapist
+#   boards         set of every board name, for rebuilds
+#   version        bumped by every entry refresh, so a rebuild never overwrites one
+#   built          present while the boards are complete; expires after LEADERBOARD_TTL
+
+
+def _redis():
+    """The redis-py client behind the default cache, or None when the cache is not Redis."""
+    backend = caches['default']
+    if isinstance(backend, RedisCache):
+        return backend._cache.get_client(write=True)
+    return None
+
+
+def _key(name):
+    return cache.make_key(f"{LEADERBOARD_PREFIX}:{name}")
+
+
+def _member(profile_id):
+    return f"{profile_id:012d}"
+
+
+def _ranked(queryset):
+    """Leaderboard rows of the ranked (active, verified) therapists in `queryset`."""
+    return queryset.filter(is_active=True, verified=True).annotate(display_name=Coalesce(
+        NullIf(Trim(Concat('user__first_name', Value(' '), 'user__last_name')), Value('')),
+        F('user__username'),
+        output_field=CharField(),
+    )).values(*ENTRY_FIELDS, 'display_name')
+
+
+def _entry(row):
+    profile = TherapistProfile(specialties=row['specialties'], languages=row['languages'])
+    boards = [OVERALL_BOARD]
+    boards += [f"specialty:{slug}" for slug in specialty_tags(profile)]
+    boards += [f"language:{slug}" for slug in language_tags(profile)]
+    return {
+        'id': row['id'],
+        'user_id': row['user_id'],
+        'name': row['display_name'],
+        'average_rating': float(row['average_rating']),
+        'rating_count': row['rating_count'],
+        'boards': boards,
+    }
+
+
+def _score(entry):
+    # Negated so ZRANGE lists the best first: higher rating, then more reviews.
+    # Equal scores are ordered by member, i.e. the older profile first.
+    return -(round(entry['average_rating'] * 100) * REVIEW_SCALE + min(entry['rating_count'], REVIEW_SCALE - 1))
+
+
+def _write_entry(pipe, member, entry):
+    pipe.set(_key(f"entry:{member}"), json.dumps(entry))
+    pipe.sadd(_key('boards'), *entry['boards'])
+    for board in entry['boards']:
+        pipe.zadd(_key(f"board:{board}"), {member: _score(entry)})
+
+
+def build_leaderboard():
+    """
+    Rewrite every board (overall, per specialty, per language) as a Redis
+    sorted set in one MULTI. A refresh landing meanwhile bumps `version`,
+    and WATCH then restarts the rebuild from a fresh query. Without Redis
+    there is nothing to build: pages are read from the database.
+    """
+    client = _redis()
+    if client is None:
+        return
+
+    def rebuild(pipe):
+        entries = [_entry(row) for row in _ranked(TherapistProfile.objects.all())]
+        boards = [board.decode() for board in pipe.smembers(_key('boards'))]
+        members = [member.decode() for member in pipe.zrange(_key(f"board:{OVERALL_BOARD}"), 0, -1)]
+        pipe.multi()
+        stale = [_key(f"board:{board}") for board in boards] + [_key(f"entry:{member}") for member in members]
+        pipe.delete(_key('boards'), *stale)
+        for entry in entries:
+            _write_entry(pipe, _member(entry['id']), entry)
+        pipe.set(_key('built'), 1, ex=LEADERBOARD_TTL)
+
+    client.transaction(rebuild, _key('version'))
+
+
+def invalidate_leaderboard():
+    """Have the next read after the current transaction commits rebuild the boards."""
+    client = _redis()
+    if client is not None:
+        transaction.on_commit(lambda: client.delete(_key('built')))
+
+
+def refresh_leaderboard_entry(profile_id):
+    """
+    Move one therapist to their current place on every board once the
+    transaction commits (or drop them when no longer ranked): ZREM from the
+    boards of their previous entry, ZADD to their current ones. Only their
+    own keys change, so concurrent refreshes of other therapists never
+    collide. Nothing to do before the first build, or without Redis.
+    """
+    client = _redis()
+    if client is None:
+        return
+    member = _member(profile_id)
+
+    def refresh(pipe):
+        if not pipe.exists(_key('built')):
+            return
+        previous = pipe.get(_key(f"entry:{member}"))
+        row = _ranked(TherapistProfile.objects.filter(pk=profile_id)).first()
+        pipe.multi()
+        for board in json.loads(previous)['boards'] if previous else []:
+            pipe.zrem(_key(f"board:{board}"), member)
+        if row is None:
+            pipe.delete(_key(f"entry:{member}"))
+        else:
+            _write_entry(pipe, member, _entry(row))
+        pipe.incr(_key('version'))
+
+    transaction.on_commit(lambda: client.transaction(refresh, _key(f"entry:{member}")))
+
+
+def board_name(specialty=None, language=None):
+    if specialty:
+        return f"specialty:{slugify(specialty, allow_unicode=True)}"
+    if language:
+        return f"language:{slugify(language, allow_unicode=True)}"
+    return OVERALL_BOARD
+
+
+def _page(entries, offset):
+    return [
+        {'rank': rank, **{name: value for name, value in entry.items() if name != 'boards'}}
+        for rank, entry in enumerate(entries, start=offset + 1)
+        if entry is not None
+    ]
+
+
+def _database_page(board, offset, limit):
+    """leaderboard_page() without Redis: the ranking query itself, on the tag index."""
+    queryset = TherapistProfile.objects.all()
+    kind, _, slug = board.partition(':')
+    if kind == 'specialty':
+        queryset = queryset.filter(specialty_tags__slug=slug)
+    elif kind == 'language':
+        queryset = queryset.filter(language_tags__slug=slug)
+    elif board != OVERALL_BOARD:
+        return 0, []
+    rows = _ranked(queryset)
+    page = rows.order_by('-average_rating', '-rating_count', 'id')[offset:offset + limit]
+    return rows.count(), _page([_entry(row) for row in page], offset)
+
+
+def leaderboard_page(board=OVERALL_BOARD, offset=0, limit=10):
+    """
+    (total ranked on `board`, entries ranked offset+1 .. offset+limit, each
+    with its rank). With Redis: ZCARD and ZRANGE on the board, then the
+    page's entries only, so the cost follows `limit`, not the board size.
+    """
+    client = _redis()
+    if client is None:
+        return _database_page(board, offset, limit)
+    if not client.exists(_key('built')):
+        build_leaderboard()
+
+    pipe = client.pipeline()
+    pipe.zcard(_key(f"board:{board}"))
+    pipe.zrange(_key(f"board:{board}"), offset, offset + limit - 1)
+    count, members = pipe.execute()
+    if not members:
+        return count, []
+    raw = client.mget([_key(f"entry:{member.decode()}") for member in members])
+    return count, _page([json.loads(value) if value else None for value in raw], offset)
@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from apps.therapists.bulk import FORMATS, export_records, render_records
+from apps.therapists.models import TherapistProfile
+
+
+class Command(BaseCommand):
+    help = "Write every therapist in the import format (CSV or JSONL), streaming. Default output: standard output."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help="File to write instead of standard output.")
+        parser.add_argument('--active-only', action='store_true')
+
+    def handle(self, *args, **options):
+        queryset = TherapistProfile.objects.all()
+        if options['active_only']:
+            queryset = queryset.filter(is_active=True)
+
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for line in render_records(export_records(queryset, options['format']), options['format']):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Therapists written to {options['output']}."))
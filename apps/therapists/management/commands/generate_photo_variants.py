@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.therapists.models import TherapistProfile
+from apps.therapists.tasks import process_profile_photo
+
+
+class Command(BaseCommand):
+    help = "Generate missing resized variants for every therapist photo, inline."
+
+    def handle(self, *args, **options):
+        profile_ids = TherapistProfile.objects.exclude(profile_photo='').exclude(
+            profile_photo__isnull=True
+        ).values_list('id', flat=True)
+        processed = sum(1 for profile_id in profile_ids if process_profile_photo(profile_id))
+        self.stdout.write(self.style.SUCCESS(f"Processed photos of {processed} therapists."))
@@ -0,0 +1,48 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.therapists.bulk import CONFLICT_MODES, FORMATS, IMPORT_BATCH_SIZE, detect_format, import_therapists
+
+
+class Command(BaseCommand):
+    help = (
+        "Create therapists (account, profile and weekly availability) from a CSV or JSONL file, "
+        "in batches. Use '-' to read standard input."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension, else csv.")
+        parser.add_argument('--on-conflict', choices=CONFLICT_MODES, default='skip',
+                            help="What to do with rows whose email already belongs to a therapist.")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Validate only; write nothing.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be >= 1.")
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f"Cannot open {path}: {e}")
+
+        try:
+            report = import_therapists(
+                stream, file_format, on_conflict=options['on_conflict'],
+                dry_run=options['dry_run'], batch_size=options['batch_size'],
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        prefix = "Dry run: " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{report['rows']} rows, {report['created']} created, {report['updated']} updated, "
+            f"{report['skipped']} skipped, {report['invalid']} invalid."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.therapists.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the specialty/language tags and search terms of every therapist."
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt for {count} therapists."))
@@ -0,0 +1,220 @@
+import heapq
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.text import slugify
+
+from .availability import get_hour_masks, patient_hour_mask
+from .models import TherapistProfile
+from .search import language_tags, specialty_tags
+from .utils import get_zone
+
+MATCH_MATRIX_KEY = 'therapists:match_matrix'
+MATCH_MATRIX_VERSION_KEY = 'therapists:match_matrix:version'
+MATCH_MATRIX_TTL = 60 * 10  # backstop for changes nothing invalidates (raw .update() calls)
+DEFAULT_MATCH_LIMIT = 10
+MAX_MATCH_LIMIT = 50
+EXPERIENCE_CAP = 20  # years at which the experience score saturates
+
+MATCH_WEIGHTS = {
+    'language': 3.0,
+    'specialization': 3.0,
+    'gender': 1.5,
+    'experience': 1.0,
+    'rating': 1.0,
+    'fee': 1.0,
+    'availability': 1.5,
+}
+
+# Row layout of the feature matrix
+USER_ID, GENDER, EXPERIENCE, RATING, FEE, LANGUAGES, SPECIALTIES = range(7)
+
+PROFILE_FIELDS = (
+    'id', 'user_id', 'gender', 'experience', 'average_rating', 'session_fee', 'languages', 'specialties',
+)
+
+
+def _bits(slugs, vocabulary, grow=True):
+    """Bitmask of `slugs` in `vocabulary` ({slug: bit}), adding unknown slugs when `grow` is set."""
+    mask = 0
+    for slug in slugs:
+        if slug not in vocabulary:
+            if not grow:
+                continue
+            vocabulary[slug] = len(vocabulary)
+        mask |= 1 << vocabulary[slug]
+    return mask
+
+
+def _row(values, matrix):
+    profile = TherapistProfile(languages=values['languages'], specialties=values['specialties'])
+    return (
+        values['user_id'],
+        values['gender'],
+        values['experience'],
+        float(values['average_rating']),
+        float(values['session_fee']),
+        _bits(language_tags(profile), matrix['languages']),
+        _bits(specialty_tags(profile), matrix['specialties']),
+    )
+
+
+def _matrix_version():
+    # Not expiring: a dropped version would bring back a stale matrix
+    cache.add(MATCH_MATRIX_VERSION_KEY, 1, None)
+    return cache.get(MATCH_MATRIX_VERSION_KEY) or 1
+
+
+def _matrix_key(version):
+    return f"{MATCH_MATRIX_KEY}:{version}"
+
+
+def build_match_matrix(version=None):
+    """
+    One compact row per active therapist: gender, experience, rating, fee,
+    and language and specialty bitmasks. Working hours are not part of it:
+    they live in the per-week hour masks of availability.py. One query,
+    whatever the number of therapists. Stored under the version read before
+    the query, so a build that raced an invalidation is never served.
+    """
+    version = version or _matrix_version()
+    matrix = {'languages': {}, 'specialties': {}, 'rows': {}}
+    for values in TherapistProfile.objects.filter(is_active=True).values(*PROFILE_FIELDS):
+        matrix['rows'][values['id']] = _row(values, matrix)
+    cache.set(_matrix_key(version), matrix, MATCH_MATRIX_TTL)
+    return matrix
+
+
+def get_match_matrix():
+    version = _matrix_version()
+    matrix = cache.get(_matrix_key(version))
+    if matrix is None:
+        matrix = build_match_matrix(version)
+    return matrix
+
+
+def invalidate_match_matrix():
+    """
+    Retire the cached matrix once the current transaction commits; the next
+    read rebuilds it. Rows are never patched in place, so concurrent changes
+    to different therapists cannot overwrite each other.
+    """
+    def bump():
+        try:
+            cache.incr(MATCH_MATRIX_VERSION_KEY)
+        except ValueError:
+            cache.set(MATCH_MATRIX_VERSION_KEY, 2, None)
+
+    transaction.on_commit(bump)
+
+
+class MatchQuery:
+    """The patient's criteria, translated into the matrix's bit space once per request."""
+
+    def __init__(self, matrix, filters):
+        self.gender = filters.get('gender')
+        self.min_experience = filters.get('min_experience')
+        max_fee = filters.get('max_fee')
+        self.max_fee = float(max_fee) if max_fee is not None else None
+
+        self.languages = self._tags(filters.get('language'), matrix['languages'])
+        self.specialties = self._tags(filters.get('specialization'), matrix['specialties'])
+
+        # A timezone alone asks for the usual working hours in the patient's zone
+        self.hours = None
+        if any(filters.get(name) for name in ('days', 'from_time', 'to_time', 'timezone')):
+            zone = get_zone(filters.get('timezone') or 'UTC') or get_zone('UTC')
+            self.hours = patient_hour_mask(zone, filters.get('days'), filters.get('from_time'), filters.get('to_time'))
+
+    @staticmethod
+    def _tags(value, vocabulary):
+        """(bitmask of known slugs, number of requested slugs), or None when not requested."""
+        if not value:
+            return None
+        slugs = {slugify(part.strip(), allow_unicode=True) for part in value.split(',')} - {''}
+        if not slugs:
+            return None
+        return _bits(slugs, vocabulary, grow=False), len(slugs)
+
+    def score(self, row, hours=0):
+        """(weighted score 0..1, meets every requested criterion, reasons); `hours` is the UTC hour mask."""
+        components = []
+        reasons = []
+        exact = True
+
+        if self.languages is not None:
+            mask, _ = self.languages
+            hit = bool(row[LANGUAGES] & mask)
+            components.append(('language', 1.0 if hit else 0.0))
+            reasons.append("Speaks a requested language" if hit else "Does not speak a requested language")
+            exact &= hit
+
+        if self.specialties is not None:
+            mask, requested = self.specialties
+            covered = (row[SPECIALTIES] & mask).bit_count()
+            components.append(('specialization', covered / requested))
+            reasons.append(f"Covers {covered} of {requested} requested specializations")
+            exact &= covered > 0
+
+        if self.gender:
+            hit = row[GENDER] == self.gender
+            components.append(('gender', 1.0 if hit else 0.0))
+            if not hit:
+                reasons.append("Different gender than requested")
+            exact &= hit
+
+        experience = row[EXPERIENCE]
+        if self.min_experience:
+            components.append(('experience', min(1.0, experience / self.min_experience)))
+            exact &= experience >= self.min_experience
+        else:
+            components.append(('experience', min(experience, EXPERIENCE_CAP) / EXPERIENCE_CAP))
+        reasons.append(f"{experience} years of experience")
+
+        components.append(('rating', row[RATING] / 5))
+        if row[RATING]:
+            reasons.append(f"Rated {row[RATING]:.1f}")
+
+        if self.max_fee is not None:
+            fee = row[FEE]
+            within = fee <= self.max_fee
+            # Linear falloff: twice the budget scores zero
+            if within:
+                value = 1.0
+            else:
+                value = max(0.0, 1 - (fee - self.max_fee) / self.max_fee) if self.max_fee else 0.0
+            components.append(('fee', value))
+            reasons.append(f"Fee {fee:g} {'within' if within else 'above'} your budget")
+            exact &= within
+
+        if self.hours:
+            requested = self.hours.bit_count()
+            overlap = (hours & self.hours).bit_count()
+            components.append(('availability', overlap / requested))
+            reasons.append(f"Available {overlap} of {requested} requested hours")
+            exact &= overlap > 0
+
+        total = sum(MATCH_WEIGHTS[name] for name, _ in components)
+        score = sum(MATCH_WEIGHTS[name] * value for name, value in components) / total
+        return score, exact, reasons
+
+
+def rank_therapists(filters, limit=DEFAULT_MATCH_LIMIT, exclude_user_id=None):
+    """
+    Score every active therapist against `filters` in one pass over the
+    cached matrix and this week's hour masks (one AND per therapist) and
+    return the best `limit` as [(profile id, score, exact, reasons)],
+    therapists meeting every requested criterion first, then by score.
+    """
+    matrix = get_match_matrix()
+    query = MatchQuery(matrix, filters)
+    masks = get_hour_masks() if query.hours else {}
+
+    def scored():
+        for profile_id, row in matrix['rows'].items():
+            if row[USER_ID] == exclude_user_id:
+                continue
+            score, exact, reasons = query.score(row, masks.get(profile_id, 0))
+            yield profile_id, score, exact, reasons
+
+    return heapq.nlargest(limit, scored(), key=lambda item: (item[2], item[1], -item[0]))
@@ -0,0 +1,97 @@
+# Generated by Django 4.2 on 2026-10-19 12:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_search_index(apps, schema_editor):
+    from apps.therapists.search import _tags, tokenize
+
+    TherapistProfile = apps.get_model('therapists', 'TherapistProfile')
+    Specialty = apps.get_model('therapists', 'Specialty')
+    Language = apps.get_model('therapists', 'Language')
+    TherapistSearchTerm = apps.get_model('therapists', 'TherapistSearchTerm')
+
+    def resolve(model, tags):
+        model.objects.bulk_create([model(slug=slug, name=name) for slug, name in tags.items()], ignore_conflicts=True)
+        return list(model.objects.filter(slug__in=tags))
+
+    for profile in TherapistProfile.objects.select_related('user').iterator():
+        languages = profile.languages or []
+        if isinstance(languages, str):
+            languages = languages.split(',')
+        specialties = _tags((profile.specialties or '').split(','), Specialty)
+        languages = _tags(languages, Language)
+        profile.specialty_tags.set(resolve(Specialty, specialties))
+        profile.language_tags.set(resolve(Language, languages))
+        user = profile.user
+        text = ' '.join([user.username, user.first_name, user.last_name, profile.bio,
+                         ' '.join(specialties.values()), ' '.join(languages.values())])
+        TherapistSearchTerm.objects.bulk_create(
+            [TherapistSearchTerm(therapist=profile, term=term) for term in tokenize(text)], ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('therapists', '0002_therapistprofile_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Language',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('slug', models.SlugField(allow_unicode=True, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Specialty',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(allow_unicode=True, max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TherapistSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='therapistprofile',
+            index=models.Index(fields=['is_active', 'gender'], name='therapist_active_gender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='therapistprofile',
+            index=models.Index(fields=['is_active', 'session_fee'], name='therapist_active_fee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='therapistprofile',
+            index=models.Index(fields=['is_active', 'experience'], name='therapist_active_exp_idx'),
+        ),
+        migrations.AddField(
+            model_name='therapistsearchterm',
+            name='therapist',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='therapists.therapistprofile'),
+        ),
+        migrations.AddField(
+            model_name='therapistprofile',
+            name='language_tags',
+            field=models.ManyToManyField(blank=True, related_name='therapists', to='therapists.language'),
+        ),
+        migrations.AddField(
+            model_name='therapistprofile',
+            name='specialty_tags',
+            field=models.ManyToManyField(blank=True, related_name='therapists', to='therapists.specialty'),
+        ),
+        migrations.AddConstraint(
+            model_name='therapistsearchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'therapist'), name='unique_therapist_search_term'),
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('therapists', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='therapistprofile',
+            name='profile_photo_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+    ]
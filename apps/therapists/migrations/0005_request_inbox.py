@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-19 12:58
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_notified(apps, schema_editor):
+    # Requests made before this migration were already emailed one by one
+    TherapistRequest = apps.get_model('therapists', 'TherapistRequest')
+    TherapistRequest.objects.update(notified_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('therapists', '0004_profile_photo_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='therapistprofile',
+            name='request_digest_size',
+            field=models.PositiveSmallIntegerField(default=0, help_text='0: email every patient request. N: one email per N new requests, the rest in an hourly digest.'),
+        ),
+        migrations.AddField(
+            model_name='therapistrequest',
+            name='notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='therapistrequest',
+            index=models.Index(fields=['therapist', 'status', 'created_at'], name='therapist_request_inbox_idx'),
+        ),
+        migrations.RunPython(mark_existing_notified, migrations.RunPython.noop),
+    ]
@@ -30,6 +30,14 @@ class TherapistProfile(models.Model):
     session_fee = models.DecimalField(max_digits=6, decimal_places=2, default=0.00)
     rating = models.FloatField(default=0.0)  # optional static field
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    # Running feedback aggregates, maintained by apps.appointments.signals
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
     experience = models.PositiveIntegerField(default=0, help_text="Years of experience")
 
     # Profile media & preferences
@@ -38,21 +46,72 @@ class TherapistProfile(models.Model):
         null=True,
         blank=True
     )
-    
+    # Content hash of profile_photo once its resized variants exist (see apps.therapists.photos)
+    profile_photo_hash = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
+
     languages = models.JSONField(default=list, blank=True)
     timezone = models.CharField(max_length=50, default='Asia/Riyadh')
     available_from = models.TimeField(default=time(9, 0))
     available_to = models.TimeField(default=time(17, 0))
 
+    # Search index, derived from `specialties` / `languages` by apps.therapists.signals
+    specialty_tags = models.ManyToManyField('therapists.Specialty', blank=True, related_name='therapists')
+    language_tags = models.ManyToManyField('therapists.Language', blank=True, related_name='therapists')
+
     # System flags
     is_active = models.BooleanField(default=True)
     verified = models.BooleanField(default=False)
     notify_on_booking = models.BooleanField(default=True)
     notify_on_cancellation = models.BooleanField(default=True)
+    request_digest_size = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="0: email every patient request. N: one email per N new requests, the rest in an hourly digest."
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'gender'], name='therapist_active_gender_idx'),
+            models.Index(fields=['is_active', 'session_fee'], name='therapist_active_fee_idx'),
+            models.Index(fields=['is_active', 'experience'], name='therapist_active_exp_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} ({self.user.email})"
 
+    @property
+    def rating_distribution(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
+
+class Specialty(models.Model):
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100, unique=True, allow_unicode=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Language(models.Model):
+    name = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=50, unique=True, allow_unicode=True)
+
+    def __str__(self):
+        return self.name
+
+
+class TherapistSearchTerm(models.Model):
+    """Inverted index entry: one normalized word found in a therapist's name, bio, specialties or languages."""
+    therapist = models.ForeignKey(TherapistProfile, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'therapist'], name='unique_therapist_search_term'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.therapist_id}"
+
 
 class TherapistAvailability(models.Model):
     therapist = models.ForeignKey('therapists.TherapistProfile', on_delete=models.CASCADE, related_name='availabilities')
@@ -73,9 +132,14 @@ class TherapistRequest(models.Model):
         default='pending'
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # When the therapist was emailed about it; null while waiting for a digest
+    notified_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ('patient', 'therapist')  # Prevent duplicate requests
+        indexes = [
+            models.Index(fields=['therapist', 'status', 'created_at'], name='therapist_request_inbox_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient.email} → {self.therapist.user.email} ({self.status})"
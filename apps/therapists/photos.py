@@ -0,0 +1,103 @@
+import hashlib
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+PHOTO_VARIANTS_DIR = 'therapists/photos/variants'
+# name: (bounding box, crop to fill it)
+PHOTO_VARIANTS = {
+    'thumbnail': ((128, 128), True),
+    'medium': ((512, 512), False),
+}
+# extension: (Pillow format, save options)
+PHOTO_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+PHOTO_HASH_LENGTH = 16
+PHOTO_LOCK_TTL = 30
+PHOTO_MAX_AGE = 60 * 60 * 24 * 365  # variants are content-addressed, so they never change
+
+
+def content_hash(field_file):
+    digest = hashlib.sha256()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()[:PHOTO_HASH_LENGTH]
+
+
+def variant_name(digest, variant, extension):
+    """Storage name of a variant. It only depends on the content, so it can be cached forever."""
+    return f"{PHOTO_VARIANTS_DIR}/{digest}/{variant}.{extension}"
+
+
+def _render(image, variant, extension):
+    size, crop = PHOTO_VARIANTS[variant]
+    image_format, options = PHOTO_FORMATS[extension]
+    if crop:
+        resized = ImageOps.fit(image, size, Image.LANCZOS)
+    else:
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' or resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGB')
+    buffer = BytesIO()
+    resized.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def _open(field_file):
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        # Apply the camera orientation before the EXIF data is dropped
+        return ImageOps.exif_transpose(image)
+    finally:
+        field_file.close()
+
+
+def generate_variants(field_file, digest, variants=None):
+    """
+    Write the missing variants of the photo in `field_file`; `variants` is a
+    list of (variant, extension), default all. Returns the names written.
+    """
+    wanted = variants or [(variant, extension) for variant in PHOTO_VARIANTS for extension in PHOTO_FORMATS]
+    missing = [(v, e) for v, e in wanted if not default_storage.exists(variant_name(digest, v, e))]
+    if not missing:
+        return []
+
+    image = _open(field_file)
+    written = []
+    for variant, extension in missing:
+        name = variant_name(digest, variant, extension)
+        # Two workers on the same photo would otherwise store "name_<random>" copies
+        lock_key = f"therapists:photo_lock:{name}"
+        if not cache.add(lock_key, 1, PHOTO_LOCK_TTL):
+            continue
+        try:
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(_render(image, variant, extension)))
+                written.append(name)
+        finally:
+            cache.delete(lock_key)
+    return written
+
+
+def variant_urls(profile, build_url):
+    """
+    {variant: {extension: url}} for the profile's photo, or None before the
+    photo is processed. `build_url(digest, variant, extension)` makes the URL.
+    """
+    if not profile.profile_photo or not profile.profile_photo_hash:
+        return None
+    return {
+        variant: {extension: build_url(profile.profile_photo_hash, variant, extension) for extension in PHOTO_FORMATS}
+        for variant in PHOTO_VARIANTS
+    }
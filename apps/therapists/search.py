@@ -0,0 +1,195 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils.text import slugify
+
+from .models import Language, Specialty, TherapistProfile, TherapistSearchTerm
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'have', 'i', 'in', 'is', 'it',
+    'my', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'with', 'you', 'your',
+}
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+
+# (label, lower bound inclusive, upper bound exclusive / None)
+FEE_RANGES = [
+    ('0-100', 0, 100),
+    ('100-200', 100, 200),
+    ('200-300', 200, 300),
+    ('300+', 300, None),
+]
+EXPERIENCE_RANGES = [
+    ('0-2', 0, 3),
+    ('3-5', 3, 6),
+    ('6-10', 6, 11),
+    ('10+', 11, None),
+]
+
+
+def tokenize(text):
+    """Lower-cased words of `text`, without stop words and very short tokens, in order of appearance."""
+    words = WORD_RE.findall((text or '').lower())
+    return list(dict.fromkeys(
+        word[:MAX_TERM_LENGTH] for word in words if len(word) >= MIN_TERM_LENGTH and word not in STOP_WORDS
+    ))
+
+
+def _tags(values, model):
+    """{slug: display name} for a list of free-text tag values, cut to the lengths of `model`'s fields."""
+    name_length = model._meta.get_field('name').max_length
+    slug_length = model._meta.get_field('slug').max_length
+    tags = {}
+    for value in values:
+        name = str(value or '').strip()[:name_length].strip()
+        slug = slugify(name, allow_unicode=True)[:slug_length].strip('-')
+        if slug and slug not in tags:
+            tags[slug] = name
+    return tags
+
+
+def specialty_tags(profile):
+    return _tags((profile.specialties or '').split(','), Specialty)
+
+
+def language_tags(profile):
+    languages = profile.languages or []
+    if isinstance(languages, str):
+        languages = languages.split(',')
+    return _tags(languages, Language)
+
+
+def _resolve(model, tags):
+    """Rows of `model` for every slug in `tags`, creating missing ones."""
+    if not tags:
+        return []
+    model.objects.bulk_create(
+        [model(slug=slug, name=name) for slug, name in tags.items()], ignore_conflicts=True
+    )
+    return list(model.objects.filter(slug__in=tags))
+
+
+def index_therapist(profile):
+    """Bring the tag tables and search terms of one therapist in line with the profile."""
+    with transaction.atomic():
+        specialties = specialty_tags(profile)
+        languages = language_tags(profile)
+        profile.specialty_tags.set(_resolve(Specialty, specialties))
+        profile.language_tags.set(_resolve(Language, languages))
+
+        user = profile.user
+        text = ' '.join([
+            user.username, user.first_name, user.last_name, profile.bio,
+            ' '.join(specialties.values()), ' '.join(languages.values()),
+        ])
+        wanted = set(tokenize(text))
+        existing = set(profile.search_terms.values_list('term', flat=True))
+        if existing - wanted:
+            profile.search_terms.filter(term__in=existing - wanted).delete()
+        TherapistSearchTerm.objects.bulk_create(
+            [TherapistSearchTerm(therapist=profile, term=term) for term in wanted - existing],
+            ignore_conflicts=True,
+        )
+
+
+def rebuild_search_index(queryset=None):
+    queryset = queryset if queryset is not None else TherapistProfile.objects.all()
+    count = 0
+    for profile in queryset.select_related('user').iterator(chunk_size=500):
+        index_therapist(profile)
+        count += 1
+    return count
+
+
+def search(queryset, query):
+    """
+    Narrow `queryset` to therapists matching every word of `query`. The
+    last word also matches as a prefix, for search-as-you-type.
+    """
+    terms = tokenize(query)
+    for position, term in enumerate(terms):
+        lookup = {'term__startswith': term} if position == len(terms) - 1 else {'term': term}
+        queryset = queryset.filter(id__in=TherapistSearchTerm.objects.filter(**lookup).values('therapist_id'))
+    return queryset
+
+
+def _range_lookup(field, ranges, label):
+    for name, low, high in ranges:
+        if name == label:
+            lookup = {f'{field}__gte': low}
+            if high is not None:
+                lookup[f'{field}__lt'] = high
+            return Q(**lookup)
+    return None
+
+
+def apply_filters(queryset, params):
+    """
+    Apply search filters from query params; returns (queryset, error).
+    Supported: q, gender, language, specialty (slugs, comma-separated for
+    any-of), min_fee, max_fee, fee_range, min_experience, experience_range.
+    """
+    if params.get('q'):
+        queryset = search(queryset, params['q'])
+    if params.get('gender'):
+        queryset = queryset.filter(gender=params['gender'])
+
+    for param, relation in (('language', 'language_tags'), ('specialty', 'specialty_tags')):
+        if params.get(param):
+            slugs = [slugify(value, allow_unicode=True) for value in params[param].split(',')]
+            through = getattr(TherapistProfile, relation).through
+            queryset = queryset.filter(
+                id__in=through.objects.filter(**{f'{param}__slug__in': slugs}).values('therapistprofile_id')
+            )
+
+    try:
+        if params.get('min_fee'):
+            queryset = queryset.filter(session_fee__gte=Decimal(params['min_fee']))
+        if params.get('max_fee'):
+            queryset = queryset.filter(session_fee__lte=Decimal(params['max_fee']))
+        if params.get('min_experience'):
+            queryset = queryset.filter(experience__gte=int(params['min_experience']))
+    except (InvalidOperation, ValueError):
+        return queryset, "min_fee, max_fee and min_experience must be numbers."
+
+    for param, field, ranges in (('fee_range', 'session_fee', FEE_RANGES), ('experience_range', 'experience', EXPERIENCE_RANGES)):
+        if params.get(param):
+            condition = _range_lookup(field, ranges, params[param])
+            if condition is None:
+                return queryset, f"{param} must be one of {', '.join(name for name, _, _ in ranges)}."
+            queryset = queryset.filter(condition)
+
+    return queryset, None
+
+
+def facet_counts(queryset):
+    """Counts per facet value over `queryset`, one grouped query per facet."""
+    ids = queryset.values('id')
+
+    def tag_counts(relation, tag_field):
+        through = getattr(TherapistProfile, relation).through
+        rows = (
+            through.objects.filter(therapistprofile_id__in=ids)
+            .values(f'{tag_field}__slug', f'{tag_field}__name')
+            .annotate(count=Count('therapistprofile_id'))
+            .order_by('-count', f'{tag_field}__name')
+        )
+        return [{'value': row[f'{tag_field}__slug'], 'label': row[f'{tag_field}__name'], 'count': row['count']} for row in rows]
+
+    def range_counts(field, ranges):
+        counts = queryset.aggregate(**{
+            f'range_{i}': Count('id', filter=_range_lookup(field, ranges, name)) for i, (name, _, _) in enumerate(ranges)
+        })
+        return [{'value': name, 'count': counts[f'range_{i}']} for i, (name, _, _) in enumerate(ranges)]
+
+    genders = queryset.exclude(gender='').values('gender').annotate(count=Count('id')).order_by('-count')
+    return {
+        'gender': [{'value': row['gender'], 'count': row['count']} for row in genders],
+        'language': tag_counts('language_tags', 'language'),
+        'specialty': tag_counts('specialty_tags', 'specialty'),
+        'fee_range': range_counts('session_fee', FEE_RANGES),
+        'experience_range': range_counts('experience', EXPERIENCE_RANGES),
+    }
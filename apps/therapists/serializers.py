@@ -1,9 +1,23 @@
-﻿from rest_framework import serializers
+﻿from datetime import time
+from decimal import Decimal
+
+from django.db.models import CharField, F, Prefetch, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+from django.urls import reverse
+from rest_framework import serializers
 from apps.therapists.models import TherapistAvailability, TherapistProfile  # ✅ Corrected import
-from apps.appointments.models import AppointmentFeedback
+from apps.appointments.models import Appointment, AppointmentFeedback
 from apps.appointments.serializers import AppointmentFeedbackSerializer
 from apps.users.models import CustomUser
-from .models import TherapistRequest
+from .caseload import mood_trend
+from .matching import DEFAULT_MATCH_LIMIT, MAX_MATCH_LIMIT
+from .models import DAY_CHOICES, TherapistRequest
+from .photos import variant_urls
+from .utils import get_zone
+
+LATEST_FEEDBACKS = 5
+
+
 class TherapistProfileSerializer(serializers.ModelSerializer):
     profile_photo = serializers.ImageField(required=False)
     languages = serializers.ListField(
@@ -11,6 +25,16 @@ class TherapistProfileSerializer(serializers.ModelSerializer):
         required=False
     )
     user = serializers.SerializerMethodField()  # ✅ Include user info as nested dict
+    profile_photo_variants = serializers.SerializerMethodField()
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Join the user and compute its display name in SQL, so listing costs one query."""
+        return queryset.select_related('user').annotate(user_display_name=Coalesce(
+            NullIf(Trim(Concat('user__first_name', Value(' '), 'user__last_name')), Value('')),
+            F('user__username'),
+            output_field=CharField(),
+        ))
 
     class Meta:
         model = TherapistProfile
@@ -26,23 +50,35 @@ class TherapistProfileSerializer(serializers.ModelSerializer):
             'timezone',
             'verified',
             'profile_photo',
+            'profile_photo_variants',
             'notify_on_booking',
             'notify_on_cancellation',
             'available_from',
             'available_to',
-            'experience'
+            'experience',
+            'request_digest_size',
         ]
         read_only_fields = ['rating', 'verified']
 
     def get_user(self, obj):
         if obj.user:
+            name = getattr(obj, 'user_display_name', None)
             return {
                 "id": obj.user.id,
-                "name": obj.user.get_full_name() or obj.user.username,
+                "name": name or obj.user.get_full_name() or obj.user.username,
                 "email": obj.user.email
             }
         return None
 
+    def get_profile_photo_variants(self, obj):
+        request = self.context.get('request')
+
+        def build_url(digest, variant, extension):
+            url = reverse('therapist-photo-variant', kwargs={'digest': digest, 'variant': variant, 'extension': extension})
+            return request.build_absolute_uri(url) if request else url
+
+        return variant_urls(obj, build_url)
+
 
 
 class TherapistAvailabilitySerializer(serializers.ModelSerializer):
@@ -57,21 +93,147 @@ class TherapistAvailabilitySerializer(serializers.ModelSerializer):
             'notify_on_booking', 'notify_on_cancellation','available_from', 'available_to' 
         ]
         read_only_fields = ['average_rating', 'latest_feedbacks']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load every therapist's five latest feedbacks in one query: a sliced
+        Prefetch, which Django runs as a per-therapist window query.
+        """
+        latest = (
+            Appointment.objects.filter(feedback__isnull=False)
+            .select_related('feedback')
+            .only('id', 'therapist_id', 'feedback')
+            .order_by('-feedback__submitted_at')[:LATEST_FEEDBACKS]
+        )
+        return queryset.prefetch_related(Prefetch('appointments', queryset=latest, to_attr='latest_feedback_appointments'))
+
     def get_latest_feedbacks(self, obj):
-        feedbacks = AppointmentFeedback.objects.filter(appointment__therapist=obj).order_by('-submitted_at')[:5]
-        return AppointmentFeedbackSerializer(feedbacks, many=True).data    
-    def create(self, validated_data):
-        user = self.context['request'].user
-        validated_data['therapist'] = user.therapistprofile
-        return super().create(validated_data)
-    
+        appointments = getattr(obj, 'latest_feedback_appointments', None)
+        if appointments is not None:
+            feedbacks = [appointment.feedback for appointment in appointments]
+        else:
+            feedbacks = AppointmentFeedback.objects.filter(appointment__therapist=obj).order_by('-submitted_at')[:LATEST_FEEDBACKS]
+        return AppointmentFeedbackSerializer(feedbacks, many=True).data
+
+
+class AvailabilitySlotSerializer(serializers.ModelSerializer):
+    """One weekly window of the requesting therapist; the view sets `therapist`."""
+    class Meta:
+        model = TherapistAvailability
+        fields = ['id', 'day', 'start_time', 'end_time']
+
+    def validate(self, data):
+        start = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if start and end and end <= start:
+            raise serializers.ValidationError("end_time must be after start_time.")
+        return data
+
+
 class TherapistFilterSerializer(serializers.Serializer):
     gender = serializers.ChoiceField(choices=[('male', 'Male'), ('female', 'Female')], required=False)
     language = serializers.CharField(required=False)
     specialization = serializers.CharField(required=False)
     min_experience = serializers.IntegerField(required=False, min_value=0)
+    max_fee = serializers.DecimalField(max_digits=6, decimal_places=2, required=False, min_value=Decimal('0'))
+    days = serializers.ListField(child=serializers.ChoiceField(choices=DAY_CHOICES), required=False, allow_empty=False)
+    from_time = serializers.TimeField(required=False)
+    to_time = serializers.TimeField(required=False)
+    timezone = serializers.CharField(
+        required=False,
+        help_text="Zone of days/from_time/to_time; defaults to UTC. Alone, asks for the usual working hours there.",
+    )
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=MAX_MATCH_LIMIT, default=DEFAULT_MATCH_LIMIT)
+
+    def validate_timezone(self, value):
+        if get_zone(value) is None:
+            raise serializers.ValidationError("Unknown timezone.")
+        return value
+
+    def validate(self, data):
+        if data.get('from_time') and data.get('to_time') and data['to_time'] <= data['from_time']:
+            raise serializers.ValidationError("to_time must be after from_time.")
+        return data
+
 
 
+class AvailabilityWindowsField(serializers.Field):
+    """Weekly windows as "Mon 09:00-17:00; Tue 10:00-14:00" or a list of {day, start_time, end_time}."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [part.strip() for part in data.split(';') if part.strip()]
+        if not isinstance(data, list):
+            raise serializers.ValidationError("Expected a list or a 'Mon 09:00-17:00; ...' string.")
+        windows = []
+        for item in data:
+            if isinstance(item, str):
+                day, _, hours = item.partition(' ')
+                start, _, end = hours.strip().partition('-')
+                item = {'day': day, 'start_time': start, 'end_time': end}
+            window = AvailabilityWindowSerializer(data=item)
+            if not window.is_valid():
+                raise serializers.ValidationError(f"Invalid window {item}: {window.errors}")
+            windows.append(window.validated_data)
+        return windows
+
+
+class AvailabilityWindowSerializer(serializers.Serializer):
+    day = serializers.ChoiceField(choices=DAY_CHOICES)
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+
+    def validate(self, data):
+        if data['end_time'] <= data['start_time']:
+            raise serializers.ValidationError("end_time must be after start_time.")
+        return data
+
+
+class TherapistImportSerializer(serializers.Serializer):
+    """One row of a bulk therapist import (see apps.therapists.bulk)."""
+    email = serializers.EmailField()
+    username = serializers.CharField(max_length=150)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    bio = serializers.CharField(required=False, allow_blank=True, default='')
+    specialties = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    gender = serializers.ChoiceField(choices=[('male', 'Male'), ('female', 'Female')], required=False, allow_blank=True, default='')
+    session_fee = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=Decimal('0'), required=False, default=Decimal('0'))
+    experience = serializers.IntegerField(min_value=0, required=False, default=0)
+    languages = serializers.JSONField(required=False, default=list)
+    timezone = serializers.CharField(max_length=50, required=False, default='Asia/Riyadh')
+    available_from = serializers.TimeField(required=False, default=time(9, 0))
+    available_to = serializers.TimeField(required=False, default=time(17, 0))
+    is_active = serializers.BooleanField(required=False, default=True)
+    verified = serializers.BooleanField(required=False, default=False)
+    availability = AvailabilityWindowsField(required=False)
+
+    def to_internal_value(self, data):
+        # CSV cells are strings: blanks mean "not given"
+        data = {key: value for key, value in data.items() if value not in ('', None)}
+        return super().to_internal_value(data)
+
+    def validate_email(self, value):
+        return value.lower()
+
+    def validate_languages(self, value):
+        if isinstance(value, str):
+            value = value.split(',')
+        if not isinstance(value, list):
+            raise serializers.ValidationError("Expected a list or a comma-separated string.")
+        return [str(language).strip() for language in value if str(language).strip()]
+
+    def validate_timezone(self, value):
+        if get_zone(value) is None:
+            raise serializers.ValidationError("Unknown timezone.")
+        return value
+
+    def validate(self, data):
+        if data['available_to'] <= data['available_from']:
+            raise serializers.ValidationError("available_to must be after available_from.")
+        return data
+
 
 # 1. Create Therapist Request (Patient sends it)
 class TherapistRequestCreateSerializer(serializers.ModelSerializer):
@@ -127,3 +289,38 @@ class TherapistRequestListSerializer(serializers.ModelSerializer):
         }
 
 
+class CaseloadPatientSerializer(serializers.ModelSerializer):
+    """A connected patient with the annotations of caseload_queryset()."""
+    name = serializers.SerializerMethodField()
+    last_mood = serializers.SerializerMethodField()
+    mood_trend = serializers.SerializerMethodField()
+    open_trainings = serializers.IntegerField(read_only=True)
+    next_appointment = serializers.SerializerMethodField()
+    unread_messages = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = CustomUser
+        fields = [
+            'id', 'username', 'name', 'email', 'is_verified',
+            'last_mood', 'mood_trend', 'open_trainings', 'next_appointment', 'unread_messages',
+        ]
+
+    def get_name(self, obj):
+        return obj.get_full_name() or obj.username
+
+    def get_last_mood(self, obj):
+        if obj.last_mood is None:
+            return None
+        return {"mood": obj.last_mood, "logged_at": serializers.DateTimeField().to_representation(obj.last_mood_at)}
+
+    def get_mood_trend(self, obj):
+        return mood_trend(obj.mood_score, obj.previous_mood_score)
+
+    def get_next_appointment(self, obj):
+        if obj.next_appointment_id is None:
+            return None
+        return {
+            "id": obj.next_appointment_id,
+            "scheduled_at": serializers.DateTimeField().to_representation(obj.next_appointment_at),
+            "session_type": obj.next_appointment_type,
+        }
@@ -0,0 +1,103 @@
+# apps/therapists/signals.py
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .availability import refresh_hour_mask
+from .directory import invalidate_directory
+from .leaderboard import refresh_leaderboard_entry
+from .matching import invalidate_match_matrix
+from .models import TherapistAvailability, TherapistProfile
+from .search import index_therapist
+
+PROFILE_SEARCH_FIELDS = {'bio', 'specialties', 'languages'}
+USER_SEARCH_FIELDS = {'username', 'first_name', 'last_name'}
+USER_DIRECTORY_FIELDS = USER_SEARCH_FIELDS | {'email'}
+PROFILE_LEADERBOARD_FIELDS = {'is_active', 'verified', 'average_rating', 'rating_count', 'specialties', 'languages'}
+PROFILE_MATCH_FIELDS = {'gender', 'experience', 'average_rating', 'session_fee', 'languages', 'specialties', 'is_active'}
+PROFILE_HOURS_FIELDS = {'timezone', 'available_from', 'available_to', 'is_active'}
+
+
+@receiver(post_save, sender=TherapistProfile)
+def index_therapist_profile(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or PROFILE_SEARCH_FIELDS & set(update_fields):
+        index_therapist(instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def index_therapist_user(sender, instance, created, update_fields=None, **kwargs):
+    # New therapists are indexed when their profile is created
+    if created or instance.user_type != 'therapist':
+        return
+    if update_fields is None or USER_SEARCH_FIELDS & set(update_fields):
+        profile = TherapistProfile.objects.filter(user=instance).first()
+        if profile:
+            index_therapist(profile)
+
+
+@receiver(post_save, sender=TherapistProfile)
+def invalidate_profile_features(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or PROFILE_MATCH_FIELDS & set(update_fields):
+        invalidate_match_matrix()
+
+
+@receiver(post_delete, sender=TherapistProfile)
+def drop_profile_features(sender, instance, **kwargs):
+    invalidate_match_matrix()
+    refresh_hour_mask(instance.pk)
+
+
+@receiver(post_save, sender=TherapistProfile)
+def refresh_profile_hours(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or PROFILE_HOURS_FIELDS & set(update_fields):
+        refresh_hour_mask(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=TherapistAvailability)
+def refresh_availability_hours(sender, instance, **kwargs):
+    refresh_hour_mask(instance.therapist_id)
+
+
+@receiver([post_save, post_delete], sender=TherapistProfile)
+def invalidate_profile_directory(sender, instance, **kwargs):
+    invalidate_directory(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_directory(sender, instance, created, update_fields=None, **kwargs):
+    if created or instance.user_type != 'therapist':
+        return
+    if update_fields is None or USER_DIRECTORY_FIELDS & set(update_fields):
+        profile_id = TherapistProfile.objects.filter(user=instance).values_list('id', flat=True).first()
+        if profile_id is not None:
+            invalidate_directory(profile_id)
+            refresh_leaderboard_entry(profile_id)
+
+
+@receiver(post_save, sender=TherapistProfile)
+def refresh_profile_leaderboard(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or PROFILE_LEADERBOARD_FIELDS & set(update_fields):
+        refresh_leaderboard_entry(instance.pk)
+
+
+@receiver(post_delete, sender=TherapistProfile)
+def drop_profile_leaderboard(sender, instance, **kwargs):
+    refresh_leaderboard_entry(instance.pk)
+
+
+@receiver(pre_save, sender=TherapistProfile)
+def detect_photo_upload(sender, instance, **kwargs):
+    photo = instance.profile_photo
+    # A freshly assigned upload is not committed to storage until the field's pre_save
+    instance._photo_uploaded = bool(photo) and not photo._committed
+    if instance._photo_uploaded or not photo:
+        instance.profile_photo_hash = ''
+
+
+@receiver(post_save, sender=TherapistProfile)
+def process_uploaded_photo(sender, instance, **kwargs):
+    if getattr(instance, '_photo_uploaded', False):
+        from .tasks import process_profile_photo
+        transaction.on_commit(lambda: process_profile_photo.delay(instance.pk))
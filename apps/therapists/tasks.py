@@ -0,0 +1,95 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+
+from apps.therapists.models import TherapistProfile, TherapistRequest
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_profile_photo(profile_id):
+    """Generate the resized variants of a therapist's photo and record its content hash."""
+    from apps.therapists.directory import invalidate_directory
+    from apps.therapists.photos import content_hash, generate_variants
+
+    profile = TherapistProfile.objects.filter(pk=profile_id).only('id', 'profile_photo', 'profile_photo_hash').first()
+    if profile is None or not profile.profile_photo:
+        return None
+
+    try:
+        digest = content_hash(profile.profile_photo)
+        written = generate_variants(profile.profile_photo, digest)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not process photo of therapist {profile_id}: {e}")
+        return None
+
+    # Only if the photo was not replaced meanwhile; the newer upload has its own task
+    updated = TherapistProfile.objects.filter(
+        pk=profile_id, profile_photo=profile.profile_photo.name
+    ).exclude(profile_photo_hash=digest).update(profile_photo_hash=digest)
+    if updated:
+        invalidate_directory(profile_id)
+    logger.info(f"Photo of therapist {profile_id}: {len(written)} variants written, hash {digest}")
+    return digest
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def notify_therapist_of_requests(self, therapist_id):
+    """Email a therapist about new patient requests, now or once their digest is full."""
+    from apps.therapists.inbox import notify_pending_requests
+
+    try:
+        return notify_pending_requests(therapist_id)
+    except TherapistProfile.DoesNotExist:
+        return 0
+    except Exception as e:
+        raise self.retry(exc=e)
+
+
+@shared_task
+def send_request_digests():
+    """
+    Periodic: email every therapist about the requests still waiting for their
+    digest. Also picks up requests whose immediate notification task was lost.
+    """
+    from apps.therapists.inbox import notify_pending_requests
+
+    therapist_ids = TherapistRequest.objects.filter(
+        status='pending', notified_at__isnull=True
+    ).values_list('therapist_id', flat=True).distinct()
+    sent = 0
+    for therapist_id in list(therapist_ids):
+        try:
+            sent += notify_pending_requests(therapist_id, force=True)
+        except Exception as e:
+            # Released again: the next run retries them
+            logger.error(f"Request digest for therapist {therapist_id} failed: {e}")
+    return sent
+
+
+@shared_task
+def precompute_hour_masks():
+    """Periodic: build this and next week's availability masks, so no request builds them."""
+    from apps.therapists.availability import build_hour_masks, current_week
+
+    this_week = current_week()
+    for week in (this_week, this_week + timedelta(days=7)):
+        masks = build_hour_masks(week)
+        logger.info(f"Hour masks for the week of {week}: {len(masks)} therapists")
+    return this_week.isoformat()
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def notify_patient_of_acceptance(self, request_id):
+    from apps.therapists.inbox import send_acceptance_email
+
+    therapist_request = TherapistRequest.objects.select_related('patient', 'therapist__user').filter(pk=request_id).first()
+    if therapist_request is None:
+        return None
+    try:
+        send_acceptance_email(therapist_request)
+    except Exception as e:
+        raise self.retry(exc=e)
+    return request_id
@@ -1,3 +1,103 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+
+from apps.appointments.models import Appointment, AppointmentFeedback
+from apps.therapists.models import TherapistProfile
+from apps.therapists.serializers import LATEST_FEEDBACKS
+from apps.users.models import CustomUser
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+THERAPISTS = 3
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class TherapistQueryCountTests(TestCase):
+    """
+    The public directory and the availability listing cost a fixed number
+    of queries, however many therapists (and feedbacks) there are.
+    Each page is measured with N therapists, then again with 2N.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.patient = CustomUser.objects.create_user(
+            username='patient', email='patient@example.com', password='secret', user_type='patient'
+        )
+        self.added = 0
+
+    def add_therapists(self, count):
+        for _ in range(count):
+            self.added += 1
+            CustomUser.objects.create_user(
+                username=f'therapist{self.added}',
+                email=f'therapist{self.added}@example.com',
+                password='secret',
+                user_type='therapist',
+                first_name='Therapist',
+                last_name=str(self.added),
+            )
+        profiles = TherapistProfile.objects.filter(appointments__isnull=True)
+        profiles.update(verified=True, average_rating=4.5, rating_count=LATEST_FEEDBACKS + 1, specialties='anxiety')
+
+        # More feedbacks than the serializer shows, created without signals
+        start = now() - timedelta(days=30)
+        appointments = Appointment.objects.bulk_create([
+            Appointment(patient=self.patient, therapist=profile, status='completed', scheduled_at=start + timedelta(days=day))
+            for profile in profiles
+            for day in range(LATEST_FEEDBACKS + 1)
+        ])
+        AppointmentFeedback.objects.bulk_create([
+            AppointmentFeedback(appointment=appointment, patient=self.patient, rating=5)
+            for appointment in appointments
+        ])
+
+    def count_queries(self, func):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            func()
+        return len(context.captured_queries)
+
+    def assertQueriesDoNotGrow(self, func):
+        self.add_therapists(THERAPISTS)
+        expected = self.count_queries(func)
+        self.add_therapists(THERAPISTS)
+        cache.clear()
+        with self.assertNumQueries(expected):
+            func()
+        return expected
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list_view(self):
+        self.assertQueriesDoNotGrow(lambda: self.get(reverse('therapist-list')))
+        self.assertEqual(len(self.get(reverse('therapist-list')).data), 2 * THERAPISTS)
+
+    def test_detail_view(self):
+        self.add_therapists(1)
+        profile = TherapistProfile.objects.get()
+        self.assertQueriesDoNotGrow(lambda: self.get(reverse('therapist-detail', args=[profile.pk])))
+
+    def test_top_rated(self):
+        self.assertQueriesDoNotGrow(lambda: self.get(reverse('therapists-top-rated')))
+
+    def test_availability_therapists(self):
+        client = APIClient()
+        client.force_authenticate(self.patient)
+
+        def list_therapists():
+            response = client.get(reverse('availability-therapists'))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(all(len(item['latest_feedbacks']) == LATEST_FEEDBACKS for item in response.data))
+
+        # The therapists, then their latest feedbacks
+        self.assertEqual(self.assertQueriesDoNotGrow(list_therapists), 2)
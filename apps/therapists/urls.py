@@ -2,9 +2,12 @@
 from rest_framework.routers import DefaultRouter
 
 from apps.therapists.views import (
+    CaseloadView,
     ConnectedPatientsView,
     TherapistListView,
+    TherapistSearchView,
     TherapistDetailView,
+    TherapistPhotoVariantView,
     TherapistProfileUpdateView,
     TherapistDashboardView,
     TherapistRequestCreateView,
@@ -13,19 +16,24 @@ from apps.therapists.views import (
     VerifyTherapistView,
     TherapistAvailabilityViewSet,
     TherapistProfileViewSet,  
+    TherapistBulkViewSet,
     FindMyTherapistView
 )
 
 router = DefaultRouter()
 router.register(r'availability', TherapistAvailabilityViewSet, basename='availability')
+router.register(r'admin/bulk', TherapistBulkViewSet, basename='therapist-bulk')
 router.register(r'', TherapistProfileViewSet, basename='therapists')  
 
 urlpatterns = [
     # Public endpoints
     path('', TherapistListView.as_view(), name='therapist-list'),
+    path('search/', TherapistSearchView.as_view(), name='therapist-search'),
     path('<int:pk>/', TherapistDetailView.as_view(), name='therapist-detail'),
+    path('photos/<slug:digest>/<slug:variant>.<slug:extension>', TherapistPhotoVariantView.as_view(), name='therapist-photo-variant'),
     path('find-my-therapist/', FindMyTherapistView.as_view(), name='find-my-therapist'),
     path('connected-patients/', ConnectedPatientsView.as_view(), name='connected-patients'),
+    path('connected-patients/caseload/', CaseloadView.as_view(), name='therapist-caseload'),
     # Therapist self-management
     path('me/update/', TherapistProfileUpdateView.as_view(), name='therapist-profile-update'),
     path('dashboard/', TherapistDashboardView.as_view(), name='therapist-dashboard'),
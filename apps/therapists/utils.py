@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.cache import cache
+
+WEEK_INTERVALS_TTL = 60 * 60 * 24
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """ZoneInfo for `name`, or None if the name is not a known zone."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def therapist_zone(profile):
+    return get_zone(profile.timezone) or dt_timezone.utc
+
+
+def local_to_utc(zone, day, wall_time):
+    """
+    Aware UTC datetime for a wall-clock time on `day` in `zone`.
+    Returns None for times skipped by a DST jump. For repeated times the
+    first occurrence wins.
+    """
+    local = datetime.combine(day, wall_time, tzinfo=zone)
+    as_utc = local.astimezone(dt_timezone.utc)
+    if as_utc.astimezone(zone).replace(tzinfo=None) != local.replace(tzinfo=None):
+        return None
+    return as_utc
+
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _build_week(profile, zone, week_start):
+    intervals = {}
+    for offset in range(7):
+        day = week_start + timedelta(days=offset)
+        start = local_to_utc(zone, day, profile.available_from)
+        end = local_to_utc(zone, day, profile.available_to)
+        # A working day that starts in a DST gap begins at the first valid instant
+        if start is None:
+            start = datetime.combine(day, profile.available_from, tzinfo=zone).astimezone(dt_timezone.utc)
+        if end is None:
+            end = datetime.combine(day, profile.available_to, tzinfo=zone).astimezone(dt_timezone.utc)
+        if end > start:
+            intervals[day] = (start, end)
+    return intervals
+
+
+def weekly_utc_intervals(profile, week_start):
+    """
+    The therapist's working hours for the week beginning `week_start`
+    (a Monday), as {local date: (start UTC, end UTC)}. Cached per week; the
+    key includes the zone and hours, so a profile edit never reads a stale
+    table.
+    """
+    zone = therapist_zone(profile)
+    key = (
+        f"therapist_week_utc:{profile.id}:{profile.timezone}:"
+        f"{profile.available_from}:{profile.available_to}:{week_start.isoformat()}"
+    )
+    intervals = cache.get(key)
+    if intervals is None:
+        intervals = _build_week(profile, zone, week_start)
+        cache.set(key, intervals, WEEK_INTERVALS_TTL)
+    return intervals
+
+
+def working_interval(profile, day):
+    """(start UTC, end UTC) of the therapist's working hours on local `day`, or None."""
+    return weekly_utc_intervals(profile, _week_start(day)).get(day)
+
+
+def utc_slots(profile, day, slot_minutes=60):
+    """Back-to-back slots of `slot_minutes` within working hours on local `day`, in UTC."""
+    interval = working_interval(profile, day)
+    if interval is None:
+        return []
+    start, end = interval
+    step = timedelta(minutes=slot_minutes)
+    slots = []
+    current = start
+    while current + step <= end:
+        slots.append((current, current + step))
+        current += step
+    return slots
+
+
+def to_zone(instants, zone):
+    """
+    Convert a sorted run of UTC datetimes to `zone`. When the offset is the
+    same at both ends (no DST change in between) a single fixed offset is
+    applied instead of a zone lookup per value.
+    """
+    if not instants:
+        return []
+    first, last = instants[0].astimezone(zone), instants[-1].astimezone(zone)
+    if first.utcoffset() != last.utcoffset():
+        return [instant.astimezone(zone) for instant in instants]
+    fixed = dt_timezone(first.utcoffset())
+    return [instant.astimezone(fixed) for instant in instants]
+
+
+DAY_INDEX = {'Mon': 0, 'Tue': 1, 'Wed': 2, 'Thu': 3, 'Fri': 4, 'Sat': 5, 'Sun': 6}
+HOURS_PER_WEEK = 7 * 24
+
+
+def weekly_hour_mask(zone, windows, reference_day=None):
+    """
+    Bitmask of the UTC hours of the week (bit 0 = Monday 00:00 UTC) covered
+    by `windows`, a list of (day code, start time, end time) wall-clock
+    ranges in `zone`. Any overlap with an hour sets its bit. Offsets are
+    taken from the week of `reference_day` (default: this week).
+    """
+    from django.utils.timezone import now
+
+    week_start = _week_start(reference_day or now().date())
+    mask = 0
+    for day, start, end in windows:
+        if day not in DAY_INDEX or end <= start:
+            continue
+        date = week_start + timedelta(days=DAY_INDEX[day])
+        start_at = datetime.combine(date, start, tzinfo=zone).astimezone(dt_timezone.utc)
+        end_at = datetime.combine(date, end, tzinfo=zone).astimezone(dt_timezone.utc)
+        hour = start_at.replace(minute=0, second=0, microsecond=0)
+        while hour < end_at:
+            mask |= 1 << ((hour.weekday() * 24 + hour.hour) % HOURS_PER_WEEK)
+            hour += timedelta(hours=1)
+    return mask
@@ -1,23 +1,40 @@
-﻿from rest_framework import generics, permissions, status, filters, viewsets
+﻿import io
+
+from rest_framework import generics, permissions, status, filters, viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.exceptions import PermissionDenied
-from django.core.mail import send_mail
-from django.conf import settings
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.http import HttpResponsePermanentRedirect, HttpResponseRedirect, StreamingHttpResponse
 
 from apps.therapists.models import TherapistProfile, TherapistAvailability, TherapistRequest
 from apps.therapists.serializers import (
     TherapistProfileSerializer,
     TherapistAvailabilitySerializer,
+    AvailabilitySlotSerializer,
     TherapistRequestCreateSerializer,
     TherapistRequestListSerializer,
     TherapistRequestResponseSerializer,
-    TherapistFilterSerializer
+    TherapistFilterSerializer,
+    CaseloadPatientSerializer
+)
+from apps.therapists.bulk import (
+    CONFLICT_MODES, FORMATS, bulk_set_flags, detect_format, export_records, import_therapists, render_records,
 )
+from apps.therapists.availability import overlap_from_params
+from apps.therapists.caseload import get_caseload, invalidate_caseload
+from apps.therapists.directory import cache_public_response
+from apps.therapists.leaderboard import MAX_LEADERBOARD_PAGE, board_name, leaderboard_page
+from apps.therapists.matching import rank_therapists
 from apps.therapists.permissions import IsTherapist
+from apps.therapists.photos import PHOTO_FORMATS, PHOTO_MAX_AGE, PHOTO_VARIANTS, generate_variants, variant_name
+from apps.therapists.search import apply_filters, facet_counts, search
+from apps.therapists.tasks import notify_patient_of_acceptance, notify_therapist_of_requests
 from apps.core.utils import api_response
 from apps.users.serializers import ConnectedPatientSerializer
 
@@ -28,19 +45,102 @@ class TherapistListView(generics.ListAPIView):
     serializer_class = TherapistProfileSerializer
     permission_classes = [permissions.AllowAny]
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['specialties']
-    search_fields = ['user__username', 'bio']
     ordering_fields = ['average_rating', 'session_fee']
     ordering = ['-average_rating']
 
+    def get_queryset(self):
+        queryset = TherapistProfileSerializer.setup_eager_loading(super().get_queryset())
+        # ?search= goes through the term index instead of icontains scans
+        query = self.request.query_params.get('search')
+        return search(queryset, query) if query else queryset
+
+    @cache_public_response('list')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class TherapistSearchPagination(LimitOffsetPagination):
+    default_limit = 20
+    max_limit = 100
+
+
+# ✅ Public faceted search
+class TherapistSearchView(generics.ListAPIView):
+    """
+    Filters: q, gender, language, specialty, min_fee, max_fee, fee_range,
+    min_experience, experience_range. The response adds facet counts over
+    the matching therapists.
+
+    With `timezone` (the patient's zone) only therapists whose working hours
+    overlap the patient's `days` and `from_time`-`to_time` there (default:
+    every day, usual working hours) by at least `min_overlap` hours are
+    listed, each with its `availability_overlap` in hours.
+    """
+    serializer_class = TherapistProfileSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = TherapistSearchPagination
+
+    def get_queryset(self):
+        return TherapistProfile.objects.filter(is_active=True).order_by('-average_rating', 'id')
+
+    def list(self, request, *args, **kwargs):
+        queryset, error = apply_filters(self.get_queryset(), request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        overlaps, error = overlap_from_params(request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        if overlaps is not None:
+            queryset = queryset.filter(id__in=list(overlaps))
+
+        # Joins and annotations only for the page; counts and facets run on the plain queryset
+        page = self.paginate_queryset(TherapistProfileSerializer.setup_eager_loading(queryset))
+        data = self.get_serializer(page, many=True).data
+        if overlaps is not None:
+            for profile, item in zip(page, data):
+                item['availability_overlap'] = overlaps[profile.id]
+        response = self.get_paginated_response(data)
+        response.data['facets'] = facet_counts(queryset)
+        return response
+
 
 # ✅ Public details of a specific therapist
 class TherapistDetailView(generics.RetrieveAPIView):
-    queryset = TherapistProfile.objects.filter(is_active=True)
+    queryset = TherapistProfileSerializer.setup_eager_loading(TherapistProfile.objects.filter(is_active=True))
     serializer_class = TherapistProfileSerializer
     permission_classes = [permissions.AllowAny]
 
+    @cache_public_response('detail', per_object=True)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+# ✅ Resized profile photo, generated on first request when missing
+class TherapistPhotoVariantView(APIView):
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = []
+
+    def get(self, request, digest, variant, extension):
+        if variant not in PHOTO_VARIANTS or extension not in PHOTO_FORMATS:
+            return Response({"error": "Unknown photo variant."}, status=status.HTTP_404_NOT_FOUND)
+
+        name = variant_name(digest, variant, extension)
+        if not default_storage.exists(name):
+            profile = TherapistProfile.objects.filter(profile_photo_hash=digest).exclude(profile_photo='').first()
+            if profile is None:
+                return Response({"error": "Photo not found."}, status=status.HTTP_404_NOT_FOUND)
+            generate_variants(profile.profile_photo, digest, [(variant, extension)])
+            if not default_storage.exists(name):
+                # Another request is writing it right now: fall back to the original for this once
+                return HttpResponseRedirect(profile.profile_photo.url)
+
+        # The name is derived from the content, so the redirect never changes
+        response = HttpResponsePermanentRedirect(default_storage.url(name))
+        response['Cache-Control'] = f"public, max-age={PHOTO_MAX_AGE}, immutable"
+        return response
+
 
 # ✅ Therapist can view/update own profile
 class TherapistProfileUpdateView(generics.RetrieveUpdateAPIView):
@@ -76,7 +176,7 @@ class VerifyTherapistView(APIView):
 
 # ✅ Therapist manages availability slots
 class TherapistAvailabilityViewSet(viewsets.ModelViewSet):
-    serializer_class = TherapistAvailabilitySerializer
+    serializer_class = AvailabilitySlotSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -85,6 +185,15 @@ class TherapistAvailabilityViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(therapist=self.request.user.therapistprofile)
 
+    @action(detail=False, methods=['get'], url_path='therapists')
+    def therapists(self, request):
+        """Active therapists with their working hours, rating and latest feedbacks."""
+        queryset = TherapistAvailabilitySerializer.setup_eager_loading(
+            TherapistProfile.objects.filter(is_active=True).order_by('-average_rating', 'id')
+        )
+        serializer = TherapistAvailabilitySerializer(queryset, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
 
 # ✅ API to return top-rated therapists
 class TherapistProfileViewSet(viewsets.ReadOnlyModelViewSet):
@@ -92,13 +201,110 @@ class TherapistProfileViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TherapistProfileSerializer
     permission_classes = [permissions.AllowAny]
 
+    def get_queryset(self):
+        return TherapistProfileSerializer.setup_eager_loading(super().get_queryset())
+
+    def _page_params(self, request, default_limit, max_limit):
+        """(offset, limit) from query params, clamped to sane bounds; raises ValueError."""
+        limit = min(max(int(request.query_params.get('limit', default_limit)), 1), max_limit)
+        offset = max(int(request.query_params.get('offset', 0)), 0)
+        return offset, limit
+
     @action(detail=False, methods=['get'], url_path='top-rated')
+    @cache_public_response('top_rated')
     def top_rated(self, request):
-        limit = int(request.query_params.get('limit', 5))
-        top_therapists = self.queryset.order_by('-average_rating')[:limit]
+        try:
+            _, limit = self._page_params(request, 5, 50)
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        board = board_name(request.query_params.get('specialty'), request.query_params.get('language'))
+        _, entries = leaderboard_page(board, 0, limit)
+        profiles = self.get_queryset().in_bulk([entry['id'] for entry in entries])
+        top_therapists = [profiles[entry['id']] for entry in entries if entry['id'] in profiles]
         serializer = self.get_serializer(top_therapists, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], url_path='leaderboard')
+    def leaderboard(self, request):
+        """
+        Ranked therapists, overall or for one ?specialty= or ?language=,
+        paged with ?offset= and ?limit=. Served from the leaderboard's sorted sets.
+        """
+        try:
+            offset, limit = self._page_params(request, 10, MAX_LEADERBOARD_PAGE)
+        except ValueError:
+            return Response({"error": "offset and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        board = board_name(request.query_params.get('specialty'), request.query_params.get('language'))
+        count, results = leaderboard_page(board, offset, limit)
+        return Response({"count": count, "offset": offset, "limit": limit, "results": results})
+
+
+# ✅ Admin: bulk import/export and bulk flags
+class TherapistBulkViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdminUser]
+
+    def _ids(self, request):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+            return None
+        return ids
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_therapists(self, request):
+        """
+        Multipart upload of a CSV or JSONL file ("file"). Optional fields:
+        file_format (default from the file name), on_conflict (skip/update), dry_run.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload a file in the 'file' field."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or detect_format(upload.name)
+        on_conflict = request.data.get('on_conflict', 'skip')
+        if file_format not in FORMATS or on_conflict not in CONFLICT_MODES:
+            return Response(
+                {"error": f"file_format must be one of {', '.join(FORMATS)}; on_conflict one of {', '.join(CONFLICT_MODES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+
+        # Decoded on the fly: large uploads are read from their temporary file line by line
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            report = import_therapists(stream, file_format, on_conflict=on_conflict, dry_run=dry_run)
+        except UnicodeDecodeError:
+            return Response({"error": "The file must be UTF-8 encoded."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_therapists(self, request):
+        # Not ?format=, which DRF reserves for choosing a renderer
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in FORMATS:
+            return Response({"error": f"file_format must be one of {', '.join(FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = TherapistProfile.objects.all()
+        if request.query_params.get('active') == 'true':
+            queryset = queryset.filter(is_active=True)
+        response = StreamingHttpResponse(
+            render_records(export_records(queryset, file_format), file_format),
+            content_type='text/csv' if file_format == 'csv' else 'application/x-ndjson',
+        )
+        response['Content-Disposition'] = f'attachment; filename="therapists.{file_format}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='verify')
+    def verify(self, request):
+        ids = self._ids(request)
+        if ids is None:
+            return Response({"error": "ids must be a non-empty list of therapist profile ids."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"updated": bulk_set_flags(ids, verified=True)})
+
+    @action(detail=False, methods=['post'], url_path='deactivate')
+    def deactivate(self, request):
+        ids = self._ids(request)
+        if ids is None:
+            return Response({"error": "ids must be a non-empty list of therapist profile ids."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"updated": bulk_set_flags(ids, is_active=False)})
+
 
 # ✅ Intelligent match-making
 class FindMyTherapistView(APIView):
@@ -109,34 +315,21 @@ class FindMyTherapistView(APIView):
         serializer.is_valid(raise_exception=True)
         filters = serializer.validated_data
 
-        exact_qs = TherapistProfile.objects.filter(is_active=True)
+        ranked = rank_therapists(filters, limit=filters['limit'], exclude_user_id=request.user.id)
+        profiles = TherapistProfileSerializer.setup_eager_loading(TherapistProfile.objects.all()).in_bulk([profile_id for profile_id, *_ in ranked])
 
-        if 'gender' in filters:
-            exact_qs = exact_qs.filter(gender=filters['gender'])
-
-        if 'language' in filters:
-            exact_qs = exact_qs.filter(languages__icontains=filters['language'])
-
-        if 'specialization' in filters:
-            exact_qs = exact_qs.filter(specialties__icontains=filters['specialization'])
-
-        if 'min_experience' in filters:
-            exact_qs = exact_qs.filter(experience__gte=filters['min_experience'])
-
-        exact_matches = exact_qs.distinct()
-
-        if not exact_matches.exists():
-            suggestions = TherapistProfile.objects.filter(is_active=True).exclude(
-                user=request.user
-            )[:5]
-            return Response({
-                "matches": [],
-                "suggested": TherapistProfileSerializer(suggestions, many=True).data
-            })
+        matches, suggested = [], []
+        for profile_id, score, exact, reasons in ranked:
+            profile = profiles.get(profile_id)
+            if profile is None:  # deleted since the matrix was cached
+                continue
+            data = TherapistProfileSerializer(profile, context={'request': request}).data
+            data['match'] = {'score': round(score, 3), 'exact': exact, 'explanation': reasons}
+            (matches if exact else suggested).append(data)
 
         return Response({
-            "matches": TherapistProfileSerializer(exact_matches, many=True).data,
-            "suggested": []
+            "matches": matches,
+            "suggested": suggested
         })
 
 
@@ -149,49 +342,49 @@ class TherapistRequestCreateView(generics.CreateAPIView):
         return TherapistRequest.objects.all()
 
     def perform_create(self, serializer):
-        patient = self.request.user
-        therapist = serializer.validated_data['therapist']
-
-        if TherapistRequest.objects.filter(
-            patient=patient,
-            therapist=therapist,
-            status='pending'
-        ).exists():
-            raise PermissionDenied("You already have a pending request with this therapist.")
-
-        serializer.save(patient=patient)
-        self.notify_therapist(therapist, patient)
-
-    def notify_therapist(self, therapist_profile, patient_user):
-        therapist_user = therapist_profile.user
-        subject = "New Patient Request"
-        message = (
-            f"Dear {therapist_user.username},\n\n"
-            f"You have a new connection request from {patient_user.username} ({patient_user.email}).\n"
-            f"Please log in to your GRACE account to respond."
-        )
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [therapist_user.email],
-            fail_silently=False,
-        )
+        # Duplicates are rejected by the serializer; the unique constraint catches races
+        try:
+            instance = serializer.save(patient=self.request.user)
+        except IntegrityError:
+            raise ValidationError("You have already requested this therapist.")
+        therapist_id = instance.therapist_id
+        transaction.on_commit(lambda: notify_therapist_of_requests.delay(therapist_id))
 
 
 # ✅ Therapist views incoming requests
+class TherapistRequestCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+
 class TherapistRequestListView(generics.ListAPIView):
     serializer_class = TherapistRequestListSerializer
     permission_classes = [IsAuthenticated]
 
+    @property
+    def paginator(self):
+        # Opt-in so existing clients keep receiving a plain list:
+        # ?paginate=cursor starts paging, the returned links carry ?cursor=.
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            use_cursor = params.get('paginate') == 'cursor' or 'cursor' in params
+            self._paginator = TherapistRequestCursorPagination() if use_cursor else None
+        return self._paginator
+
     def get_queryset(self):
         user = self.request.user
         if user.user_type != 'therapist':
             return TherapistRequest.objects.none()
 
-        return TherapistRequest.objects.filter(
+        # Served by therapist_request_inbox_idx; ?status= narrows to one state
+        queryset = TherapistRequest.objects.filter(
             therapist__user=user
-        ).order_by('-created_at')
+        ).select_related('patient').order_by('-created_at', '-id')
+        if self.request.query_params.get('status'):
+            queryset = queryset.filter(status=self.request.query_params['status'])
+        return queryset
 
 
 # ✅ Therapist responds (accept/reject) to request
@@ -227,25 +420,12 @@ class TherapistRequestResponseView(generics.UpdateAPIView):
 
             patient_user.connected_user = therapist_user
             patient_user.save()
-            self.notify_patient(patient_user, therapist_user)
+            invalidate_caseload(therapist_user.id)
+            request_id = instance.id
+            transaction.on_commit(lambda: notify_patient_of_acceptance.delay(request_id))
 
         return Response({'detail': f'Request {status_value}.'}, status=200)
 
-    def notify_patient(self, patient, therapist):
-        subject = "Request Accepted"
-        message = (
-            f"Dear {patient.username},\n\n"
-            f"Your request was accepted by therapist {therapist.username} ({therapist.email}).\n"
-            f"You are now connected on GRACE and can begin chatting or booking sessions."
-        )
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [patient.email],
-            fail_silently=False,
-        )
-
 
 # ✅ Therapist sees connected patients
 class ConnectedPatientsView(APIView):
@@ -260,3 +440,17 @@ class ConnectedPatientsView(APIView):
         connected_patients = user.connected_clients.all()
         serializer = ConnectedPatientSerializer(connected_patients, many=True)
         return Response(serializer.data)
+
+
+# ✅ Therapist caseload: connected patients with mood, trainings, next session and unread chat
+class CaseloadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+
+        if user.user_type != 'therapist':
+            raise PermissionDenied("Only therapists can view their caseload.")
+
+        data = get_caseload(user, lambda queryset: CaseloadPatientSerializer(queryset, many=True).data)
+        return Response(data)
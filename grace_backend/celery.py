@@ -11,8 +11,46 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 app.conf.beat_schedule.update({
+    'auto-close-past-appointments': {
+        'task': 'apps.appointments.tasks.auto_close_past_appointments',
+        'schedule': crontab(minute='*/5'),  # Incremental, from the last watermark
+    },
     'auto-close-past-appointments-daily': {
         'task': 'apps.appointments.tasks.auto_close_past_appointments',
         'schedule': crontab(hour=0, minute=5),  # Runs daily at 00:05
+        'kwargs': {'full': True},
+    },
+    'appointment-outbox': {
+        'task': 'apps.appointments.tasks.process_appointment_outbox',
+        'schedule': crontab(minute='*'),  # Picks up events whose on-commit enqueue was lost
+    },
+    'archive-appointment-logs': {
+        'task': 'apps.appointments.tasks.archive_old_appointment_logs',
+        'schedule': crontab(hour=3, minute=30),  # Daily, off-peak
+    },
+    'prune-appointment-tombstones': {
+        'task': 'apps.appointments.tasks.prune_appointment_tombstones',
+        'schedule': crontab(hour=3, minute=45),  # Daily, after the log archive
+    },
+    'no-show-stats': {
+        'task': 'apps.appointments.tasks.refresh_no_show_stats',
+        'schedule': crontab(minute='*/30'),  # Incremental, from the last watermark
+    },
+    'no-show-stats-daily': {
+        'task': 'apps.appointments.tasks.refresh_no_show_stats',
+        'schedule': crontab(hour=1, minute=15),
+        'kwargs': {'full': True},
+    },
+    'session-reminder-sweep': {
+        'task': 'apps.appointments.tasks.send_upcoming_session_reminders',
+        'schedule': crontab(minute='*/5'),  # Catches reminders whose ETA task was lost
+    },
+    'therapist-request-digests': {
+        'task': 'apps.therapists.tasks.send_request_digests',
+        'schedule': crontab(minute=0),  # Hourly
+    },
+    'therapist-hour-masks': {
+        'task': 'apps.therapists.tasks.precompute_hour_masks',
+        'schedule': crontab(hour=0, minute=10),  # Daily; next week's masks are ready before Monday
     },
 })
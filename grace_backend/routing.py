@@ -1,6 +1,8 @@
 from django.urls import path
+from apps.appointments.consumers import AppointmentStatusConsumer
 from apps.chat.consumers import ChatConsumer
 
 websocket_urlpatterns = [
     path("ws/chat/<int:thread_id>/", ChatConsumer.as_asgi()),
+    path("ws/appointments/<int:appointment_id>/", AppointmentStatusConsumer.as_asgi()),
 ]
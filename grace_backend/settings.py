@@ -121,6 +121,12 @@ AUTH_PASSWORD_VALIDATORS = [
 
 ASGI_APPLICATION = "grace_backend.asgi.application"
 
+# Shared by the web, Channels and Celery processes: cached state written by
+# one (invalidations, rollup metadata, leaderboards) must be seen by all
+CACHES = {
+    "default": env.cache("CACHE_URL", default="redis://redis:6379/1"),
+}
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",